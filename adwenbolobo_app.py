@@ -1,77 +1,134 @@
 import streamlit as st
+import io
 import json
-import re
+import os
 import random
+import secrets
+import tempfile
+import threading
 import time
-from typing import List, Dict
+import uuid
+from array import array
+from typing import List, Dict, Optional, Tuple, Union
+
+from bank_cache import BLOCK_CACHE, SIGNATURE_CACHE, SharedBankCache, content_hash
+from bank_store import BankStore, ImportWatch, StoredBank
+from checkpoint import Answer, CheckpointWriter, Progress, open_store
+from columnar import SUFFIXES, ColumnarBank, bank_to_bytes, detect_format, events_to_bytes, iter_events
+from compiled_bank import SUFFIX as COMPILED_SUFFIX, BankFormatError, MappedBank, is_compiled_bank, verify_bank
+from dedup import DEFAULT_THRESHOLD, DedupReport, NearDuplicateIndex, dedupe_questions
+from event_log import SINK_FILES, AnswerEventLog, open_sink
+from instrumentation import PROFILER, STATE_SIZES, dump_state_sizes, span
+from json_bank import JSONBankReader, answer_index, validate_question
+from item_analysis import ItemAnalysis, item_report, load_jsonl_attempts, load_sqlite_attempts
+from nbme_parser import StreamingIngest, iter_nbme_questions, normalize_tags, parse_nbme_blocks
+from scheduler import Scheduler, SchedulerStore
+from search_index import SearchIndexRegistry
+from session_order import option_order, shuffled_order
+from tag_index import TagIndex
+
+# Bump these whenever the matching parser changes so cached results are not reused
+NBME_TXT_PARSER_VERSION = 'nbme-txt/4'
+JSON_LOADER_VERSION = 'json/4'
+COLUMNAR_LOADER_VERSION = 'columnar/2'
+
+DATA_DIR = os.environ.get('ADWENBOLOBO_DATA_DIR', '.adwenbolobo')
+BANK_DB_PATH = os.path.join(DATA_DIR, 'banks.sqlite3')
+SCHEDULER_DB_PATH = os.path.join(DATA_DIR, 'scheduler.sqlite3')
+# Compiled banks (see compiled_bank.py) found here are offered in the uploader; uploaded ones are saved here
+COMPILED_BANK_DIR = os.environ.get('ADWENBOLOBO_BANK_DIR', os.path.join(DATA_DIR, 'compiled'))
+# Where answer events are persisted: 'sqlite' or 'jsonl'
+EVENT_SINK = os.environ.get('ADWENBOLOBO_EVENT_SINK', 'sqlite')
+# Parsed banks shared by all server processes on this host (see bank_cache.SharedBankCache)
+SHARED_CACHE_DIR = os.environ.get('ADWENBOLOBO_SHARED_CACHE_DIR', os.path.join(DATA_DIR, 'bank-cache'))
+SHARED_CACHE_MB = int(os.environ.get('ADWENBOLOBO_SHARED_CACHE_MB', '1024'))
+# Banks whose search and tag indexes are kept in memory, most recently used first
+SEARCH_INDEX_BANKS = int(os.environ.get('ADWENBOLOBO_SEARCH_INDEX_BANKS', '16'))
+# Where session checkpoints are kept: 'sqlite' or 'files'
+CHECKPOINT_STORE = os.environ.get('ADWENBOLOBO_CHECKPOINT_STORE', 'sqlite')
+# Set to 1 to show admin tools (item analysis) in the sidebar
+ADMIN_MODE = os.environ.get('ADWENBOLOBO_ADMIN') == '1'
+# Span timings are collected when ADWENBOLOBO_PROFILE=1 and written here every few seconds
+PROFILE_DIR = os.environ.get('ADWENBOLOBO_PROFILE_DIR', DATA_DIR)
+
+# TXT uploads at least this large are ingested in the background so the quiz can start early
+STREAM_THRESHOLD_BYTES = 1024 * 1024
+
+# Timed blocks: NBME-style defaults, and how late an answer may arrive after the deadline
+# (network and click latency) and still be accepted
+BLOCK_SIZE = 40
+BLOCK_MINUTES = 60
+DEADLINE_GRACE_S = 2.0
 
 # -- Cleaning and Parsing function for raw NBME-like text --
 def clean_and_parse_nbme_text(raw_text: str) -> List[Dict]:
-    # Basic cleaning: unify line breaks, remove excessive spaces
-    text = raw_text.replace('\r\n', '\n').replace('\r', '\n')
-    text = re.sub(r'\n+', '\n', text)  # multiple newlines -> single newline
-    text = re.sub(r' +', ' ', text)    # multiple spaces -> single space
-    
-    questions = []
-    # Split by double newlines to separate questions
-    blocks = re.split(r'\n\s*\n', text.strip())
-    
-    for block in blocks:
-        lines = block.strip().split('\n')
-        question, options, answer_letter, explanation = '', [], '', ''
-        current_section = None
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('Question:'):
-                question = line[len('Question:'):].strip()
-                current_section = 'question'
-            elif line.startswith('Options:'):
-                current_section = 'options'
-            elif line.startswith('Answer:'):
-                answer_letter = line[len('Answer:'):].strip()
-                current_section = 'answer'
-            elif line.startswith('Explanation:'):
-                explanation = line[len('Explanation:'):].strip()
-                current_section = 'explanation'
-            else:
-                if current_section == 'options':
-                    # Expect lines like: A. option text
-                    m = re.match(r'^([A-Z])\.\s*(.+)', line)
-                    if m:
-                        options.append(m.group(2).strip())
-                elif current_section == 'explanation':
-                    explanation += ' ' + line
-        
-        if question and options and answer_letter:
-            answer_index = ord(answer_letter.upper()) - ord('A')
-            if 0 <= answer_index < len(options):
-                answer = options[answer_index]
-                questions.append({
-                    'question': question,
-                    'options': options,
-                    'answer': answer,
-                    'explanation': explanation.strip() or "No explanation provided."
-                })
+    # Parsed per question block and memoized by block text, so after an edit only the
+    # changed blocks are parsed again; problems are reported against their block
+    questions, problems, _ = parse_nbme_blocks(raw_text, BLOCK_CACHE)
+    if problems:
+        details = "\n".join(f"- {p}" for p in problems[:20])
+        more = f"\n- ... and {len(problems) - 20} more" if len(problems) > 20 else ""
+        st.warning(f"{len(problems)} question blocks were skipped:\n{details}{more}")
+    if not questions:
+        st.warning("No valid questions found after cleaning. Check the file format.")
+    return questions
+
+# -- Streaming parse of an uploaded TXT file (decodes incrementally, falls back for non-UTF-8) --
+def parse_nbme_upload(file_bytes: bytes) -> List[Dict]:
+    questions = list(iter_nbme_questions(io.BytesIO(file_bytes)))
     if not questions:
         st.warning("No valid questions found after cleaning. Check the file format.")
     return questions
 
 # -- Load from JSON --
-def load_questions_from_json(json_str: str) -> List[Dict]:
+# Streams the array item by item, validating types, non-empty options and that the
+# answer is one of them; invalid items are skipped and reported with their location
+def load_questions_from_json(file_bytes: bytes) -> List[Dict]:
+    reader = JSONBankReader(io.BytesIO(file_bytes), validate=PROFILER.timed('validate', validate_question))
+    valid = list(reader)
+    for q in valid:
+        if 'tags' in q:
+            q['tags'] = normalize_tags(q['tags'])
+    if reader.fatal:
+        st.error(f"Failed to load JSON questions: {reader.fatal}")
+    if reader.error_count:
+        details = "\n".join(f"- {e}" for e in reader.errors[:20])
+        more = f"\n- ... and {reader.error_count - 20} more" if reader.error_count > 20 else ""
+        st.warning(f"{reader.error_count} of {reader.items} questions were skipped:\n{details}{more}")
+    return valid
+
+# -- Load from Parquet/Arrow --
+# Only the index columns are read. A bank whose rows all check out is saved as it is and
+# served from the file, each explanation read when its question is shown. Otherwise
+# (rows to skip, or near-duplicates to drop with keep) the remaining questions are
+# returned for import, with explanations fetched for those positions only.
+# Returns (questions to import, bank_id of the saved file).
+def load_questions_from_columnar(file_bytes: bytes, name: str, keep=None) -> Tuple[List[Dict], Optional[int]]:
     try:
-        data = json.loads(json_str)
-        assert isinstance(data, list)
-        valid = []
-        for q in data:
-            if all(k in q for k in ['question', 'options', 'answer', 'explanation']):
-                valid.append(q)
-        if len(valid) < len(data):
-            st.warning("Some questions were skipped due to missing fields.")
-        return valid
-    except Exception as e:
-        st.error(f"Failed to load JSON questions: {e}")
-        return []
+        bank = ColumnarBank(file_bytes)
+        questions, problems = bank.index_questions()
+    except ImportError as e:
+        st.error(str(e))
+        return [], None
+    except (TypeError, ValueError) as e:  # pyarrow reports unreadable files as either
+        st.error(f"Failed to load Parquet/Arrow questions: {e}")
+        return [], None
+    if not problems and keep is None:
+        path = os.path.join(COMPILED_BANK_DIR, content_hash(file_bytes, 'columnar-upload') + SUFFIXES[bank.format])
+        os.makedirs(COMPILED_BANK_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=COMPILED_BANK_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(file_bytes)
+        os.replace(tmp, path)
+        return [], get_bank_store().register_file(path, name)
+    if problems:
+        details = "\n".join(f"- {p}" for p in problems[:20])
+        more = f"\n- ... and {len(problems) - 20} more" if len(problems) > 20 else ""
+        st.warning(f"{len(problems)} of {len(bank)} questions were skipped:\n{details}{more}")
+    positions = {id(q): position for position, q in questions.items()}
+    kept = list(questions.values()) if keep is None else keep(list(questions.values()))
+    return [dict(q, explanation=bank.explanation(positions[id(q)]) or "No explanation provided.")
+            for q in kept], None
 
 # -- Default Questions --
 DEFAULT_QUESTIONS = [
@@ -89,39 +146,328 @@ DEFAULT_QUESTIONS = [
     },
 ]
 
+# -- Shared bank store --
+# Banks live in SQLite, imported once per content hash; sessions keep only a bank id
+# and an optional ordering of positions, and fetch the current question on demand.
+@st.cache_resource
+def get_bank_store() -> BankStore:
+    return BankStore(BANK_DB_PATH)
+
+@st.cache_resource
+def get_default_bank_id() -> int:
+    data = json.dumps(DEFAULT_QUESTIONS, sort_keys=True).encode('utf-8')
+    return get_bank_store().import_bank(DEFAULT_QUESTIONS, content_hash(data, JSON_LOADER_VERSION), 'Default questions')
+
+# Parsed uploads, compiled once and memory-mapped by every process that needs them
+@st.cache_resource
+def get_shared_cache() -> SharedBankCache:
+    return SharedBankCache(SHARED_CACHE_DIR, SHARED_CACHE_MB * 1024 * 1024)
+
+# Compiled and Parquet/Arrow uploads already verified and saved, by hash of the whole
+# file, so reruns with the same file in the uploader skip the record-by-record check
+@st.cache_resource
+def get_verified_uploads() -> Dict[str, int]:
+    return {}
+
+# Near-duplicate reports for imported banks, keyed by content hash
+@st.cache_resource
+def get_dedup_reports() -> Dict[str, DedupReport]:
+    return {}
+
+# Background imports in progress, keyed by content hash, so sessions loading the same big file share one
+@st.cache_resource
+def get_active_ingests() -> Tuple[Dict[str, Tuple[int, StreamingIngest]], threading.Lock]:
+    return {}, threading.Lock()
+
+# One buffered answer-event writer per process
+@st.cache_resource
+def get_event_log() -> AnswerEventLog:
+    return AnswerEventLog(open_sink(EVENT_SINK, DATA_DIR))
+
+# One debounced checkpoint writer per process
+@st.cache_resource
+def get_checkpoints() -> CheckpointWriter:
+    return CheckpointWriter(open_store(CHECKPOINT_STORE, DATA_DIR))
+
+# One read-only view per bank, shared by every session using it
+@st.cache_resource
+def get_bank(bank_id: int) -> Union[StoredBank, MappedBank, ColumnarBank]:
+    return get_bank_store().bank(bank_id)
+
+def current_bank() -> Union[StoredBank, MappedBank, ColumnarBank]:
+    return get_bank(st.session_state.bank_id)
+
+def quiz_length() -> int:
+    order = st.session_state.order
+    return len(order) if order is not None else len(current_bank())
+
+def position_at(index: int) -> int:
+    order = st.session_state.order
+    return order[index] if order is not None else index
+
+# -- Full-text search --
+# Indexes are built once per bank in a background thread and shared by all sessions
+@st.cache_resource
+def get_search_registry() -> SearchIndexRegistry:
+    return SearchIndexRegistry(max_entries=SEARCH_INDEX_BANKS)
+
+# Per-tag bitsets for custom blocks, built alongside the search index
+@st.cache_resource
+def get_tag_registry() -> SearchIndexRegistry:
+    return SearchIndexRegistry(TagIndex.build, SEARCH_INDEX_BANKS)
+
+def index_bank(bank_id: int):
+    # Indexes are kept per bank_id, so a bank still being imported is not indexed yet. The
+    # bank is looked up here: the build threads run outside any script run.
+    bank = get_bank(bank_id)
+    if not getattr(bank, 'complete', True):
+        return
+    get_search_registry().build_async(bank_id, lambda: iter(bank))
+    get_tag_registry().build_async(bank_id, lambda: iter(bank))
+
+# -- Spaced repetition --
+@st.cache_resource
+def get_scheduler_store() -> SchedulerStore:
+    return SchedulerStore(SCHEDULER_DB_PATH)
+
+def srs_user_id() -> str:
+    # Without a profile name the schedule only lasts for this browser session
+    return st.session_state.srs_profile.strip() or st.session_state.session_id
+
+def current_scheduler() -> Scheduler:
+    key = (srs_user_id(), st.session_state.bank_id)
+    if st.session_state.srs_key != key:
+        st.session_state.srs = Scheduler(len(current_bank()), get_scheduler_store().load(*key))
+        st.session_state.srs_key = key
+        st.session_state.srs_position = None
+    return st.session_state.srs
+
+# -- Item analysis (admin) --
+# One analysis per bank, kept across reruns and refreshed with only the new attempts
+@st.cache_resource
+def get_item_analysis(bank_id: int) -> Tuple[ItemAnalysis, threading.Lock]:
+    return ItemAnalysis(get_bank_store().bank_size(bank_id), max_options=10), threading.Lock()
+
+def render_item_analysis():
+    st.header("Item Analysis")
+    banks = [b for b in get_bank_store().list_banks() if b['complete']]
+    bank = st.selectbox("Question bank", banks, format_func=lambda b: f"{b['name']} ({b['size']} questions)")
+    if bank is None:
+        st.write("No question banks yet.")
+        return
+    # Make sure attempts still sitting in the writer's buffer are included
+    get_event_log().flush()
+    loader = load_sqlite_attempts if EVENT_SINK == 'sqlite' else load_jsonl_attempts
+    analysis, lock = get_item_analysis(bank['bank_id'])
+    with lock:
+        new = analysis.update_from(loader, os.path.join(DATA_DIR, SINK_FILES[EVENT_SINK]), bank['bank_id'])
+        rows = item_report(analysis, get_bank(bank['bank_id']))
+    st.caption(f"{int(analysis.attempts.sum())} attempts ({new} new since last refresh). "
+               "p-value: proportion correct; point-biserial: correlation with the rest-of-bank score; "
+               "* marks the keyed answer.")
+    st.dataframe(rows, use_container_width=True)
+
+# -- Query parameters --
+# st.query_params since Streamlit 1.30, the experimental functions before that
+def query_param(name: str) -> Optional[str]:
+    params = getattr(st, 'query_params', None)
+    if params is not None:
+        return params.get(name)
+    values = st.experimental_get_query_params().get(name)
+    return values[0] if values else None
+
+def set_query_param(name: str, value: str):
+    params = getattr(st, 'query_params', None)
+    if params is not None:
+        params[name] = value
+    else:
+        st.experimental_set_query_params(**{**st.experimental_get_query_params(), name: value})
+
+# -- Checkpoints --
+# The session token is kept in the URL (?session=...), so after a reload or a server
+# restart the page finds its progress again. Checkpoints hold the bank's content hash,
+# the order and the answers; the bank itself is reopened from the store, not re-parsed.
+def progress_fingerprint() -> tuple:
+    s = st.session_state
+    return (s.bank_id, id(s.order), s.option_seed, s.current_q, s.score, len(s.answers_log),
+            s.submitted, s.review_mode, s.randomized, s.start_time, s.block_deadline)
+
+def current_ingest() -> Union[StreamingIngest, ImportWatch, None]:
+    # The import of the bank this session is on, None once it is stored. Following another
+    # process's import, this process takes it over (as a new bank_id) if that claim lapses.
+    s = st.session_state
+    if isinstance(s.ingest, ImportWatch) and s.ingest.lapsed:
+        s.bank_id, s.ingest = s.ingest.takeover()
+    return s.ingest
+
+def save_checkpoint():
+    # Called at the top of the quiz fragments and at the end of each run; only a changed
+    # state is handed to the writer, which compresses and stores it in the background
+    s = st.session_state
+    ingest = current_ingest()
+    if ingest is not None and not ingest.done:
+        return  # a bank still streaming in has no final content hash yet
+    fingerprint = progress_fingerprint()
+    if s.checkpoint_saved == fingerprint:
+        return
+    info = get_bank_store().bank_info(s.bank_id)
+    if info is None or not info['complete']:
+        return
+    s.checkpoint_saved = fingerprint
+    get_checkpoints().submit(s.session_id, Progress(
+        info['content_hash'], s.order, s.option_seed, s.current_q, s.score, tuple(s.answers_log),
+        time.time() - s.start_time, s.randomized, s.submitted, s.review_mode, time.time(),
+        s.block_deadline, s.block_limit))
+
+def resume_session(token: str) -> bool:
+    try:
+        progress = get_checkpoints().load(token)
+    except ValueError:
+        progress = None
+    if progress is None:
+        return False
+    bank_id = get_bank_store().find_bank(progress.bank_hash)
+    if bank_id is None:
+        st.warning("Your saved progress is for a question bank this server no longer has; starting fresh.")
+        return False
+    s = st.session_state
+    s.bank_id = bank_id
+    s.order = progress.order
+    s.option_seed = progress.option_seed
+    s.current_q = progress.current_q
+    s.score = progress.score
+    s.answers_log = list(progress.answers)
+    s.incorrect_log = [i for i, a in enumerate(progress.answers) if not a.correct]
+    s.attempts = {bank_id: {a.position: a.correct for a in progress.answers}}
+    s.randomized = progress.randomized
+    s.review_mode = progress.review_mode
+    s.start_time = time.time() - progress.elapsed
+    s.block_deadline = progress.deadline
+    s.block_limit = progress.time_limit
+    # An answer submitted just before the reload is shown with its feedback again
+    last = progress.answers[-1] if progress.answers else None
+    if progress.submitted and last is not None and progress.current_q < quiz_length() \
+            and last.position == position_at(progress.current_q):
+        s.submitted = True
+        s.user_answer = current_bank()[last.position]['options'][last.chosen]
+    index_bank(bank_id)
+    return True
+
+# -- Profiling (opt-in) --
+# The panel is hidden unless profiling is on and the page is opened with ?debug=1
+def debug_requested() -> bool:
+    return query_param('debug') == '1'
+
+def render_profile_panel():
+    snap = PROFILER.snapshot()
+    with st.sidebar.expander("Profiling", expanded=True):
+        st.caption(f"Up {snap['uptime_s']:.0f} s · {snap['sessions']} sessions · "
+                   f"this session: {snap['runs_per_session'].get(st.session_state.session_id, 0)} script runs")
+        st.dataframe([{'span': name, 'count': s['count'], 'p50 ms': round(s['p50_ms'], 2),
+                       'p90 ms': round(s['p90_ms'], 2), 'p99 ms': round(s['p99_ms'], 2),
+                       'max ms': round(s['max_ms'], 2)} for name, s in snap['spans'].items()],
+                     use_container_width=True)
+        st.caption(f"Also written to {os.path.join(PROFILE_DIR, 'profile.prom')} and profile.json")
+
+# -- Partial reruns --
+# Streamlit >= 1.37 has st.fragment (1.33-1.36: st.experimental_fragment); older
+# versions fall back to plain functions and full reruns.
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda f: f)
+
+# -- Review rendering --
+REVIEW_PAGE_SIZES = [10, 25, 50, 100]
+
+def render_review_entry(idx: int, entry: Answer) -> str:
+    # One markdown block per entry, built once and reused on later reruns
+    cache = st.session_state.review_md
+    if idx not in cache:
+        q = current_bank()[entry.position]
+        if entry.correct:
+            verdict = ":green[**Correct**]"
+        else:
+            verdict = f":red[**Incorrect** (Correct: {q['answer']})]"
+        cache[idx] = (f"**Q{idx + 1}:** {q['question']}\n\n"
+                      f"Your answer: {q['options'][entry.chosen]}\n\n"
+                      f"{verdict} · {entry.latency_ms / 1000:.0f} s\n\n"
+                      f"Explanation: {q['explanation']}\n\n---")
+    return cache[idx]
+
 # -- Initialize session state --
 def init_session_state():
     defaults = {
-        'questions': DEFAULT_QUESTIONS,
+        'session_id': uuid.uuid4().hex,
+        'bank_id': get_default_bank_id(),
+        'order': None,
+        'option_seed': None,
         'score': 0,
         'current_q': 0,
         'submitted': False,
         'user_answer': None,
         'review_mode': False,
         'answers_log': [],
+        'incorrect_log': [],
+        'review_md': {},
+        'review_page': 0,
         'start_time': None,
         'elapsed_time': 0,
+        'block_deadline': None,
+        'block_limit': None,
         'randomized': False,
+        'ingest': None,
+        'shown_q': None,
+        'shown_at': None,
+        'adaptive': False,
+        'srs_profile': '',
+        'srs': None,
+        'srs_key': None,
+        'srs_position': None,
+        'srs_last': None,
+        'srs_seen': 0,
+        'search_picks': [],
+        'attempts': {},
+        'resume_checked': False,
+        'checkpoint_saved': None,
     }
     for k, v in defaults.items():
         if k not in st.session_state:
             st.session_state[k] = v
 
 init_session_state()
+run_started = time.perf_counter()
+
+# -- Resume saved progress --
+# Once per browser session: a session token in the URL is adopted (and its checkpoint
+# restored if there is one); otherwise this session's token is put in the URL.
+if not st.session_state.resume_checked:
+    st.session_state.resume_checked = True
+    token = query_param('session')
+    if token and len(token) == 32 and token.isalnum():
+        st.session_state.session_id = token
+        if resume_session(token):
+            st.info("Resumed your saved progress.")
+    else:
+        set_query_param('session', st.session_state.session_id)
+
+PROFILER.count_run(st.session_state.session_id)
 
 # -- App Title --
 st.title("adwenBolobo: USMLE Practice App")
 
+if ADMIN_MODE and st.sidebar.checkbox("Item analysis (admin)"):
+    render_item_analysis()
+    st.stop()
+
 # -- Timer --
 if st.session_state['start_time'] is None:
     st.session_state['start_time'] = time.time()
-st.session_state['elapsed_time'] = int(time.time() - st.session_state['start_time'])
+deadline = st.session_state.block_deadline
+st.session_state['elapsed_time'] = int(min(time.time(), deadline or float('inf')) - st.session_state['start_time'])
 
 if st.session_state.review_mode:
     st.info(f"Total time: {st.session_state['elapsed_time']} seconds")
 
 # -- Upload or Paste Questions --
-with st.expander("Upload your own questions (JSON or TXT) or Paste Raw Questions Here"):
+with st.expander("Upload your own questions (JSON, TXT or Parquet) or Paste Raw Questions Here"):
     st.write("**For TXT files or paste, use this format:**")
     st.code("""
 Question: <question text>
@@ -132,209 +478,731 @@ C. <option3>
 D. <option4>
 Answer: <correct option letter>
 Explanation: <explanation text>
+Tags: <optional, comma-separated, e.g. cardio, pharm>
 """)
-    uploaded_file = st.file_uploader("Upload questions file", type=['json', 'txt'])
+    uploaded_file = st.file_uploader("Upload questions file",
+                                     type=['json', 'txt', 'parquet', 'arrow', COMPILED_SUFFIX[1:]])
 
     raw_text_input = st.text_area("Or paste your questions here (same format as above)", height=200)
 
+    dedup = st.checkbox("Merge near-duplicate questions", value=True,
+                        help="Repeats that differ only in whitespace or a few words are kept once.")
+    dedup_threshold = st.slider("Duplicate similarity threshold", 0.5, 1.0, DEFAULT_THRESHOLD, 0.05,
+                                disabled=not dedup)
+    # Dedup settings are part of the parser version, so each setting is its own cached bank
+    dedup_suffix = f'+dedup{dedup_threshold:.2f}' if dedup else ''
+    txt_version = NBME_TXT_PARSER_VERSION + dedup_suffix
+    json_version = JSON_LOADER_VERSION + dedup_suffix
+    columnar_version = COLUMNAR_LOADER_VERSION + dedup_suffix
+    dedup_reports = get_dedup_reports()
+
+    def parse_bank(parse, key):
+        with span('parse'):
+            questions = parse()
+        if not dedup:
+            return questions
+        with span('dedup'):
+            questions, dedup_reports[key] = dedupe_questions(questions, dedup_threshold)
+        return questions
+
+    store = get_bank_store()
+    shared_cache = get_shared_cache()
     loaded_questions = []
+    loaded_bank_id = None
+    paste_report = None
+    stream_bytes = None
+    bank_hash, bank_name = None, None
     # If uploaded file present, use that
+    # Banks already in the store are not parsed again; otherwise parsed banks are kept in
+    # the shared cache by content hash, so reruns and other server processes skip parsing
     if uploaded_file is not None:
         file_type = uploaded_file.type
-        file_content = uploaded_file.read().decode("utf-8")
-        if file_type == 'application/json':
-            loaded_questions = load_questions_from_json(file_content)
+        file_bytes = uploaded_file.getvalue()
+        bank_name = uploaded_file.name
+        if is_compiled_bank(file_bytes):
+            # Checked record by record and saved under the digest of what it actually
+            # contains, then served from disk like any other compiled bank. A verified
+            # upload is always written, so a bad copy already under that name is replaced.
+            verified = get_verified_uploads()
+            upload_hash = content_hash(file_bytes, 'adwb-upload')
+            loaded_bank_id = verified.get(upload_hash)
+            try:
+                if loaded_bank_id is None:
+                    header = verify_bank(file_bytes, bank_name)
+                    path = os.path.join(COMPILED_BANK_DIR, header['sha256'] + COMPILED_SUFFIX)
+                    os.makedirs(COMPILED_BANK_DIR, exist_ok=True)
+                    fd, tmp = tempfile.mkstemp(dir=COMPILED_BANK_DIR, suffix=COMPILED_SUFFIX + '.tmp')
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(file_bytes)
+                    os.replace(tmp, path)
+                    loaded_bank_id = verified[upload_hash] = store.register_file(path, bank_name)
+            except BankFormatError as e:
+                st.error(f"Failed to open compiled bank: {e}")
+        elif detect_format(file_bytes) is not None:
+            # Parquet/Arrow are recognized by their magic bytes, whatever the file is called
+            bank_hash = content_hash(file_bytes, columnar_version)
+            verified = get_verified_uploads()
+            loaded_bank_id = verified.get(bank_hash)
+            if loaded_bank_id is None:
+                loaded_bank_id = store.find_bank(bank_hash)
+            if loaded_bank_id is None:
+                loaded_questions = shared_cache.get(bank_hash) or []
+            if loaded_bank_id is None and not loaded_questions:
+
+                def keep(questions, key=bank_hash):
+                    with span('dedup'):
+                        kept, dedup_reports[key] = dedupe_questions(questions, dedup_threshold)
+                    return kept
+
+                with span('parse'):
+                    loaded_questions, loaded_bank_id = load_questions_from_columnar(
+                        file_bytes, bank_name, keep if dedup else None)
+                if loaded_bank_id is not None:
+                    verified[bank_hash] = loaded_bank_id
+                elif loaded_questions:
+                    loaded_questions = shared_cache.publish(bank_hash, loaded_questions) or loaded_questions
+        elif file_type == 'application/json':
+            bank_hash = content_hash(file_bytes, json_version)
+            loaded_bank_id = store.find_bank(bank_hash)
+            if loaded_bank_id is None:
+                loaded_questions = shared_cache.get_or_parse(
+                    file_bytes, json_version,
+                    lambda: parse_bank(lambda: load_questions_from_json(file_bytes), bank_hash))
         elif file_type == 'text/plain':
-            loaded_questions = clean_and_parse_nbme_text(file_content)
+            bank_hash = content_hash(file_bytes, txt_version)
+            loaded_bank_id = store.find_bank(bank_hash)
+            if loaded_bank_id is None:
+                # Large uncached dumps are parsed in the background after Load Questions is clicked
+                if len(file_bytes) >= STREAM_THRESHOLD_BYTES and bank_hash not in shared_cache:
+                    stream_bytes = file_bytes
+                else:
+                    loaded_questions = shared_cache.get_or_parse(
+                        file_bytes, txt_version,
+                        lambda: parse_bank(lambda: parse_nbme_upload(file_bytes), bank_hash))
         else:
-            st.error("Unsupported file type. Please upload a JSON or TXT file.")
+            st.error("Unsupported file type. Please upload a JSON, TXT, Parquet or Arrow file.")
     # Else if text pasted, parse that
     elif raw_text_input.strip():
-        loaded_questions = clean_and_parse_nbme_text(raw_text_input)
+        bank_hash = content_hash(raw_text_input.encode("utf-8"), txt_version)
+        bank_name = "Pasted questions"
+        # Runs on every rerun so block problems stay listed while the user fixes them;
+        # unchanged blocks come from the block cache
+        with span('parse-paste'):
+            pasted = clean_and_parse_nbme_text(raw_text_input)
+        loaded_bank_id = store.find_bank(bank_hash)
+        if loaded_bank_id is None:
+            # Every edit is a new draft, so drafts stay out of the shared disk cache (they
+            # would push real banks out of it); dedup reuses the signatures of unchanged
+            # questions, and the bank is stored only when Load Questions is clicked
+            loaded_questions = pasted
+            if dedup and pasted:
+                with span('dedup'):
+                    loaded_questions, paste_report = dedupe_questions(pasted, dedup_threshold, SIGNATURE_CACHE)
+    # Else a compiled bank already on the server: opening it only maps the file
+    elif os.path.isdir(COMPILED_BANK_DIR):
+        compiled = sorted(f for f in os.listdir(COMPILED_BANK_DIR) if f.endswith(COMPILED_SUFFIX))
+        choice = st.selectbox("Or open a compiled bank", [None] + compiled,
+                              format_func=lambda f: "—" if f is None else f)
+        if choice is not None:
+            try:
+                loaded_bank_id = store.register_file(os.path.join(COMPILED_BANK_DIR, choice))
+            except BankFormatError as e:
+                st.error(f"Failed to open compiled bank: {e}")
+
+    cache_stats = shared_cache.stats()
+    st.caption(f"Parse cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses in this process; "
+               f"{cache_stats['entries']} banks in {cache_stats['bytes'] // 1024} KB "
+               f"(limit {cache_stats['max_bytes'] // (1024 * 1024)} MB) shared by all server processes")
+
+    report = paste_report if paste_report is not None else dedup_reports.get(bank_hash)
+    if report is not None and report.matches:
+        st.write(report.summary())
+        st.dataframe([{'Dropped Q': m.duplicate + 1, 'Kept Q': m.kept + 1,
+                       'Similarity': round(m.similarity, 2), 'Question': m.text}
+                      for m in report.matches[:200]], use_container_width=True)
+
+    def start_stream_import(data: bytes, key: str, name: str, merge: bool, threshold: float):
+        # (bank_id, ingest) for a large upload: this process's import of it, or a watch on
+        # another process's import that starts over here if that importer's claim lapses
+        ingests, ingests_lock = get_active_ingests()
+        with ingests_lock:
+            active = ingests.get(key)
+            if active is not None and active[1].error is not None:
+                store.abandon_bank(active[0])
+                active = None
+            if active is not None:
+                return active
+            bank_id, owned = store.claim_bank(key, name)
+            if not owned:
+                info = store.bank_info(bank_id)
+                if info is not None and info['complete']:
+                    return bank_id, None
+                return bank_id, ImportWatch(
+                    store, bank_id, lambda: start_stream_import(data, key, name, merge, threshold))
+
+            def finish_import(_, bank_id=bank_id):
+                store.finish_bank(bank_id)
+                ingests.pop(key, None)
+
+            # Streamed banks are deduplicated batch by batch against everything before them
+            if merge:
+                dedup_index = NearDuplicateIndex(threshold)
+                dedup_reports[key] = dedup_index.report
+                keep = dedup_index.filter
+            else:
+                keep = list
+            ingest = StreamingIngest(
+                io.BytesIO(data),
+                sink=lambda batch, bank_id=bank_id, keep=keep: store.append_questions(bank_id, keep(batch)),
+                on_done=finish_import)
+            active = ingests[key] = (bank_id, ingest.start())
+        return active
+
+    if stream_bytes is not None:
+        st.write(f"Large file ({len(stream_bytes) // 1024} KB): the quiz starts as soon as the first question is parsed.")
+        if st.button("Load Questions"):
+            active = start_stream_import(stream_bytes, bank_hash, bank_name, dedup, dedup_threshold)
+            st.session_state.bank_id, st.session_state.ingest = active
+            st.session_state.order = None
+            st.session_state.option_seed = None
+            st.session_state.score = 0
+            st.session_state.current_q = 0
+            st.session_state.shown_q = None
+            st.session_state.submitted = False
+            st.session_state.user_answer = None
+            st.session_state.review_mode = False
+            st.session_state.answers_log = []
+            st.session_state.incorrect_log = []
+            st.session_state.review_md = {}
+            st.session_state.randomized = False
+            st.session_state.search_picks = []
+            st.session_state.start_time = time.time()
+            st.session_state.block_deadline = None
+            st.session_state.block_limit = None
+            # Give the parser a moment so the first question is usually ready on rerun
+            if active[1] is not None:
+                active[1].wait(0.2)
+            st.rerun()
 
-    if loaded_questions:
+    if loaded_questions or loaded_bank_id is not None:
         if st.button("Load Questions"):
-            st.session_state.questions = loaded_questions
+            if loaded_bank_id is None:
+                with span('import'):
+                    loaded_bank_id = store.import_bank(loaded_questions, bank_hash, bank_name)
+                if paste_report is not None:
+                    dedup_reports[bank_hash] = paste_report
+            st.session_state.bank_id = loaded_bank_id
+            index_bank(loaded_bank_id)
+            st.session_state.order = None
+            st.session_state.option_seed = None
+            st.session_state.ingest = None
             st.session_state.score = 0
             st.session_state.current_q = 0
+            st.session_state.shown_q = None
             st.session_state.submitted = False
             st.session_state.user_answer = None
             st.session_state.review_mode = False
             st.session_state.answers_log = []
+            st.session_state.incorrect_log = []
+            st.session_state.review_md = {}
             st.session_state.randomized = False
+            st.session_state.search_picks = []
             st.session_state.start_time = time.time()
-            st.success(f"{len(loaded_questions)} questions loaded successfully! Starting fresh.")
-            st.experimental_rerun()
+            st.session_state.block_deadline = None
+            st.session_state.block_limit = None
+            st.success(f"{store.bank_size(loaded_bank_id)} questions loaded successfully! Starting fresh.")
+            st.rerun()
+
+# -- Background ingestion status --
+ingest = current_ingest()
+ingesting = ingest is not None and not ingest.done
+if ingesting:
+    st.info(f"Loading question bank... {len(current_bank())} questions ready so far.")
+elif ingest is not None and ingest.error is not None:
+    st.error(f"Stopped loading the question bank: {ingest.error}")
 
 # -- Randomize Questions Button --
-if not st.session_state.randomized and st.button("Randomize Questions"):
-    random.shuffle(st.session_state.questions)
+# Disabled while a bank is still streaming in, since its size is not known yet
+# Only this session's permutation changes; the shared bank is never reordered
+if not st.session_state.randomized and not ingesting:
+    shuffle_options = st.checkbox("Also shuffle answer options")
+if not st.session_state.randomized and not ingesting and st.button("Randomize Questions"):
+    seed = secrets.randbits(32)
+    with span('shuffle'):
+        st.session_state.order = shuffled_order(len(current_bank()), seed)
+    st.session_state.option_seed = seed if shuffle_options else None
     st.session_state.current_q = 0
+    st.session_state.shown_q = None
     st.session_state.score = 0
     st.session_state.answers_log = []
+    st.session_state.incorrect_log = []
+    st.session_state.review_md = {}
     st.session_state.submitted = False
     st.session_state.user_answer = None
     st.session_state.review_mode = False
     st.session_state.randomized = True
     st.session_state.start_time = time.time()
+    st.session_state.block_deadline = None
+    st.session_state.block_limit = None
     st.success("Questions randomized! Starting fresh.")
-    st.experimental_rerun()
+    st.rerun()
+
+# -- Search questions --
+# Matches question, options and explanation; "quoted phrases" must appear, prefix* expands.
+# Ticked results can be started as a custom quiz, which is just another session ordering.
+def toggle_search_pick(position: int):
+    picks = st.session_state.search_picks
+    if position in picks:
+        picks.remove(position)
+    else:
+        picks.append(position)
+
+def start_ordered_quiz(positions: List[int]):
+    st.session_state.order = array('I', positions)
+    st.session_state.option_seed = None
+    st.session_state.current_q = 0
+    st.session_state.shown_q = None
+    st.session_state.score = 0
+    st.session_state.answers_log = []
+    st.session_state.incorrect_log = []
+    st.session_state.review_md = {}
+    st.session_state.submitted = False
+    st.session_state.user_answer = None
+    st.session_state.review_mode = False
+    st.session_state.randomized = True
+    st.session_state.start_time = time.time()
+    st.session_state.block_deadline = None
+    st.session_state.block_limit = None
+
+def start_search_quiz():
+    start_ordered_quiz(st.session_state.search_picks)
+    st.session_state.search_picks = []
+
+if not ingesting:
+    with st.expander("Search questions"):
+        bank_id = st.session_state.bank_id
+        index_bank(bank_id)
+        index = get_search_registry().get(bank_id)
+        query = st.text_input("Search", placeholder='e.g. "heart failure" beta-blocker pheo*')
+        if index is None:
+            st.caption("Building the search index for this bank...")
+        elif query.strip():
+            bank = current_bank()
+            with span('search'):
+                hits = index.search(query, limit=25)
+            st.caption(f"{len(hits)} matching questions" + (" (top 25)" if len(hits) == 25 else ""))
+            for position, _ in hits:
+                st.checkbox(f"Q{position + 1}: {bank[position]['question'][:120]}",
+                            value=position in st.session_state.search_picks,
+                            key=f"search_pick_{bank_id}_{position}",
+                            on_change=toggle_search_pick, args=(position,))
+        picks = st.session_state.search_picks
+        if picks:
+            st.button(f"Start quiz with {len(picks)} selected", on_click=start_search_quiz)
+
+# -- Custom blocks by tag --
+# e.g. 40 random cardio or pharm questions not yet seen or last answered wrong. History
+# is this session's answers plus, with a study profile, its saved spaced-repetition cards.
+BLOCK_FILTERS = ["All questions", "Unseen", "Answered wrong", "Unseen or answered wrong"]
+
+def answer_history(bank_id: int) -> Tuple[List[int], List[int]]:
+    # (seen, last answered wrong) positions; this session's latest answer wins
+    last = {}
+    if st.session_state.srs_profile.strip():
+        for position, card in get_scheduler_store().load(srs_user_id(), bank_id).items():
+            last[position] = not (card.reps == 0 and card.lapses > 0)
+    last.update(st.session_state.attempts.get(bank_id, {}))
+    return list(last), [p for p, correct in last.items() if not correct]
+
+def block_filter_mask(tag_index: TagIndex, bank_id: int, status: str):
+    if status == BLOCK_FILTERS[0]:
+        return None
+    seen, wrong = answer_history(bank_id)
+    wrong = tag_index.positions(wrong)
+    if status == BLOCK_FILTERS[2]:
+        return wrong
+    unseen = tag_index.complement(tag_index.positions(seen))
+    return unseen if status == BLOCK_FILTERS[1] else unseen | wrong
+
+if not ingesting:
+    with st.expander("Build a custom block"):
+        bank_id = st.session_state.bank_id
+        index_bank(bank_id)
+        tag_index = get_tag_registry().get(bank_id)
+        if tag_index is None:
+            st.caption("Building the tag index for this bank...")
+        else:
+            if not tag_index.tags:
+                st.caption("This bank has no tags; blocks are drawn from all questions. "
+                           "Add a Tags: line (TXT) or a \"tags\" list (JSON) to filter by topic.")
+            chosen_tags = st.multiselect("Tags", tag_index.tags, key=f"block_tags_{bank_id}",
+                                         format_func=lambda t: f"{t} ({tag_index.counts[t]})")
+            match_all = st.radio("Questions with", ["any selected tag", "all selected tags"],
+                                 horizontal=True, disabled=len(chosen_tags) < 2) == "all selected tags"
+            status = st.selectbox("Include", BLOCK_FILTERS, index=3)
+            block_size = st.number_input("Block size", min_value=1, max_value=max(1, tag_index.n_items),
+                                         value=min(40, max(1, tag_index.n_items)))
+            if st.button("Start custom block"):
+                with span('build-block'):
+                    block = tag_index.block(int(block_size), chosen_tags, match_all,
+                                            include=block_filter_mask(tag_index, bank_id, status),
+                                            seed=secrets.randbits(32))
+                if block:
+                    start_ordered_quiz(block)
+                    st.rerun()
+                st.warning("No questions match these filters.")
+
+# -- Timed blocks --
+# A fixed number of random questions against one time limit, as on the NBME. The
+# countdown runs in the browser (see render_clock), so a running timer costs the
+# server nothing; the deadline is checked when an answer is submitted.
+def start_timed_block(size: int, minutes: float):
+    n = len(current_bank())
+    start_ordered_quiz(random.Random(secrets.randbits(32)).sample(range(n), min(size, n)))
+    st.session_state.block_limit = minutes * 60
+    st.session_state.block_deadline = st.session_state.start_time + minutes * 60
+
+if not ingesting:
+    with st.expander("Timed block"):
+        n_bank = len(current_bank())
+        col1, col2 = st.columns(2)
+        with col1:
+            block_size = st.number_input("Questions", min_value=1, max_value=max(1, n_bank),
+                                         value=min(BLOCK_SIZE, max(1, n_bank)), key='timed_block_size')
+        with col2:
+            block_minutes = st.number_input("Minutes", min_value=1, max_value=600, value=BLOCK_MINUTES,
+                                            key='timed_block_minutes')
+        st.caption(f"{block_minutes * 60 / block_size:.0f} seconds per question. Answers submitted after "
+                   "the time is up are not counted.")
+        st.button("Start timed block", on_click=start_timed_block, args=(int(block_size), block_minutes),
+                  disabled=n_bank == 0)
+
+# -- Export --
+# Parquet (compressed, for analysis tools) or Arrow files of the current bank and of
+# answers from the event log. Built only when asked for, in row batches.
+if not ingesting:
+    with st.expander("Export (Parquet/Arrow)"):
+        export_format = st.radio("Format", ["parquet", "arrow"], horizontal=True)
+        bank_id = st.session_state.bank_id
+        col1, col2 = st.columns(2)
+        try:
+            with col1:
+                if st.button("Export this bank"):
+                    st.download_button(f"Download bank.{export_format}", bank_to_bytes(current_bank(), export_format),
+                                       file_name=f"bank-{bank_id}.{export_format}")
+            with col2:
+                scope = "all sessions" if ADMIN_MODE else "this session"
+                if st.button(f"Export answers ({scope})"):
+                    get_event_log().flush()
+                    events = iter_events(EVENT_SINK, os.path.join(DATA_DIR, SINK_FILES[EVENT_SINK]), bank_id)
+                    if not ADMIN_MODE:
+                        events = (e for e in events if e['session_id'] == st.session_state.session_id)
+                    st.download_button(f"Download answers.{export_format}", events_to_bytes(events, export_format),
+                                       file_name=f"answers-{bank_id}.{export_format}")
+        except ImportError as e:
+            st.error(str(e))
+
+# -- Quiz actions --
+# These run as button callbacks, before the rerun Streamlit already does for the click,
+# so the new state is rendered by that rerun and no second st.rerun() is needed.
+def clear_answer():
+    st.session_state.submitted = False
+    st.session_state.user_answer = None
+
+def go_back():
+    st.session_state.current_q -= 1
+    clear_answer()
+
+def go_next():
+    st.session_state.current_q += 1
+    clear_answer()
+
+def time_up() -> bool:
+    deadline = st.session_state.block_deadline
+    return deadline is not None and time.time() > deadline
+
+def submit_answer(q: Dict, position: int, radio_key: str):
+    # The browser countdown is only a display; the deadline is enforced here
+    deadline = st.session_state.block_deadline
+    if deadline is not None and time.time() > deadline + DEADLINE_GRACE_S:
+        return
+    try:
+        key = answer_index(q)
+    except ValueError as e:
+        # Only banks stored before answer indices were kept can get here
+        st.error(f"This question cannot be graded: {e}")
+        return
+    chosen = st.session_state[radio_key]
+    user_answer = q['options'][chosen]
+    # Compared by index, so two options with the same text cannot both count as correct
+    correct = chosen == key
+    st.session_state.user_answer = user_answer
+    st.session_state.submitted = True
+    st.session_state.attempts.setdefault(st.session_state.bank_id, {})[position] = correct
+    if correct:
+        st.session_state.score += 1
+    else:
+        st.session_state.incorrect_log.append(len(st.session_state.answers_log))
+    latency_ms = int((time.time() - (st.session_state.shown_at or time.time())) * 1000)
+    # Compact entry: the question text stays in the bank and is fetched again for review
+    st.session_state.answers_log.append(Answer(position, chosen, correct, latency_ms))
+    get_event_log().record(st.session_state.session_id, st.session_state.bank_id, position,
+                           chosen, correct, latency_ms)
+    if st.session_state.adaptive:
+        card = current_scheduler().review(position, correct, latency_ms)
+        get_scheduler_store().save(srs_user_id(), st.session_state.bank_id, position, card)
+
+def srs_next():
+    st.session_state.srs_last = st.session_state.srs_position
+    st.session_state.srs_position = None
+    st.session_state.srs_seen += 1
+    clear_answer()
+
+def srs_skip():
+    current_scheduler().postpone(st.session_state.srs_position)
+    srs_next()
+
+def switch_study_mode():
+    # An answer submitted in one mode must not carry its feedback over to the other
+    clear_answer()
+    st.session_state.shown_q = None
+    st.session_state.srs_position = None
+
+def restart_test():
+    st.session_state.score = 0
+    st.session_state.current_q = 0
+    st.session_state.shown_q = None
+    st.session_state.submitted = False
+    st.session_state.user_answer = None
+    st.session_state.review_mode = False
+    st.session_state.answers_log = []
+    st.session_state.incorrect_log = []
+    st.session_state.review_md = {}
+    st.session_state.start_time = time.time()
+    # A timed block restarts with its full time limit
+    limit = st.session_state.block_limit
+    st.session_state.block_deadline = st.session_state.start_time + limit if limit else None
+
+def set_review_page(page: int):
+    st.session_state.review_page = page
 
 # -- Review Mode --
 if st.session_state.review_mode:
     st.header("Review Mode")
-    for idx, entry in enumerate(st.session_state.answers_log):
-        st.write(f"**Q{idx + 1}:** {entry['question']}")
-        st.write(f"Your answer: {entry['user_answer']}")
-        if entry['user_answer'] == entry['correct_answer']:
-            st.success("Correct")
-        else:
-            st.error(f"Incorrect (Correct: {entry['correct_answer']})")
-        st.write(f"Explanation: {entry['explanation']}")
-        st.markdown("---")
-    if st.button("Restart Test"):
-        st.session_state.score = 0
-        st.session_state.current_q = 0
-        st.session_state.submitted = False
-        st.session_state.user_answer = None
-        st.session_state.review_mode = False
-        st.session_state.answers_log = []
-        st.session_state.start_time = time.time()
-        st.experimental_rerun()
+    # Only the current page is rendered; "incorrect only" reads the index kept at submit time
+    log = st.session_state.answers_log
+    col1, col2 = st.columns(2)
+    with col1:
+        review_filter = st.radio("Show", ["All answers", "Incorrect only"], horizontal=True)
+    with col2:
+        page_size = st.selectbox("Per page", REVIEW_PAGE_SIZES, index=0)
+    indices = st.session_state.incorrect_log if review_filter == "Incorrect only" else range(len(log))
+    n_pages = max(1, -(-len(indices) // page_size))
+    page = min(st.session_state.review_page, n_pages - 1)
 
-# -- Quiz Mode --
-else:
-    if st.session_state.current_q < len(st.session_state.questions):
-        q = st.session_state.questions[st.session_state.current_q]
-        st.write(f"**Question {st.session_state.current_q + 1}/{len(st.session_state.questions)}**")
-        st.progress((st.session_state.current_q) / len(st.session_state.questions))
+    with span('render-review'):
+        for idx in indices[page * page_size:(page + 1) * page_size]:
+            st.markdown(render_review_entry(idx, log[idx]))
+    if not indices:
+        st.write("Nothing to review.")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if page > 0:
+            st.button("Previous page", on_click=set_review_page, args=(page - 1,))
+    with col2:
+        st.write(f"Page {page + 1} of {n_pages}")
+    with col3:
+        if page < n_pages - 1:
+            st.button("Next page", on_click=set_review_page, args=(page + 1,))
+    st.button("Restart Test", on_click=restart_test)
+
+# -- Client-side clock --
+# Counts up from the start (or down to a timed block's deadline) in the browser, so the
+# display stays live without reruns. The server sends the time elapsed or remaining
+# rather than epoch times, so a browser whose clock is off still shows the right time.
+CLOCK_HTML = """
+<div id="clock" style="font-family: sans-serif; font-size: 1.1rem; padding: 0.4rem 0.8rem;
+     border-radius: 0.5rem; background: #f0f2f6; color: #31333f; display: inline-block;"></div>
+<script>
+const loaded = Date.now(), elapsed = %(elapsed)d, remaining = %(remaining)s;
+const el = document.getElementById('clock');
+const fmt = s => { s = Math.max(0, Math.floor(s / 1000));
+  const h = Math.floor(s / 3600), m = Math.floor(s / 60) %% 60, sec = String(s %% 60).padStart(2, '0');
+  return (h ? h + ':' + String(m).padStart(2, '0') : m) + ':' + sec; };
+function tick() {
+  const since = Date.now() - loaded;
+  if (remaining === null) { el.textContent = 'Time elapsed ' + fmt(elapsed + since); return; }
+  const left = remaining - since;
+  el.textContent = left > 0 ? 'Time remaining ' + fmt(left) : "Time's up";
+  if (left <= 300000) { el.style.background = '#ffe0e0'; el.style.color = '#a00'; }
+}
+tick(); setInterval(tick, 1000);
+</script>
+"""
+
+def render_clock():
+    now = time.time()
+    deadline = st.session_state.block_deadline
+    html = CLOCK_HTML % {'elapsed': int((now - st.session_state.start_time) * 1000),
+                         'remaining': 'null' if deadline is None else int((deadline - now) * 1000)}
+    # An iframe of its own keeps the script's globals and interval apart from the page;
+    # Streamlit versions without st.iframe have components.html for it
+    if hasattr(st, 'iframe'):
+        st.iframe(html, height=50)
+    else:
+        import streamlit.components.v1 as components
+        components.html(html, height=50)
+
+# -- Question rendering shared by the quiz and adaptive panels --
+def mark_shown(shown_key):
+    # Answer latency is measured from the first time a question is shown
+    if st.session_state.shown_q != shown_key:
+        st.session_state.shown_q = shown_key
+        st.session_state.shown_at = time.time()
+
+def render_question(q: Dict, position: int, radio_key: str):
+    with span('render-question'):
+        if q.get('tags'):
+            st.caption(" · ".join(q['tags']))
         st.write(q['question'])
+        # The radio returns the option's index in the bank, whatever order it is shown in
+        option_perm = option_order(len(q['options']), position, st.session_state.option_seed)
+        st.radio("Select your answer:", list(option_perm), index=0, key=radio_key,
+                 format_func=lambda i: q['options'][i])
 
-        # Timer for each question (optional)
-        st.info(f"Time elapsed: {st.session_state['elapsed_time']} seconds")
+def render_feedback(q: Dict, on_next):
+    log = st.session_state.answers_log
+    if log and log[-1].correct:
+        st.success("Correct!")
+    else:
+        st.error(f"Incorrect. Correct answer: {q['answer']}")
+    st.info(f"Explanation: {q['explanation']}")
+    st.button("Next Question", on_click=on_next)
+
+# -- Quiz Mode --
+# The quiz panel is a fragment: its buttons rerun only this function, not the
+# uploader, parse path, title and timer above it.
+@fragment
+def quiz_panel():
+    save_checkpoint()
+    ingest = current_ingest()
+    ingesting = ingest is not None and not ingest.done
+    expired = time_up()
+    # A timed block's time stops at its deadline
+    end = st.session_state.block_deadline if expired else time.time()
+    elapsed_time = int(end - st.session_state.start_time)
+    total = quiz_length()
+    if st.session_state.current_q < total and not expired:
+        position = position_at(st.session_state.current_q)
+        q = current_bank()[position]
+        mark_shown(st.session_state.current_q)
+        st.write(f"**Question {st.session_state.current_q + 1}/{total}**")
+        st.progress((st.session_state.current_q) / total)
+
+        render_clock()
 
         # Answer Selection
-        user_answer = st.radio("Select your answer:", q['options'], index=0, key=f'answer_radio_{st.session_state.current_q}')
+        radio_key = f'answer_radio_{st.session_state.current_q}'
+        render_question(q, position, radio_key)
 
         col1, col2, col3 = st.columns(3)
         with col1:
-            if st.session_state.current_q > 0 and st.button("Back"):
-                st.session_state.current_q -= 1
-                st.session_state.submitted = False
-                st.session_state.user_answer = None
-                st.experimental_rerun()
+            if st.session_state.current_q > 0:
+                st.button("Back", on_click=go_back)
         with col2:
-            if not st.session_state.submitted and st.button("Submit Answer"):
-                st.session_state.user_answer = user_answer
-                st.session_state.submitted = True
-                if user_answer == q['answer']:
-                    st.session_state.score += 1
-                st.session_state.answers_log.append({
-                    'question': q['question'],
-                    'user_answer': user_answer,
-                    'correct_answer': q['answer'],
-                    'explanation': q['explanation']
-                })
-                st.experimental_rerun()
+            if not st.session_state.submitted:
+                st.button("Submit Answer", on_click=submit_answer, args=(q, position, radio_key))
         with col3:
-            if st.button("Skip"):
-                st.session_state.current_q += 1
-                st.session_state.submitted = False
-                st.session_state.user_answer = None
-                st.experimental_rerun()
+            st.button("Skip", on_click=go_next)
 
         if st.session_state.submitted:
-            if st.session_state.user_answer == q['answer']:
-                st.success("Correct!")
-            else:
-                st.error(f"Incorrect. Correct answer: {q['answer']}")
-            st.info(f"Explanation: {q['explanation']}")
-            if st.button("Next Question"):
-                st.session_state.current_q += 1
-                st.session_state.submitted = False
-                st.session_state.user_answer = None
-                st.experimental_rerun()
+            render_feedback(q, go_next)
+    elif ingesting:
+        # The user is ahead of the parser: wait briefly for the next question instead of finishing
+        st.write("Waiting for the next question to finish loading...")
+        ingest.wait(0.5)
+        st.rerun()
     else:
         st.header("Test Completed!")
-        st.write(f"Your score: **{st.session_state.score} / {len(st.session_state.questions)}**")
-        st.info(f"Total time: {st.session_state['elapsed_time']} seconds")
+        if expired:
+            st.warning("Time is up: the block ended before every question was answered.")
+        st.write(f"Your score: **{st.session_state.score} / {total}**")
+        st.info(f"Total time: {elapsed_time} seconds")
+        log = st.session_state.answers_log
+        if log:
+            st.caption(f"{len(log)} answered, {sum(a.latency_ms for a in log) / len(log) / 1000:.0f} seconds "
+                       "per answered question on average")
         if st.button("Review Answers"):
+            # Review Mode lives outside the fragment, so this one needs a full rerun
             st.session_state.review_mode = True
-            st.experimental_rerun()
-        if st.button("Restart Test"):
-            st.session_state.score = 0
-            st.session_state.current_q = 0
-            st.session_state.submitted = False
-            st.session_state.user_answer = None
-            st.session_state.review_mode = False
-            st.session_state.answers_log = []
-            st.session_state.start_time = time.time()
-            st.experimental_rerun()
-
-import re
-
-def parse_questions(raw_text):
-    # Split by question numbers (e.g., "1.", "2.", etc.) - crude but works for your text
-    question_chunks = re.split(r'\n\s*\d+\.\s', raw_text)[1:]  # skip empty before first
-
-    questions = []
-
-    for chunk in question_chunks:
-        # Extract question text - up to first option (usually "A )" or "A)")
-        question_match = re.split(r'\nA\s?\)', chunk, maxsplit=1)
-        if len(question_match) < 2:
-            continue  # skip malformed
-
-        question_text = question_match[0].strip().replace('\n', ' ')
-
-        # Extract options (A-E)
-        options_text = question_match[1]
-        options = {}
-        for opt in ['A', 'B', 'C', 'D', 'E']:
-            # Find option text between this option and next (or end)
-            pattern = rf'{opt}\s?\)(.*?)(?=(?:[ABCDE]\s?\))|Correct Answer:|Incorrect Answers:|$)'
-            match = re.search(pattern, options_text, re.DOTALL)
-            if match:
-                option_clean = match.group(1).strip().replace('\n', ' ')
-                options[opt] = option_clean
-
-        # Extract correct answer letter
-        correct_match = re.search(r'Correct Answer:\s*([A-E])', chunk)
-        correct_answer = correct_match.group(1) if correct_match else ''
-
-        # Extract explanation: from Correct Answer up to Educational Objective or next question or end
-        explanation_match = re.search(r'Correct Answer:.*?\.\s*(.*?)(?:Incorrect Answers:|Educational Objective:|$)', chunk, re.DOTALL)
-        explanation = explanation_match.group(1).strip().replace('\n', ' ') if explanation_match else ''
-
-        # Compose question dict
-        question = {
-            'Question': question_text,
-            'Options': options,
-            'Answer': correct_answer,
-            'Explanation': explanation
-        }
-        questions.append(question)
+            st.session_state.review_page = 0
+            st.rerun()
+        st.button("Restart Test", on_click=restart_test)
 
-    return questions
+# -- Adaptive study mode --
+# Replaces the linear current_q walk: the scheduler picks the next question from
+# this profile's due times and past correctness.
+@fragment
+def adaptive_panel():
+    save_checkpoint()
+    ingest = current_ingest()
+    if ingest is not None and not ingest.done:
+        st.info("Adaptive study starts once the question bank has finished loading.")
+        return
+    scheduler = current_scheduler()
+    if st.session_state.srs_position is None:
+        st.session_state.srs_position = scheduler.next_position(exclude=st.session_state.srs_last)
+    position = st.session_state.srs_position
+    if position is None:
+        st.write("This question bank is empty.")
+        return
 
-def format_question(q):
-    formatted = f"Question: {q['Question']}\nOptions:\n"
-    for opt in ['A', 'B', 'C', 'D', 'E']:
-        if opt in q['Options']:
-            formatted += f"{opt}. {q['Options'][opt]}\n"
-    formatted += f"Answer: {q['Answer']}\n"
-    formatted += f"Explanation: {q['Explanation']}\n\n"
-    return formatted
+    q = current_bank()[position]
+    mark_shown(('srs', st.session_state.srs_seen))
+    card = scheduler.cards.get(position)
+    status = "New question" if card is None else f"Review (lapses: {card.lapses})"
+    st.write(f"**{status}** · {st.session_state.score}/{len(st.session_state.answers_log)} correct this session · "
+             f"{scheduler.new_remaining()} new questions left")
 
-# Example usage:
+    radio_key = f"srs_radio_{st.session_state.srs_seen}"
+    render_question(q, position, radio_key)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if not st.session_state.submitted:
+            st.button("Submit Answer", on_click=submit_answer, args=(q, position, radio_key))
+    with col2:
+        if not st.session_state.submitted:
+            st.button("Skip", on_click=srs_skip)
+    with col3:
+        if st.session_state.answers_log and st.button("Review Answers"):
+            st.session_state.review_mode = True
+            st.session_state.review_page = 0
+            st.rerun()
 
-raw_text = """<paste your full raw question dump here>"""
+    if st.session_state.submitted:
+        render_feedback(q, srs_next)
 
-questions = parse_questions(raw_text)
-clean_text = ''.join([format_question(q) for q in questions])
+# -- Study mode --
+st.sidebar.checkbox("Adaptive study (spaced repetition)", key='adaptive', on_change=switch_study_mode)
+if st.session_state.adaptive:
+    st.sidebar.text_input("Study profile", key='srs_profile',
+                          help="Your schedule is saved under this name and picked up next time.")
 
-with open('cleaned_questions.txt', 'w') as f:
-    f.write(clean_text)
+if not st.session_state.review_mode:
+    if st.session_state.adaptive:
+        adaptive_panel()
+    else:
+        quiz_panel()
 
-print("Questions cleaned and saved to cleaned_questions.txt")
+save_checkpoint()
 
+# -- Profiling --
+# Runs cut short by st.rerun()/st.stop() are not timed; their spans still are
+if PROFILER.enabled:
+    PROFILER.record('script-run', time.perf_counter() - run_started)
+    PROFILER.dump(PROFILE_DIR)
+    if debug_requested():
+        render_profile_panel()
+if STATE_SIZES:
+    dump_state_sizes(os.path.join(PROFILE_DIR, 'state-sizes'), st.session_state.session_id, st.session_state)
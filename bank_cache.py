@@ -0,0 +1,257 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Sequence
+
+from compiled_bank import SUFFIX, BankFormatError, MappedBank, compile_bank
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: concurrent misses there may both parse, and the last rename wins
+    fcntl = None
+
+
+# -- Content hashing --
+def content_hash(data: bytes, parser_version: str) -> str:
+    # The parser version is part of the key so a parser change never serves stale results
+    h = hashlib.sha256()
+    h.update(parser_version.encode('utf-8'))
+    h.update(b'\0')
+    h.update(data)
+    return h.hexdigest()
+
+
+# -- Parsed bank cache --
+# Streamlit re-executes the app script on every widget click, but imported modules
+# stay loaded, so one instance of this cache is shared by every session in the process.
+class ParsedBankCache:
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_parse(self, data: bytes, parser_version: str, parse: Callable[[], Any]) -> Any:
+        key = content_hash(data, parser_version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one session parses a given bank; concurrent requests for it wait here
+        try:
+            with key_lock:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return self._entries[key]
+                    self.misses += 1
+                # Stored as a tuple so no session can shuffle or append to the shared result
+                value = tuple(parse())
+                self.put(key, value)
+            return value
+        finally:
+            # Also when parse() raises, or every failed bank would leave a lock behind
+            with self._lock:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+# Parsed paste blocks, keyed by block text (see nbme_parser.parse_nbme_blocks)
+BLOCK_CACHE = ParsedBankCache(max_entries=int(os.environ.get('ADWENBOLOBO_BLOCK_CACHE_SIZE', '20000')))
+# MinHash signatures of pasted questions, keyed by question text (see dedup.NearDuplicateIndex.add)
+SIGNATURE_CACHE = ParsedBankCache(max_entries=int(os.environ.get('ADWENBOLOBO_SIGNATURE_CACHE_SIZE', '20000')))
+
+
+# -- Cross-process bank cache --
+# Parsed banks are compiled (see compiled_bank.py) into one directory shared by every
+# server process, named by content hash. A bank parsed by one worker is attached by the
+# others with mmap, so it is neither parsed again nor copied into each process: the
+# pages live once in the OS page cache. Files are published with an atomic rename and
+# the least recently used are deleted once the directory exceeds max_bytes; a process
+# still mapping a deleted file keeps reading it until it lets go (POSIX semantics).
+class SharedBankCache:
+    def __init__(self, directory: str, max_bytes: int = 1024 ** 3, max_open: int = 64):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_open = max_open
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open: "OrderedDict[str, MappedBank]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._open or os.path.exists(self.path(key))
+
+    def _attach(self, key: str) -> Optional[MappedBank]:
+        # This process's handle if it has one, else the published file if there is one
+        with self._lock:
+            bank = self._open.get(key)
+            if bank is not None:
+                self._open.move_to_end(key)
+                return bank
+        path = self.path(key)
+        try:
+            bank = MappedBank(path)
+            os.utime(path)  # recency for eviction, seen by every process
+        except (OSError, BankFormatError):
+            return None
+        with self._lock:
+            self._open[key] = bank
+            while len(self._open) > self.max_open:
+                # Dropped handles are closed by the garbage collector once no session uses them
+                self._open.popitem(last=False)
+        return bank
+
+    def get(self, key: str) -> Optional[Sequence[Mapping]]:
+        return self._attach(key)
+
+    def publish(self, key: str, questions: Iterable[Mapping]) -> Optional[Sequence[Mapping]]:
+        compile_bank(questions, self.path(key))
+        self.evict(keep=key)
+        return self._attach(key)
+
+    def get_or_parse(self, data: bytes, parser_version: str, parse: Callable[[], Any]) -> Sequence[Mapping]:
+        key = content_hash(data, parser_version)
+        bank = self._attach(key)
+        if bank is not None:
+            self.hits += 1
+            return bank
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # One thread per process, and with fcntl one process per host, parses a given bank
+        try:
+            with key_lock, self._file_lock(key):
+                bank = self._attach(key)
+                if bank is not None:
+                    self.hits += 1
+                    return bank
+                self.misses += 1
+                questions = tuple(parse())
+                # Nothing parsed (e.g. an unreadable upload) is not published, so it is retried
+                bank = self.publish(key, questions) if questions else None
+            return bank if bank is not None else questions
+        finally:
+            # Also when parse() or publish() raises
+            with self._lock:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+
+    def _file_lock(self, key: str):
+        return _FileLock(self.path(key) + '.lock') if fcntl is not None else _NO_LOCK
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SUFFIX):
+                continue
+            try:
+                info = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue  # evicted by another process meanwhile
+            entries.append((info.st_mtime, info.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == (keep or '') + SUFFIX:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # in use on Windows, or already gone
+            # The entry's empty .lock file stays: another process may hold it right now
+            total -= size
+            removed += 1
+        self.evictions += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        files = [f for f in os.listdir(self.directory) if f.endswith(SUFFIX)]
+        return {
+            'entries': len(files),
+            'bytes': sum(os.path.getsize(os.path.join(self.directory, f)) for f in files
+                         if os.path.exists(os.path.join(self.directory, f))),
+            'max_bytes': self.max_bytes,
+            'open': len(self._open),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class _FileLock:
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self):
+        self._f = open(self.path, 'a')
+        fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+        return False
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_LOCK = _NoLock()
@@ -0,0 +1,364 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from columnar import ColumnarBank, detect_format
+from compiled_bank import MAGIC, MappedBank, read_header
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS banks (
+    bank_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_hash TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    complete INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    path TEXT,
+    owner TEXT,
+    heartbeat REAL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    bank_id INTEGER NOT NULL REFERENCES banks(bank_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (bank_id, position)
+) WITHOUT ROWID;
+"""
+
+IMPORT_BATCH_SIZE = 500
+# An unfinished import whose importer has not written for this long is presumed dead
+# (crashed worker) and may be reclaimed; live importers touch it with every batch.
+STALE_IMPORT_S = 60.0
+IMPORT_POLL_S = 0.2
+# Columns added after the first release, for stores created before them
+LATER_COLUMNS = (('path', 'TEXT'), ('owner', 'TEXT'), ('heartbeat', 'REAL'))
+
+
+# -- Persistent question bank store --
+# Banks are imported once (keyed by content hash) and sessions fetch single questions
+# by (bank_id, position). One instance is shared by every session in the process;
+# WAL mode lets other server processes read while one of them imports.
+class BankStore:
+    def __init__(self, path: str, cache_size: int = 512):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, Mapping]" = OrderedDict()
+        self._lock = threading.RLock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        self._mapped: Dict[int, Union[MappedBank, ColumnarBank]] = {}
+        # Identifies this store's imports in the banks table; threads sharing the store
+        # are kept apart by the per-hash locks instead
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._importing: Dict[str, int] = {}  # content hash -> bank_id this process is importing
+        self._hash_locks: Dict[str, list] = {}  # content hash -> [lock, users]
+
+    def _migrate(self) -> None:
+        columns = [r[1] for r in self._conn.execute('PRAGMA table_info(banks)')]
+        for column, kind in LATER_COLUMNS:
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE banks ADD COLUMN {column} {kind}')
+        # Stores created without AUTOINCREMENT reuse the id of a deleted bank; the table is
+        # rebuilt once (foreign keys are still off here, so no questions cascade away)
+        sql = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'banks'").fetchone()[0]
+        if 'AUTOINCREMENT' not in sql.upper():
+            names = ', '.join(r[1] for r in self._conn.execute('PRAGMA table_info(banks)'))
+            create = SCHEMA.split(';')[0].replace('IF NOT EXISTS banks', 'banks_new')
+            self._conn.executescript(f"""
+                BEGIN IMMEDIATE;
+                {create};
+                INSERT INTO banks_new ({names}) SELECT {names} FROM banks;
+                DROP TABLE banks;
+                ALTER TABLE banks_new RENAME TO banks;
+                COMMIT;
+            """)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # -- Import --
+    def find_bank(self, content_hash: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT bank_id FROM banks WHERE content_hash = ? AND complete = 1', (content_hash,)).fetchone()
+        return row[0] if row else None
+
+    @contextmanager
+    def _hash_lock(self, content_hash: str):
+        # One importer per content hash in this process; the entry goes when nobody uses it
+        with self._lock:
+            entry = self._hash_locks.setdefault(content_hash, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._hash_locks.pop(content_hash, None)
+
+    def claim_bank(self, content_hash: str, name: str) -> Tuple[int, bool]:
+        # (bank_id, True) when the caller now owns the import and must fill and finish it;
+        # (bank_id, False) when the bank is complete or another importer is still live.
+        # Only an unfinished row nobody is working on (stale heartbeat, or one of this
+        # process's own imports that was abandoned) is discarded and started over.
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT bank_id, complete, owner, heartbeat FROM banks WHERE content_hash = ?',
+                    (content_hash,)).fetchone()
+                if row is not None:
+                    bank_id, complete, owner, heartbeat = row
+                    abandoned = owner == self.owner and self._importing.get(content_hash) != bank_id
+                    if complete or (not abandoned and (heartbeat or 0) > now - STALE_IMPORT_S):
+                        self._conn.execute('COMMIT')
+                        return bank_id, False
+                    self._conn.execute('DELETE FROM banks WHERE bank_id = ?', (bank_id,))
+                cur = self._conn.execute(
+                    'INSERT INTO banks (content_hash, name, created, owner, heartbeat) VALUES (?, ?, ?, ?, ?)',
+                    (content_hash, name, now, self.owner, now))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._importing[content_hash] = cur.lastrowid
+        return cur.lastrowid, True
+
+    def append_questions(self, bank_id: int, questions: List[Dict]) -> int:
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('SELECT size FROM banks WHERE bank_id = ?', (bank_id,)).fetchone()
+                if row is None:
+                    raise ValueError(f'bank {bank_id} no longer exists (its import was reclaimed as stale)')
+                start = row[0]
+                self._conn.executemany(
+                    'INSERT INTO questions (bank_id, position, payload) VALUES (?, ?, ?)',
+                    ((bank_id, start + i, json.dumps(dict(q), ensure_ascii=False)) for i, q in enumerate(questions)))
+                self._conn.execute('UPDATE banks SET size = ?, heartbeat = ? WHERE bank_id = ?',
+                                   (start + len(questions), time.time(), bank_id))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return start + len(questions)
+
+    def _release(self, bank_id: int) -> None:
+        for key, importing in list(self._importing.items()):
+            if importing == bank_id:
+                del self._importing[key]
+
+    def finish_bank(self, bank_id: int) -> None:
+        with self._lock:
+            self._conn.execute('UPDATE banks SET complete = 1, owner = NULL WHERE bank_id = ?', (bank_id,))
+            self._release(bank_id)
+
+    def abandon_bank(self, bank_id: int) -> None:
+        # A failed import is removed at once rather than left for others to wait out
+        with self._lock:
+            self._conn.execute('DELETE FROM banks WHERE bank_id = ? AND complete = 0', (bank_id,))
+            self._release(bank_id)
+
+    def import_bank(self, questions: Iterable[Dict], content_hash: str, name: str) -> int:
+        # Concurrent imports of the same content: the first claims the bank, the others
+        # wait for it to finish (or go stale) and return the finished bank
+        with self._hash_lock(content_hash):
+            while True:
+                bank_id, owned = self.claim_bank(content_hash, name)
+                if owned:
+                    break
+                if self.find_bank(content_hash) == bank_id:
+                    return bank_id
+                time.sleep(IMPORT_POLL_S)  # another process is importing it
+            try:
+                batch = []
+                for q in questions:
+                    batch.append(q)
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        self.append_questions(bank_id, batch)
+                        batch = []
+                if batch:
+                    self.append_questions(bank_id, batch)
+                self.finish_bank(bank_id)
+            except BaseException:
+                self.abandon_bank(bank_id)
+                raise
+        return bank_id
+
+    def register_file(self, path: str, name: Optional[str] = None) -> int:
+        # Compiled and Parquet/Arrow banks stay in their file; only a catalogue row is
+        # added, keyed by the records' digest (compiled) or the file's (Parquet/Arrow), so
+        # the same bank compiled twice or copied elsewhere is one bank
+        path = os.path.abspath(path)
+        if _is_columnar(path):
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            content_hash = 'columnar:' + digest.hexdigest()
+            count = len(ColumnarBank(path))
+        else:
+            header = read_header(path)
+            content_hash = 'adwb:' + header['sha256']
+            count = header['count']
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT bank_id FROM banks WHERE content_hash = ?', (content_hash,)).fetchone()
+            if row is not None:
+                self._conn.execute('UPDATE banks SET path = ? WHERE bank_id = ?', (path, row[0]))
+                self._mapped.pop(row[0], None)
+                return row[0]
+            cur = self._conn.execute(
+                'INSERT INTO banks (content_hash, name, size, complete, created, path) VALUES (?, ?, ?, 1, ?, ?)',
+                (content_hash, name or os.path.basename(path), count, time.time(), path))
+        return cur.lastrowid
+
+    # -- Lookup --
+    def bank_info(self, bank_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT bank_id, content_hash, name, size, complete, heartbeat FROM banks WHERE bank_id = ?',
+                (bank_id,)).fetchone()
+        if row is None:
+            return None
+        return {'bank_id': row[0], 'content_hash': row[1], 'name': row[2], 'size': row[3], 'complete': bool(row[4]),
+                'heartbeat': row[5]}
+
+    def list_banks(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT bank_id, content_hash, name, size, complete FROM banks ORDER BY bank_id').fetchall()
+        return [{'bank_id': r[0], 'content_hash': r[1], 'name': r[2], 'size': r[3], 'complete': bool(r[4])}
+                for r in rows]
+
+    def bank_size(self, bank_id: int) -> int:
+        with self._lock:
+            row = self._conn.execute('SELECT size FROM banks WHERE bank_id = ?', (bank_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get_question(self, bank_id: int, position: int) -> Mapping:
+        # Cached questions are shared between sessions, so they are handed out read-only
+        key = (bank_id, position)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            row = self._conn.execute(
+                'SELECT payload FROM questions WHERE bank_id = ? AND position = ?', key).fetchone()
+            if row is None:
+                raise IndexError(f'bank {bank_id} has no question at position {position}')
+            q = json.loads(row[0])
+            q['options'] = tuple(q['options'])
+            if 'tags' in q:
+                q['tags'] = tuple(q['tags'])
+            q = MappingProxyType(q)
+            self._cache[key] = q
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return q
+
+    def bank(self, bank_id: int):
+        # Registered files are served straight from the file: compiled banks memory-mapped,
+        # Parquet/Arrow banks with explanations read per question
+        with self._lock:
+            if bank_id in self._mapped:
+                return self._mapped[bank_id]
+            row = self._conn.execute('SELECT path FROM banks WHERE bank_id = ?', (bank_id,)).fetchone()
+            if row is not None and row[0] is not None:
+                opener = ColumnarBank if _is_columnar(row[0]) else MappedBank
+                mapped = self._mapped[bank_id] = opener(row[0], bank_id)
+                return mapped
+        return StoredBank(self, bank_id)
+
+
+def _is_columnar(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return detect_format(f.read(len(MAGIC))) is not None
+
+
+# -- Following an import made elsewhere --
+# Stands in for the StreamingIngest of a bank another server process is importing, so
+# sessions treat the bank as still loading until its row is complete. The importer's
+# claim lapses when the row is deleted (abandoned) or stops being written to; `takeover`
+# then starts the import in this process and returns its (bank_id, ingest).
+class ImportWatch:
+    def __init__(self, store: BankStore, bank_id: int, takeover: Callable[[], Tuple[int, object]]):
+        self.store = store
+        self.bank_id = bank_id
+        self.takeover = takeover
+        self.error: Optional[BaseException] = None
+        self._complete = False
+
+    @property
+    def done(self) -> bool:
+        if not self._complete:
+            info = self.store.bank_info(self.bank_id)
+            self._complete = bool(info and info['complete'])
+        return self._complete
+
+    @property
+    def lapsed(self) -> bool:
+        if self.done:
+            return False
+        info = self.store.bank_info(self.bank_id)
+        return info is None or (not info['complete'] and (info['heartbeat'] or 0) < time.time() - STALE_IMPORT_S)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.done and not self.lapsed:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(IMPORT_POLL_S)
+        return self.done
+
+
+# -- Sequence view over one stored bank --
+class StoredBank:
+    def __init__(self, store: BankStore, bank_id: int):
+        self.store = store
+        self.bank_id = bank_id
+        self._size: Optional[int] = None
+
+    def __len__(self) -> int:
+        # Complete banks never change size; banks still being imported are re-read each time
+        if self._size is not None:
+            return self._size
+        info = self.store.bank_info(self.bank_id)
+        if info is None:
+            return 0
+        if info['complete']:
+            self._size = info['size']
+        return info['size']
+
+    def __getitem__(self, position: int) -> Mapping:
+        if position < 0:
+            position += len(self)
+        return self.store.get_question(self.bank_id, position)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    @property
+    def complete(self) -> bool:
+        info = self.store.bank_info(self.bank_id)
+        return bool(info and info['complete'])
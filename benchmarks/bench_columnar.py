@@ -0,0 +1,84 @@
+# Bank load cost: JSON vs. Parquet vs. Arrow IPC.
+#
+#   python benchmarks/bench_columnar.py [--questions 50000] [--repeat 3]
+#
+# "open" is what a quiz needs before the first question shows (for the columnar
+# formats only the question/options/answer columns are read), "first" adds fetching
+# question 0 with its explanation, "all" materializes every question.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar import ColumnarBank, bank_to_bytes, require_pyarrow  # noqa: E402
+from json_bank import JSONBankReader  # noqa: E402
+from synthetic import make_questions  # noqa: E402
+
+TAGS = ('cardio', 'pulm', 'renal', 'neuro', 'pharm', 'micro')
+
+
+def _time(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _plain(questions) -> list:
+    # Columnar and compiled banks hand out options and tags as tuples
+    return [{k: list(v) if isinstance(v, tuple) else v for k, v in q.items()} for q in questions]
+
+
+def _json_all(path: str) -> list:
+    with open(path, 'rb') as f:
+        return list(JSONBankReader(f))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    try:
+        require_pyarrow()
+    except ImportError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    questions = make_questions(args.questions)
+    for i, q in enumerate(questions):
+        q['tags'] = [TAGS[i % len(TAGS)], TAGS[i * 7 % len(TAGS)]]
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {'json': os.path.join(tmp, 'bank.json')}
+        with open(paths['json'], 'w', encoding='utf-8') as f:
+            json.dump(questions, f)
+        for fmt in ('parquet', 'arrow'):
+            paths[fmt] = os.path.join(tmp, f'bank.{fmt}')
+            with open(paths[fmt], 'wb') as f:
+                f.write(bank_to_bytes(questions, fmt))
+
+        print(f"{'format':<9}{'MB':>8}{'open ms':>10}{'first ms':>10}{'all ms':>10}  same output")
+        rows = {'json': (lambda: _json_all(paths['json']),
+                         lambda: _json_all(paths['json'])[0],
+                         lambda: _json_all(paths['json']))}
+        for fmt in ('parquet', 'arrow'):
+            path = paths[fmt]
+            rows[fmt] = (lambda p=path: ColumnarBank(p),
+                         lambda p=path: ColumnarBank(p)[0],
+                         lambda p=path: list(ColumnarBank(p)))
+        for fmt, (open_fn, first_fn, all_fn) in rows.items():
+            same = _plain(all_fn()) == questions
+            print(f"{fmt:<9}{os.path.getsize(paths[fmt]) / 1e6:>8.1f}"
+                  f"{_time(open_fn, args.repeat) * 1000:>10.1f}{_time(first_fn, args.repeat) * 1000:>10.1f}"
+                  f"{_time(all_fn, args.repeat) * 1000:>10.1f}  {same}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+# Throughput comparison: single-pass tokenizer vs. the per-option regex parser.
+#
+#   python benchmarks/bench_parse_questions.py [--questions 2000] [--repeat 3]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dump_converter import parse_questions, parse_questions_regex  # noqa: E402
+from synthetic import make_dump  # noqa: E402
+
+
+def _time(fn, text: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'case':<18}{'MB':>7}{'regex s':>10}{'tokenizer s':>13}{'speedup':>9}  same output")
+    for case, missing in (('well-formed', False), ('missing markers', True)):
+        text = make_dump(args.questions, missing_markers=missing)
+        regex_s = _time(parse_questions_regex, text, args.repeat)
+        token_s = _time(parse_questions, text, args.repeat)
+        same = parse_questions(text) == parse_questions_regex(text)
+        print(f"{case:<18}{len(text) / 1e6:>7.2f}{regex_s:>10.3f}{token_s:>13.3f}"
+              f"{regex_s / token_s:>8.1f}x  {same}")
+
+
+if __name__ == '__main__':
+    main()
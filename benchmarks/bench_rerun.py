@@ -0,0 +1,79 @@
+# Per-click cost of the quiz loop on a live server: fragment reruns vs. full reruns.
+#
+# Starts `streamlit run` on the app, loads a pasted bank through the websocket (see
+# live_server.py) and clicks Submit Answer / Next Question through it. Those buttons
+# live in the quiz fragment, so each click reruns only the fragment; after every click
+# a plain rerun of the whole script is timed on the same state for comparison, which
+# is what every click cost before the quiz panel became a fragment. Full runs per
+# click are counted from the server's new_session messages and should be 0.
+#
+#   python benchmarks/bench_rerun.py [--questions 2000] [--clicks 60]
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from live_server import LiveSession, Server  # noqa: E402
+from synthetic import make_bank_text  # noqa: E402
+
+PASTE_LABEL = "Or paste your questions here (same format as above)"
+
+
+def _summary(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {'median_ms': statistics.median(timings) * 1000,
+            'p95_ms': timings[max(0, int(len(timings) * 0.95) - 1)] * 1000}
+
+
+def bench(server: Server, n_questions: int, clicks: int) -> Dict:
+    session = LiveSession(server)
+    try:
+        session.run()
+        session.input(PASTE_LABEL, make_bank_text('txt', n_questions))
+        session.run()
+        session.click("Load Questions")
+        fragment, full, full_runs = [], [], 0
+        while len(fragment) < clicks:
+            label = next((b for b in ("Submit Answer", "Next Question", "Restart Test")
+                          if session.find(b, 'button') is not None), None)
+            if label is None:
+                break
+            before = session.full_runs
+            elapsed, _ = session.click(label)
+            fragment.append(elapsed)
+            full_runs += session.full_runs - before
+            full.append(session.run()[0])
+        if session.errors:
+            raise RuntimeError(f'app errors: {session.errors[:3]}')
+    finally:
+        session.close()
+    return {'questions': n_questions, 'clicks': len(fragment), 'fragment': _summary(fragment),
+            'full': _summary(full), 'full_runs_per_click': full_runs / max(1, len(fragment))}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fragment vs. full rerun cost of the quiz panel on a live server")
+    parser.add_argument('--script', default=os.path.join(ROOT, 'adwenbolobo_app.py'))
+    parser.add_argument('--questions', default='100,2000', help='comma-separated bank sizes')
+    parser.add_argument('--clicks', type=int, default=60)
+    args = parser.parse_args()
+
+    # Keep benchmark banks out of the real data directory
+    env = {'ADWENBOLOBO_DATA_DIR': tempfile.mkdtemp(prefix='adwenbolobo-bench-')}
+    with Server(args.script, env) as server:
+        for n_questions in (int(n) for n in args.questions.split(',')):
+            r = bench(server, n_questions, args.clicks)
+            f, u = r['fragment'], r['full']
+            print(f"{r['questions']} questions, {r['clicks']} clicks: fragment rerun median {f['median_ms']:.1f} ms "
+                  f"(p95 {f['p95_ms']:.1f}), full rerun median {u['median_ms']:.1f} ms (p95 {u['p95_ms']:.1f}), "
+                  f"{u['median_ms'] / f['median_ms']:.1f}x; {r['full_runs_per_click']:.2f} full runs per click")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+# Parser and session benchmark suite.
+#
+# Microbenchmarks time every bank parser on seeded synthetic banks (see
+# synthetic.py) across sizes and clean/malformed/long variants. The app benchmark
+# drives a Streamlit script headless with AppTest through paste -> edit one question
+# -> load -> randomize -> answer every question -> review, timing each step. Results are
+# written as JSON; pass an earlier file as --baseline (or use --compare) to flag
+# regressions.
+#
+#   python benchmarks/bench_suite.py --output bench.json
+#   git stash && python benchmarks/bench_suite.py --output base.json && git stash pop
+#   python benchmarks/bench_suite.py --compare base.json bench.json
+#
+# App functions are loaded from the script files with ast (imports plus the one
+# function), so they can be timed without running the Streamlit page around them.
+import argparse
+import ast
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import VARIANTS, make_bank_text  # noqa: E402
+
+APP = os.path.join(ROOT, 'adwenbolobo_app.py')
+APP3 = os.path.join(ROOT, 'adwenbolobo_app-3.py')
+
+
+# -- Parser microbenchmarks --
+def load_function(script: str, name: str) -> Optional[Callable]:
+    with open(script, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), script)
+    keep = [node for node in tree.body
+            if isinstance(node, (ast.Import, ast.ImportFrom))
+            or isinstance(node, (ast.FunctionDef, ast.Assign)) and _defines(node, name)]
+    if not any(isinstance(node, ast.FunctionDef) for node in keep):
+        return None  # not in this revision
+    namespace = {'__file__': script}
+    exec(compile(ast.Module(body=keep, type_ignores=[]), script, 'exec'), namespace)
+    return namespace[name]
+
+
+def _defines(node, name: str) -> bool:
+    if isinstance(node, ast.FunctionDef):
+        return node.name == name
+    # Module-level constants the function may read, e.g. compiled regexes
+    return all(isinstance(t, ast.Name) and t.id.isupper() for t in node.targets)
+
+
+def _json_input(fn: Callable) -> Callable:
+    # Older revisions took the decoded string, newer ones the uploaded bytes
+    param = next(iter(inspect.signature(fn).parameters))
+    return (lambda text: text) if param.endswith('str') else (lambda text: text.encode('utf-8'))
+
+
+def parser_cases() -> List[Dict]:
+    from dump_converter import parse_questions
+    # incremental: parses pasted text block by block through BLOCK_CACHE, so it is also
+    # timed after a one-block edit
+    cases = [
+        ('clean_and_parse_nbme_text', 'txt', load_function(APP, 'clean_and_parse_nbme_text'), True),
+        ('load_questions_from_text (app-3)', 'txt', load_function(APP3, 'load_questions_from_text'), False),
+        ('load_questions_from_json', 'json', load_function(APP, 'load_questions_from_json'), False),
+        ('load_questions_from_json (app-3)', 'json', load_function(APP3, 'load_questions_from_json'), False),
+        ('parse_questions', 'dump', parse_questions, False),
+    ]
+    return [{'name': name, 'format': fmt, 'fn': fn, 'incremental': incremental,
+             'prepare': _json_input(fn) if fmt == 'json' else (lambda text: text)}
+            for name, fmt, fn, incremental in cases if fn is not None]
+
+
+def _edit_one_block(text: str) -> str:
+    return text.replace('Question: ', 'Question: Edited ', 1)
+
+
+def bench_parsers(sizes: List[int], variants: List[str], repeat: int, only: Optional[str] = None) -> List[Dict]:
+    from bank_cache import BLOCK_CACHE
+
+    results = []
+    texts: Dict[tuple, str] = {}
+    for case in parser_cases():
+        if only and only not in case['name']:
+            continue
+        for n in sizes:
+            for variant in variants:
+                key = (case['format'], n, variant)
+                if key not in texts:
+                    texts[key] = make_bank_text(case['format'], n, variant)
+                data = case['prepare'](texts[key])
+                # Incremental parsers are timed cold, then again after a one-block edit
+                incremental = case['incremental']
+                timings = []
+                for _ in range(repeat):
+                    if incremental:
+                        BLOCK_CACHE.clear()
+                    t0 = time.perf_counter()
+                    parsed = case['fn'](data)
+                    timings.append(time.perf_counter() - t0)
+                results.append(_result(case['name'], case['format'], n, variant, texts[key], parsed, timings))
+                if incremental:
+                    edited = _edit_one_block(data)
+                    timings = []
+                    for i in range(repeat):
+                        case['fn'](data)
+                        t0 = time.perf_counter()
+                        parsed = case['fn'](edited)
+                        timings.append(time.perf_counter() - t0)
+                    results.append(_result(case['name'] + ' (one block edited)', case['format'], n, variant,
+                                           texts[key], parsed, timings))
+    return results
+
+
+def _result(name: str, fmt: str, n: int, variant: str, text: str, parsed, timings: List[float]) -> Dict:
+    median = statistics.median(timings)
+    size_mb = len(text.encode('utf-8')) / 1e6
+    r = {'name': name, 'format': fmt, 'questions': n, 'variant': variant, 'mb': round(size_mb, 3),
+         'parsed': len(parsed), 'median_s': median, 'best_s': min(timings),
+         'questions_per_s': n / median if median else None}
+    print(f"{name:<46}{variant:<10}{n:>8}{r['parsed']:>8}{median * 1000:>11.1f} ms"
+          f"{size_mb / median if median else 0:>9.1f} MB/s")
+    return r
+
+
+# -- App flow benchmark --
+def _button(at, label: str):
+    return next((b for b in at.button if b.label == label), None)
+
+
+def _step(at, timings: Dict[str, List[float]], name: str, action) -> None:
+    t0 = time.perf_counter()
+    action().run()
+    timings.setdefault(name, []).append(time.perf_counter() - t0)
+    if at.exception:
+        raise RuntimeError(f"{name}: {at.exception[0].message}")
+
+
+def bench_app(script: str, n_questions: int, variant: str = 'clean') -> Dict:
+    from streamlit.testing.v1 import AppTest
+
+    timings: Dict[str, List[float]] = {}
+    at = AppTest.from_file(script, default_timeout=300)
+    _step(at, timings, 'first_run', lambda: at)
+    text = make_bank_text('txt', n_questions, variant)
+    paste = next(t for t in at.text_area if 'paste' in t.label.lower())
+    _step(at, timings, 'paste', lambda: paste.input(text))
+    # A rerun after editing one question: the draft is re-parsed and re-deduplicated
+    _step(at, timings, 'paste_edit', lambda: paste.input(_edit_one_block(text)))
+    _step(at, timings, 'load', lambda: _button(at, "Load Questions").click())
+    _step(at, timings, 'randomize', lambda: _button(at, "Randomize Questions").click())
+
+    answered = 0
+    while _button(at, "Submit Answer") is not None:
+        _step(at, timings, 'submit', lambda: _button(at, "Submit Answer").click())
+        _step(at, timings, 'next', lambda: _button(at, "Next Question").click())
+        answered += 1
+    _step(at, timings, 'review', lambda: _button(at, "Review Answers").click())
+    while _button(at, "Next page") is not None:
+        _step(at, timings, 'review_page', lambda: _button(at, "Next page").click())
+
+    steps = {}
+    for name, values in timings.items():
+        values.sort()
+        steps[name] = {'count': len(values), 'median_ms': statistics.median(values) * 1000,
+                       'p95_ms': values[max(0, int(len(values) * 0.95) - 1)] * 1000,
+                       'total_ms': sum(values) * 1000}
+    return {'script': os.path.basename(script), 'questions': n_questions, 'variant': variant,
+            'answered': answered, 'steps': steps}
+
+
+# -- Results --
+def _meta() -> Dict:
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                             text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        rev = None
+    return {'git_rev': rev, 'python': platform.python_version(), 'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def _flatten(results: Dict) -> Dict[str, float]:
+    # One comparable number per measurement, keyed by what was measured
+    flat = {}
+    for r in results.get('parsers', []):
+        flat[f"parser {r['name']} {r['variant']} n={r['questions']}"] = r['median_s'] * 1000
+    for r in results.get('app', []):
+        for step, s in r['steps'].items():
+            flat[f"app {r['script']} n={r['questions']} {step}"] = s['median_ms']
+    return flat
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> int:
+    base, cur = _flatten(baseline), _flatten(current)
+    regressions = 0
+    print(f"{'measurement':<70}{'base ms':>10}{'now ms':>10}{'change':>9}")
+    for key in sorted(base.keys() & cur.keys()):
+        change = cur[key] / base[key] - 1 if base[key] else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{key:<70}{base[key]:>10.1f}{cur[key]:>10.1f}{change:>+9.0%}{flag}")
+    print(f"{regressions} regressions over {threshold:.0%} "
+          f"(baseline {baseline['meta'].get('git_rev')}, current {current['meta'].get('git_rev')})")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Parser and session benchmark suite")
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='comma-separated bank sizes (up to 100000) for the parser benchmarks')
+    parser.add_argument('--variants', default=','.join(VARIANTS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help='run only parsers whose name contains this')
+    parser.add_argument('--app-questions', type=int, default=30,
+                        help='bank size for the app flow benchmark (every question is answered); 0 to skip')
+    parser.add_argument('--script', action='append', help='app script for the flow benchmark (repeatable)')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='slowdown that counts as a regression')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'CURRENT'), help='only compare two results files')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            return compare(json.load(f), json.load(g), args.threshold)
+
+    # Keep benchmark banks out of the real data directory
+    os.environ.setdefault('ADWENBOLOBO_DATA_DIR', tempfile.mkdtemp(prefix='adwenbolobo-bench-'))
+    results = {'meta': _meta(), 'parsers': [], 'app': []}
+    results['parsers'] = bench_parsers([int(s) for s in args.sizes.split(',')],
+                                       args.variants.split(','), args.repeat, args.only)
+    if args.app_questions:
+        for script in args.script or [APP]:
+            r = bench_app(script, args.app_questions)
+            results['app'].append(r)
+            for step, s in r['steps'].items():
+                print(f"app {r['script']:<24}{step:<12}{s['count']:>5}x  median {s['median_ms']:>8.1f} ms"
+                      f"  p95 {s['p95_ms']:>8.1f} ms")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            return compare(json.load(f), results, args.threshold)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# Drives a real `streamlit run` server over its websocket, the way the browser does.
+#
+# AppTest replays every click as a full script run and is not thread-safe, so neither
+# fragment reruns nor concurrent sessions can be measured with it. A LiveSession speaks
+# the frontend's protocol instead (BackMsg rerun requests carrying widget states, read
+# back as ForwardMsg deltas until script_finished), so what it times is what a user's
+# click costs on the server, and any number of sessions can share one server process.
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+try:
+    from websockets.sync.client import connect
+except ImportError:  # installed alongside uvicorn, which serves Streamlit's websocket
+    connect = None
+
+# Element types whose protos carry a widget id and label
+WIDGET_TYPES = ('button', 'radio', 'text_area', 'text_input', 'checkbox', 'selectbox', 'number_input',
+                'slider', 'multiselect', 'file_uploader', 'download_button', 'toggle')
+FINISHED_OK = ('FINISHED_SUCCESSFULLY', 'FINISHED_FRAGMENT_RUN_SUCCESSFULLY')
+
+
+# -- Server --
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    def __init__(self, script: str, env: Optional[Dict[str, str]] = None, timeout: float = 60.0):
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        # A file rather than a pipe, which a chatty server could fill and block on
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', script, '--server.headless', 'true',
+             '--server.port', str(self.port), '--server.address', '127.0.0.1',
+             '--server.enableXsrfProtection', 'false', '--browser.gatherUsageStats', 'false',
+             '--server.fileWatcherType', 'none'],
+            env={**os.environ, **(env or {})}, stdout=subprocess.DEVNULL, stderr=self.log)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with urllib.request.urlopen(self.url + '/_stcore/health', timeout=1) as r:
+                    if r.status == 200:
+                        break
+            except OSError:
+                pass
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError(f'streamlit server did not start: {self.output()[-2000:]}')
+            time.sleep(0.1)
+
+    def output(self) -> str:
+        self.log.seek(0)
+        return self.log.read().decode('utf-8', 'replace')
+
+    def rss_bytes(self) -> Optional[int]:
+        try:
+            with open(f'/proc/{self.process.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def stop(self) -> None:
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def __enter__(self) -> 'Server':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+# -- One browser session --
+class Widget:
+    def __init__(self, kind: str, proto, fragment_id: str):
+        self.kind = kind
+        self.proto = proto
+        self.id = proto.id
+        self.label = proto.label
+        self.fragment_id = fragment_id
+
+
+class LiveSession:
+    def __init__(self, server: Server, query_string: str = '', timeout: float = 600.0):
+        if connect is None:
+            raise ImportError('LiveSession needs the websockets package: pip install -r benchmarks/requirements.txt')
+        self.query_string = query_string
+        self.timeout = timeout
+        self.widgets: Dict[str, Widget] = {}
+        self.values: Dict[str, WidgetState] = {}
+        self.errors: List[str] = []
+        self.full_runs = 0  # script runs from the top, fragment runs excluded
+        self.texts: List[str] = []  # alert and markdown bodies from the last run
+        self._ws = connect(server.url.replace('http', 'ws', 1) + '/_stcore/stream', subprotocols=['streamlit'],
+                           max_size=None, open_timeout=timeout)
+
+    def close(self) -> None:
+        self._ws.close()
+
+    # Widget state the frontend would send: every value set so far, plus one trigger
+    def set_value(self, widget: Widget, **value) -> None:
+        state = WidgetState(id=widget.id, **value)
+        self.values[widget.id] = state
+
+    def input(self, label: str, text: str) -> None:
+        self.set_value(self.widget(label), string_value=text)
+
+    def widget(self, label: str, kind: Optional[str] = None) -> Widget:
+        w = self.find(label, kind)
+        if w is None:
+            raise LookupError(f'no {kind or "widget"} labelled {label!r} (have {sorted(self.labels())})')
+        return w
+
+    def find(self, label: str, kind: Optional[str] = None) -> Optional[Widget]:
+        return next((w for w in self.widgets.values() if w.label == label and kind in (None, w.kind)), None)
+
+    def labels(self) -> List[str]:
+        return [w.label for w in self.widgets.values()]
+
+    def run(self, trigger: Optional[Widget] = None) -> Tuple[float, str]:
+        # One rerun; a trigger inside a fragment reruns only that fragment, as in the
+        # browser. Returns (seconds until script_finished, finish status).
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.query_string = self.query_string
+        states = [s for i, s in self.values.items() if trigger is None or i != trigger.id]
+        if trigger is not None:
+            states.append(WidgetState(id=trigger.id, trigger_value=True))
+            if trigger.fragment_id:
+                state.fragment_id = trigger.fragment_id
+        state.widget_states.widgets.extend(states)
+        fragment = state.fragment_id
+        t0 = time.perf_counter()
+        self._ws.send(msg.SerializeToString())
+        seen: Dict[str, Widget] = {}
+        self.texts = []
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(self._ws.recv(timeout=self.timeout))
+            kind = fwd.WhichOneof('type')
+            if kind == 'new_session':
+                # Sent as every run starts, including one that follows st.rerun(); a
+                # fragment run names its fragments, a full run names none
+                fragments = list(fwd.new_session.fragment_ids_this_run)
+                fragment = fragments[0] if fragments else ''
+                seen = {}
+                self.full_runs += not fragments
+                self.texts = []
+            elif kind == 'delta' and fwd.delta.WhichOneof('type') == 'new_element':
+                self._element(fwd.delta, seen)
+            elif kind == 'script_finished':
+                status = ForwardMsg.ScriptFinishedStatus.Name(fwd.script_finished)
+                if status != 'FINISHED_EARLY_FOR_RERUN':
+                    break
+        elapsed = time.perf_counter() - t0
+        # A fragment run replaces only that fragment's widgets
+        if fragment:
+            self.widgets = {i: w for i, w in self.widgets.items() if w.fragment_id != fragment}
+            self.widgets.update(seen)
+        else:
+            self.widgets = seen
+        self.values = {i: s for i, s in self.values.items() if i in self.widgets}
+        if status not in FINISHED_OK:
+            self.errors.append(status)
+        return elapsed, status
+
+    def click(self, label: str) -> Tuple[float, str]:
+        return self.run(self.widget(label, 'button'))
+
+    def _element(self, delta, seen: Dict[str, Widget]) -> None:
+        element = delta.new_element
+        kind = element.WhichOneof('type')
+        if kind in WIDGET_TYPES:
+            proto = getattr(element, kind)
+            seen[proto.id] = Widget(kind, proto, delta.fragment_id)
+        elif kind == 'exception':
+            self.errors.append(f'{element.exception.type}: {element.exception.message}')
+        elif kind == 'alert':
+            self.texts.append(element.alert.body)
+        elif kind == 'markdown':
+            self.texts.append(element.markdown.body)
@@ -0,0 +1,210 @@
+# Concurrent-session load test.
+#
+# Starts `streamlit run` on the app and drives N sessions against that one server at
+# once, each over its own websocket the way a browser would (see live_server.py),
+# through the real flow: paste -> Load Questions -> Randomize -> answer -> Review.
+# Scripts run on the server's own threads with its shared cached resources, so what is
+# measured is per-click latency under contention and the server's RSS per session.
+# AppTest is not used: it is not thread-safe, and driving it from several threads
+# measures races in the test harness rather than the app.
+#
+# What each session keeps in st.session_state comes from the app itself: the server is
+# started with ADWENBOLOBO_STATE_SIZES=1 (see instrumentation.dump_state_sizes), so every
+# full run writes the deep size of each session_state entry, and the last one per
+# session is read back here.
+#
+#   python benchmarks/load_test.py --sessions 1,10,25 --questions 100,1000 --answers 50
+#   python benchmarks/load_test.py --script adwenbolobo_app-3.py --sessions 10 --output load.json
+#
+# Any session that fails (an app exception, a script run that does not finish
+# successfully, a missing button) is reported and makes the run exit non-zero.
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from live_server import LiveSession, Server  # noqa: E402
+from synthetic import make_bank_text  # noqa: E402
+
+APP = os.path.join(ROOT, 'adwenbolobo_app.py')
+PASTE_LABEL = "Or paste your questions here (same format as above)"
+# session_state keys that grow with the bank or the number of answers
+TRACKED_KEYS = ('questions', 'answers_log', 'order', 'incorrect_log', 'review_md', 'attempts')
+
+
+def read_state_sizes(directory: str) -> List[Dict[str, int]]:
+    # One {key: bytes} per session that completed a full run
+    if not os.path.isdir(directory):
+        return []
+    sizes = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                sizes.append(json.load(f))
+    return sizes
+
+
+# -- One simulated session --
+class Session:
+    def __init__(self, text: str, answers: int):
+        self.text = text
+        self.answers = answers
+        self.latencies: Dict[str, List[float]] = {}
+        self.error: Optional[str] = None
+        self.answered = 0
+
+    def _step(self, live: LiveSession, step: str, action) -> None:
+        elapsed, _ = action()
+        self.latencies.setdefault(step, []).append(elapsed)
+        if live.errors:
+            raise RuntimeError(f'{step}: {"; ".join(live.errors[:3])}')
+
+    def run(self, server: Server, start: threading.Barrier) -> None:
+        try:
+            live = LiveSession(server)
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+            start.abort()  # release the sessions already waiting
+            return
+        try:
+            start.wait()
+            self._step(live, 'first_run', live.run)
+            live.input(PASTE_LABEL, self.text)
+            self._step(live, 'paste', live.run)
+            self._step(live, 'load', lambda: live.click("Load Questions"))
+            self._step(live, 'randomize', lambda: live.click("Randomize Questions"))
+            while self.answered < self.answers and live.find("Submit Answer", 'button') is not None:
+                self._step(live, 'submit', lambda: live.click("Submit Answer"))
+                self._step(live, 'next', lambda: live.click("Next Question"))
+                self.answered += 1
+            # Finish the block so the review is reachable, as a user would
+            while live.find("Review Answers", 'button') is None and live.find("Skip", 'button') is not None:
+                self._step(live, 'skip', lambda: live.click("Skip"))
+            self._step(live, 'review', lambda: live.click("Review Answers"))
+        except Exception as e:  # reported per session; the other sessions keep going
+            self.error = f'{type(e).__name__}: {e}'
+        finally:
+            live.close()
+
+
+# -- One load level --
+def _pct(values: List[float], p: int) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * p // 100)] * 1000 if values else 0.0
+
+
+def run_level(script: str, n_sessions: int, n_questions: int, answers: int, distinct_banks: bool) -> Dict:
+    # Identical banks by default (the parse and bank caches are shared); --distinct-banks
+    # gives every session its own bank, the worst case for memory. Every level gets a
+    # fresh server and data directory, so caches from the previous level do not carry over.
+    texts = [make_bank_text('txt', n_questions, seed=i if distinct_banks else 0) for i in range(n_sessions)]
+    sessions = [Session(text, answers) for text in texts]
+    data_dir = tempfile.mkdtemp(prefix='adwenbolobo-load-')
+    env = {'ADWENBOLOBO_DATA_DIR': data_dir, 'ADWENBOLOBO_PROFILE_DIR': data_dir, 'ADWENBOLOBO_STATE_SIZES': '1'}
+    with Server(script, env) as server:
+        start = threading.Barrier(n_sessions)
+        rss_before = server.rss_bytes()
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=s.run, args=(server, start), name=f'load-session-{i}')
+                   for i, s in enumerate(sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+        rss_after = server.rss_bytes()
+        if server.process.poll() is not None:
+            sessions[0].error = sessions[0].error or f'server exited: {server.output()[-2000:]}'
+
+    ok = [s for s in sessions if s.error is None]
+    steps = {}
+    for step in sorted({k for s in ok for k in s.latencies}):
+        values = [v for s in ok for v in s.latencies.get(step, [])]
+        steps[step] = {'count': len(values), 'p50_ms': _pct(values, 50), 'p95_ms': _pct(values, 95),
+                       'p99_ms': _pct(values, 99), 'mean_ms': statistics.mean(values) * 1000}
+    clicks = [v for s in ok for values in s.latencies.values() for v in values]
+    state_sizes = read_state_sizes(os.path.join(data_dir, 'state-sizes'))
+    keys = sorted({k for sizes in state_sizes for k in sizes})
+    per_key = {k: statistics.mean(sizes.get(k, 0) for sizes in state_sizes) for k in keys}
+    answered = statistics.mean(s.answered for s in ok) if ok else 0
+    return {
+        'script': os.path.basename(script), 'sessions': n_sessions, 'questions': n_questions,
+        'answers': answers, 'distinct_banks': distinct_banks, 'wall_s': wall,
+        'failed': [s.error for s in sessions if s.error is not None],
+        'clicks': {'count': len(clicks), 'p50_ms': _pct(clicks, 50), 'p95_ms': _pct(clicks, 95),
+                   'p99_ms': _pct(clicks, 99)},
+        'steps': steps,
+        'rss_before_mb': rss_before / 1e6 if rss_before else None,
+        'rss_after_mb': rss_after / 1e6 if rss_after else None,
+        'rss_per_session_kb': (rss_after - rss_before) / n_sessions / 1024 if rss_before and rss_after else None,
+        'sessions_sized': len(state_sizes),
+        'session_bytes': per_key,
+        'answers_log_bytes_per_answer': per_key.get('answers_log', 0) / answered if answered else None,
+    }
+
+
+def report(r: Dict) -> None:
+    c = r['clicks']
+    print(f"\n{r['script']}: {r['sessions']} sessions x {r['questions']} questions, {r['answers']} answers each"
+          f"{' (distinct banks)' if r['distinct_banks'] else ''} in {r['wall_s']:.1f} s")
+    for error in r['failed']:
+        print(f"  FAILED session: {error}")
+    print(f"  all clicks  {c['count']:>6}x  p50 {c['p50_ms']:>8.1f} ms  p95 {c['p95_ms']:>8.1f} ms"
+          f"  p99 {c['p99_ms']:>8.1f} ms")
+    for step, s in r['steps'].items():
+        print(f"  {step:<11} {s['count']:>6}x  p50 {s['p50_ms']:>8.1f} ms  p95 {s['p95_ms']:>8.1f} ms"
+              f"  p99 {s['p99_ms']:>8.1f} ms")
+    if r['rss_after_mb'] is not None:
+        print(f"  server RSS {r['rss_before_mb']:.1f} -> {r['rss_after_mb']:.1f} MB "
+              f"({r['rss_per_session_kb']:.0f} KB per session)")
+    if not r['session_bytes']:
+        print("  per-session state: not reported (does the script call instrumentation.dump_state_sizes?)")
+        return
+    print(f"  per-session state (mean deep size over {r['sessions_sized']} sessions):")
+    others = sum(v for k, v in r['session_bytes'].items() if k not in TRACKED_KEYS)
+    for k in TRACKED_KEYS:
+        print(f"    {k:<16}{r['session_bytes'].get(k, 0) / 1024:>12.1f} KB")
+    print(f"    {'(other keys)':<16}{others / 1024:>12.1f} KB")
+    if r['answers_log_bytes_per_answer'] is not None:
+        print(f"    answers_log costs {r['answers_log_bytes_per_answer']:.0f} bytes per answer")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the Streamlit app")
+    parser.add_argument('--script', default=APP, help='app script to drive (default: adwenbolobo_app.py)')
+    parser.add_argument('--sessions', default='1,5,10', help='comma-separated concurrent session counts')
+    parser.add_argument('--questions', default='100', help='comma-separated bank sizes')
+    parser.add_argument('--answers', type=int, default=None,
+                        help='questions each session answers (default: all); the rest are skipped to reach review')
+    parser.add_argument('--distinct-banks', action='store_true', help='give every session a different bank')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    results = []
+    for n_questions in (int(n) for n in args.questions.split(',')):
+        for n_sessions in (int(n) for n in args.sessions.split(',')):
+            answers = n_questions if args.answers is None else args.answers
+            r = run_level(args.script, n_sessions, n_questions, answers, args.distinct_banks)
+            report(r)
+            results.append(r)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"Results written to {args.output}")
+    failed = sum(len(r['failed']) for r in results)
+    if failed:
+        print(f"{failed} sessions failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# Seeded generator for synthetic question banks.
+#
+# The same seed always gives the same bank, so benchmark runs on different
+# revisions parse identical input. Three shapes are produced:
+#   make_questions  app bank items (question/options/answer/explanation)
+#   to_txt/to_json  those items in the app's upload formats
+#   make_dump       a raw NBME-style export for dump_converter.parse_questions
+#
+#   python benchmarks/synthetic.py --questions 10000 --format txt --variant malformed -o bank.txt
+import argparse
+import json
+import random
+from typing import Dict, List
+
+WORDS = ('patient presents with fever cough dyspnea history of hypertension diabetes '
+         'examination shows tachycardia laboratory studies reveal elevated creatinine '
+         'which of the following is the most likely diagnosis next best step in management').split()
+
+SIZES = (100, 1_000, 10_000, 100_000)
+# clean: every item valid; malformed: every 7th item broken in a format-specific way;
+# long: explanations ten times longer than usual
+VARIANTS = ('clean', 'malformed', 'long')
+MALFORMED_EVERY = 7
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + '.'
+
+
+def make_questions(n_questions: int, seed: int = 0, variant: str = 'clean',
+                   vignette_words: int = 80, explanation_words: int = 120) -> List[Dict]:
+    rng = random.Random(seed)
+    if variant == 'long':
+        explanation_words *= 10
+    questions = []
+    for i in range(n_questions):
+        options = [f'{_sentence(rng, 3)[:-1]} {i}-{k}' for k in range(5)]
+        answer = rng.randrange(len(options))
+        questions.append({
+            'question': ' '.join(_sentence(rng, vignette_words // 4) for _ in range(4)),
+            'options': options,
+            'answer': options[answer],
+            'answer_index': answer,
+            'explanation': _sentence(rng, explanation_words),
+        })
+    return questions
+
+
+def to_txt(questions: List[Dict], variant: str = 'clean') -> str:
+    parts = []
+    for i, q in enumerate(questions):
+        broken = variant == 'malformed' and i % MALFORMED_EVERY == MALFORMED_EVERY - 1
+        parts.append(f"Question: {q['question']}\nOptions:\n")
+        for k, opt in enumerate(q['options']):
+            parts.append(f"{chr(65 + k)}. {opt}\n")
+        # Malformed items cycle through a missing key, an out-of-range key and stray spacing
+        if broken and i % 3 == 0:
+            pass
+        elif broken and i % 3 == 1:
+            parts.append("Answer: Z\n")
+        else:
+            answer = chr(65 + q['answer_index'])
+            parts.append(f"Answer:   {answer}  \n" if broken else f"Answer: {answer}\n")
+        parts.append(f"Explanation: {q['explanation']}\n\n")
+    return ''.join(parts)
+
+
+def to_json(questions: List[Dict], variant: str = 'clean') -> str:
+    items = []
+    for i, q in enumerate(questions):
+        if variant == 'malformed' and i % MALFORMED_EVERY == MALFORMED_EVERY - 1:
+            # Cycle through a missing field, an answer that is not an option and empty options
+            q = dict(q)
+            if i % 3 == 0:
+                del q['explanation']
+            elif i % 3 == 1:
+                q['answer'] = 'None of the above'
+            else:
+                q['options'] = []
+        items.append(q)
+    return json.dumps(items, indent=1)
+
+
+def make_dump(n_questions: int, seed: int = 0, vignette_words: int = 120,
+              explanation_words: int = 300, missing_markers: bool = False) -> str:
+    rng = random.Random(seed)
+    parts = ['Exam export\n']
+    for i in range(1, n_questions + 1):
+        stem = '\n'.join(_sentence(rng, vignette_words // 4) for _ in range(4))
+        parts.append(f'\n{i}. {stem}\n')
+        for letter in 'ABCDE':
+            parts.append(f'{letter}) {_sentence(rng, 4)}\n')
+        if missing_markers and i % 3 == 0:
+            # No answer key and no section headers: the explanation runs to the next question
+            parts.append(_sentence(rng, explanation_words) + '\n')
+            continue
+        answer = rng.choice('ABCDE')
+        parts.append(f'Correct Answer: {answer}. {_sentence(rng, explanation_words)}\n')
+        parts.append(f'Incorrect Answers: {_sentence(rng, explanation_words // 2)}\n')
+        parts.append(f'Educational Objective: {_sentence(rng, 20)}\n')
+    return ''.join(parts)
+
+
+def make_bank_text(fmt: str, n_questions: int, variant: str = 'clean', seed: int = 0) -> str:
+    if fmt == 'dump':
+        return make_dump(n_questions, seed, explanation_words=3000 if variant == 'long' else 300,
+                         missing_markers=variant == 'malformed')
+    questions = make_questions(n_questions, seed, variant)
+    return to_txt(questions, variant) if fmt == 'txt' else to_json(questions, variant)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic question bank")
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--format', choices=['txt', 'json', 'dump'], default='txt')
+    parser.add_argument('--variant', choices=VARIANTS, default='clean')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', required=True)
+    args = parser.parse_args()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(make_bank_text(args.format, args.questions, args.variant, args.seed))
+
+
+if __name__ == '__main__':
+    main()
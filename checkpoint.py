@@ -0,0 +1,287 @@
+import atexit
+import json
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, NamedTuple, Optional, Sequence
+
+
+# -- Session progress --
+# Everything needed to put a session back where it was. The bank is named by its
+# content hash, so a resumed session reopens the already-imported bank instead of
+# parsing the upload again; questions themselves are never stored here.
+class Answer(NamedTuple):
+    position: int
+    chosen: int
+    correct: bool
+    latency_ms: int
+
+
+class Progress(NamedTuple):
+    bank_hash: str
+    order: Optional[Sequence[int]]  # None: bank order
+    option_seed: Optional[int]
+    current_q: int
+    score: int
+    answers: Sequence[Answer]
+    elapsed: float  # seconds since the quiz started
+    randomized: bool
+    submitted: bool
+    review_mode: bool
+    saved_at: float
+    deadline: Optional[float] = None  # unix time a timed block ends
+    time_limit: Optional[float] = None  # the block's limit in seconds, for restarts
+
+
+# -- Encoding --
+# A small JSON header followed by packed little-endian arrays, zlib-compressed:
+#   order      u32 per question (absent when the bank order is used)
+#   answers    u32 position, u8 chosen | 0x80 if correct, u32 latency in ms
+# A 100-question block with every answer in takes well under 1 KB.
+FORMAT_VERSION = 1
+HEADER_LEN = struct.Struct('<I')
+
+
+def _u32(values: Sequence[int]) -> bytes:
+    data = array('I', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _from_u32(data: bytes) -> array:
+    values = array('I')
+    values.frombytes(data[:len(data) - len(data) % 4])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def encode(progress: Progress) -> bytes:
+    order = progress.order
+    header = {'v': FORMAT_VERSION, 'bank': progress.bank_hash, 'seed': progress.option_seed,
+              'q': progress.current_q, 'score': progress.score, 'elapsed': round(progress.elapsed, 3),
+              'randomized': progress.randomized, 'submitted': progress.submitted,
+              'review': progress.review_mode, 'saved': progress.saved_at,
+              'deadline': progress.deadline, 'limit': progress.time_limit,
+              'order': None if order is None else len(order), 'answers': len(progress.answers)}
+    head = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    answers = progress.answers
+    parts = [HEADER_LEN.pack(len(head)), head,
+             b'' if order is None else _u32(order),
+             _u32([a.position for a in answers]),
+             bytes((a.chosen & 0x7f) | (0x80 if a.correct else 0) for a in answers),
+             _u32([a.latency_ms for a in answers])]
+    return zlib.compress(b''.join(parts), 6)
+
+
+def decode(data: bytes) -> Progress:
+    # Raises ValueError for anything that is not a checkpoint of this version
+    try:
+        raw = zlib.decompress(data)
+        (head_len,) = HEADER_LEN.unpack_from(raw)
+        header = json.loads(raw[HEADER_LEN.size:HEADER_LEN.size + head_len])
+    except (zlib.error, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f'unreadable checkpoint: {e}') from None
+    if header.get('v') != FORMAT_VERSION:
+        raise ValueError(f"unsupported checkpoint version {header.get('v')}")
+    pos = HEADER_LEN.size + head_len
+    order = None
+    if header['order'] is not None:
+        order = _from_u32(raw[pos:pos + 4 * header['order']])
+        pos += 4 * header['order']
+    n = header['answers']
+    positions = _from_u32(raw[pos:pos + 4 * n])
+    flags = raw[pos + 4 * n:pos + 5 * n]
+    latencies = _from_u32(raw[pos + 5 * n:pos + 9 * n])
+    if len(latencies) != n or (order is not None and len(order) != header['order']):
+        raise ValueError('truncated checkpoint')
+    answers = [Answer(p, f & 0x7f, bool(f & 0x80), ms) for p, f, ms in zip(positions, flags, latencies)]
+    return Progress(header['bank'], order, header['seed'], header['q'], header['score'], answers,
+                    header['elapsed'], header['randomized'], header['submitted'], header['review'],
+                    header['saved'], header.get('deadline'), header.get('limit'))
+
+
+# -- Stores --
+# Anything with save(key, data), load(key) -> Optional[bytes], delete(key) and close()
+# can hold checkpoints; keys are opaque session tokens.
+class FileCheckpointStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        if not key.isalnum():
+            raise ValueError(f'invalid checkpoint key {key!r}')
+        return os.path.join(self.directory, key + '.ckpt')
+
+    def save(self, key: str, data: bytes) -> None:
+        # Renamed into place, so a crash mid-write leaves the previous checkpoint intact
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+
+    def load(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteCheckpointStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        key TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        updated REAL NOT NULL
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+
+    def save(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)', (key, data, time.time()))
+
+    def load(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM checkpoints WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM checkpoints WHERE key = ?', (key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+STORE_PATHS = {'sqlite': 'checkpoints.sqlite3', 'files': 'checkpoints'}
+
+
+def open_store(kind: str, data_dir: str):
+    if kind not in STORE_PATHS:
+        raise ValueError(f"Unknown checkpoint store {kind!r} (expected 'sqlite' or 'files')")
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, STORE_PATHS[kind])
+    return SQLiteCheckpointStore(path) if kind == 'sqlite' else FileCheckpointStore(path)
+
+
+# -- Debounced background writer --
+# submit() only replaces the pending snapshot for its key. A background thread
+# encodes and writes whatever is pending once it has been quiet for `delay` seconds
+# (or every max_delay seconds under constant clicking), so a burst of answers costs
+# one write and no rerun ever waits for compression or the disk.
+class CheckpointWriter:
+    def __init__(self, store, delay: float = 1.0, max_delay: float = 10.0):
+        self.store = store
+        self.delay = delay
+        self.max_delay = max_delay
+        self.written = 0
+        self.errors = 0
+        self._pending: Dict[str, Progress] = {}
+        self._first_pending = 0.0
+        self._last_submit = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, key: str, progress: Progress) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._first_pending = now
+            self._pending[key] = progress
+            self._last_submit = now
+        self._wake.set()
+
+    def load(self, key: str) -> Optional[Progress]:
+        # A snapshot not yet written is newer than what the store holds
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            return pending
+        data = self.store.load(key)
+        return decode(data) if data is not None else None
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while self._pending or not self._idle.is_set():
+            with self._lock:
+                self._first_pending = 0.0  # due now
+            self._wake.set()
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self) -> None:
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+
+    def _due(self) -> float:
+        # Seconds until the pending snapshots should be written (<= 0: now)
+        with self._lock:
+            if not self._pending:
+                return self.max_delay
+            now = time.monotonic()
+            return min(self._last_submit + self.delay, self._first_pending + self.max_delay) - now
+
+    def _drain(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for key, progress in pending.items():
+            try:
+                self.store.save(key, encode(progress))
+                self.written += 1
+            except Exception:
+                # Keep the writer alive; the next submit for this key tries again
+                self.errors += 1
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            wait = self._due()
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            self._idle.clear()
+            self._drain()
+            self._idle.set()
+        self._drain()
+        self.store.close()
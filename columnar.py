@@ -0,0 +1,364 @@
+import argparse
+import bisect
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed for Parquet/Arrow banks and exports
+    pa = pq = None
+
+from json_bank import answer_index, validate_question
+
+# -- Columnar formats --
+# Banks and answer logs as Apache Parquet (compressed, for storage and analysis tools)
+# or Arrow IPC files (uncompressed, memory-mapped). Bank columns:
+#   question str, options list<str>, answer_index int16, explanation str, tags list<str>
+# The answer is stored as an index into options, so duplicate option text is never
+# ambiguous. Needs pyarrow (pip install pyarrow); everything else in the app works without it.
+PARQUET_MAGIC = b'PAR1'
+ARROW_MAGIC = b'ARROW1'
+FORMATS = ('parquet', 'arrow')
+SUFFIXES = {'parquet': '.parquet', 'arrow': '.arrow'}
+BATCH_SIZE = 10_000
+# Columns read when a bank is opened; explanations are read on first access
+INDEX_COLUMNS = ['question', 'options', 'answer_index', 'tags']
+EXPLANATION_GROUPS = 4  # Parquet row groups of explanations kept decoded per bank
+
+
+def require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Parquet and Arrow banks need pyarrow: pip install pyarrow")
+
+
+def detect_format(head: bytes) -> Optional[str]:
+    # From the first bytes of a file: 'parquet', 'arrow' or None
+    if head[:len(PARQUET_MAGIC)] == PARQUET_MAGIC:
+        return 'parquet'
+    if head[:len(ARROW_MAGIC)] == ARROW_MAGIC:
+        return 'arrow'
+    return None
+
+
+def bank_schema():
+    return pa.schema([
+        pa.field('question', pa.string(), nullable=False),
+        pa.field('options', pa.list_(pa.string()), nullable=False),
+        pa.field('answer_index', pa.int16(), nullable=False),
+        pa.field('explanation', pa.string()),
+        pa.field('tags', pa.list_(pa.string())),
+    ])
+
+
+def event_schema():
+    return pa.schema([
+        pa.field('session_id', pa.string()),
+        pa.field('bank_id', pa.int64()),
+        pa.field('question_id', pa.int32()),
+        pa.field('chosen', pa.int16()),
+        pa.field('correct', pa.bool_()),
+        pa.field('latency_ms', pa.int32()),
+        pa.field('ts', pa.timestamp('ms', tz='UTC')),
+    ])
+
+
+# -- Writing --
+def _bank_batch(questions: Sequence[Mapping]):
+    return pa.RecordBatch.from_arrays([
+        pa.array([q['question'] for q in questions], pa.string()),
+        pa.array([list(q['options']) for q in questions], pa.list_(pa.string())),
+        pa.array([answer_index(q) for q in questions], pa.int16()),
+        pa.array([q.get('explanation') for q in questions], pa.string()),
+        pa.array([list(q['tags']) if q.get('tags') else None for q in questions], pa.list_(pa.string())),
+    ], schema=bank_schema())
+
+
+class ColumnarWriter:
+    # Streams rows out in record batches, so exporting a large bank or answer log holds
+    # one batch in memory. Each batch becomes one Parquet row group or Arrow batch.
+    def __init__(self, sink, schema, fmt: str = 'parquet', to_batch=None, batch_size: int = BATCH_SIZE):
+        require_pyarrow()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown columnar format {fmt!r} (expected 'parquet' or 'arrow')")
+        self.rows = 0
+        self._to_batch = to_batch
+        self._batch_size = batch_size
+        self._pending: List = []
+        self._file = None
+        if fmt == 'parquet':
+            self._writer = pq.ParquetWriter(sink, schema, compression='zstd')
+            self._write = lambda batch: self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            if isinstance(sink, str):
+                sink = self._file = pa.OSFile(sink, 'wb')
+            self._writer = pa.ipc.new_file(sink, schema)
+            self._write = self._writer.write_batch
+
+    def write(self, rows: Iterable) -> None:
+        for row in rows:
+            self._pending.append(row)
+            if len(self._pending) >= self._batch_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._write(self._to_batch(self._pending))
+            self.rows += len(self._pending)
+            self._pending = []
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def bank_writer(sink, fmt: str = 'parquet', batch_size: int = BATCH_SIZE) -> ColumnarWriter:
+    # Rows are question dicts; questions whose answer is not an option raise ValueError
+    return ColumnarWriter(sink, bank_schema(), fmt, _bank_batch, batch_size)
+
+
+def _event_batch(events: Sequence[Mapping]):
+    columns = {name: [e[name] for e in events] for name in event_schema().names}
+    columns['ts'] = [int(ts * 1000) for ts in columns['ts']]
+    return pa.RecordBatch.from_pydict(columns, schema=event_schema())
+
+
+def event_writer(sink, fmt: str = 'parquet', batch_size: int = 100_000) -> ColumnarWriter:
+    # Rows are answer-event mappings (see event_log.AnswerEvent)
+    return ColumnarWriter(sink, event_schema(), fmt, _event_batch, batch_size)
+
+
+def bank_to_bytes(questions: Iterable[Mapping], fmt: str = 'parquet') -> bytes:
+    # An in-memory file, e.g. for a download button
+    require_pyarrow()
+    sink = pa.BufferOutputStream()
+    with bank_writer(sink, fmt) as writer:
+        writer.write(questions)
+    return sink.getvalue().to_pybytes()
+
+
+def events_to_bytes(events: Iterable[Mapping], fmt: str = 'parquet') -> bytes:
+    require_pyarrow()
+    sink = pa.BufferOutputStream()
+    with event_writer(sink, fmt) as writer:
+        writer.write(events)
+    return sink.getvalue().to_pybytes()
+
+
+# -- Reading --
+def _source(data: Union[str, bytes]):
+    # Paths are memory-mapped; bytes (an upload) are read in place
+    return pa.memory_map(data) if isinstance(data, str) else pa.BufferReader(data)
+
+
+class ColumnarBank:
+    # Same read interface as bank_store.StoredBank. Opening reads only the question,
+    # options, answer and tag columns; explanations stay on disk (Arrow: mapped, read on
+    # access) or are decoded one Parquet row group at a time when a question needs one.
+    def __init__(self, data: Union[str, bytes], bank_id: Optional[int] = None):
+        require_pyarrow()
+        self.bank_id = bank_id
+        if isinstance(data, bytes):
+            self.format = detect_format(data)
+        else:
+            with open(data, 'rb') as f:
+                self.format = detect_format(f.read(len(ARROW_MAGIC)))
+        if self.format == 'parquet':
+            self._parquet = pq.ParquetFile(_source(data))
+            names = self._parquet.schema_arrow.names
+            table = self._parquet.read(columns=[c for c in INDEX_COLUMNS if c in names])
+            meta = self._parquet.metadata
+            self._group_starts = [0]
+            for i in range(meta.num_row_groups):
+                self._group_starts.append(self._group_starts[-1] + meta.row_group(i).num_rows)
+            self._explanations: "OrderedDict[int, list]" = OrderedDict()
+            self._explanation_column = None
+        elif self.format == 'arrow':
+            table = pa.ipc.open_file(_source(data)).read_all()
+            names = table.schema.names
+            self._explanation_column = table.column('explanation') if 'explanation' in names else None
+            table = table.select([c for c in INDEX_COLUMNS if c in names])
+        else:
+            raise ValueError('not a Parquet or Arrow bank')
+        missing = {'question', 'options', 'answer_index'} - set(table.schema.names)
+        if missing:
+            raise ValueError(f"bank is missing columns: {', '.join(sorted(missing))}")
+        self._table = table
+        self._count = table.num_rows
+
+    def __len__(self) -> int:
+        return self._count
+
+    def column(self, name: str) -> list:
+        # A whole indexed column as Python values, e.g. all question stems for search
+        return self._table.column(name).to_pylist()
+
+    def explanation(self, position: int) -> Optional[str]:
+        if self._explanation_column is not None:
+            return self._explanation_column[position].as_py()
+        if self.format != 'parquet':
+            return None
+        group = bisect.bisect_right(self._group_starts, position) - 1
+        values = self._explanations.get(group)
+        if values is None:
+            if 'explanation' not in self._parquet.schema_arrow.names:
+                return None
+            values = self._parquet.read_row_group(group, columns=['explanation']).column(0).to_pylist()
+            self._explanations[group] = values
+            while len(self._explanations) > EXPLANATION_GROUPS:
+                self._explanations.popitem(last=False)
+        else:
+            self._explanations.move_to_end(group)
+        return values[position - self._group_starts[group]]
+
+    def _index_question(self, row: Dict, position: int) -> Dict:
+        # The question from its index columns alone, without the explanation. Files from
+        # elsewhere may hold nulls or other column types, so each row is checked with the
+        # JSON bank rules before it is used; ValueError describes a failing row.
+        options, index = row.get('options'), row.get('answer_index')
+        answerable = (isinstance(options, list) and isinstance(index, int) and not isinstance(index, bool)
+                      and 0 <= index < len(options))
+        q = {'question': row.get('question'), 'options': options, 'answer': options[index] if answerable else None,
+             'answer_index': index, 'explanation': ''}
+        if row.get('tags') is not None:
+            q['tags'] = row['tags']
+        problems = validate_question(q) if answerable else ['"answer_index" is not one of "options"']
+        if problems:
+            raise ValueError(f"question {position + 1}: {'; '.join(problems)}")
+        del q['explanation']
+        q['options'] = tuple(options)
+        if q.get('tags'):
+            q['tags'] = tuple(q['tags'])
+        else:
+            q.pop('tags', None)
+        return q
+
+    def _index_rows(self) -> Iterator[Tuple[int, Dict]]:
+        # Converted a batch at a time rather than sliced out row by row
+        position = 0
+        for batch in self._table.to_batches(BATCH_SIZE):
+            for row in batch.to_pylist():
+                yield position, row
+                position += 1
+
+    def index_questions(self) -> Tuple[Dict[int, Dict], List[str]]:
+        # Every question without its explanation, by position, for consumers that never
+        # show one (grading, dedup); rows that fail the checks are left out and described
+        # in the second list
+        questions, problems = {}, []
+        for position, row in self._index_rows():
+            try:
+                questions[position] = self._index_question(row, position)
+            except ValueError as e:
+                problems.append(str(e))
+        return questions, problems
+
+    def __getitem__(self, position: int) -> Mapping:
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(f'no question at position {position}')
+        q = self._index_question(self._table.slice(position, 1).to_pylist()[0], position)
+        q['explanation'] = self.explanation(position) or "No explanation provided."
+        return MappingProxyType(q)
+
+    def __iter__(self) -> Iterator[Mapping]:
+        for position, row in self._index_rows():
+            q = self._index_question(row, position)
+            q['explanation'] = self.explanation(position) or "No explanation provided."
+            yield MappingProxyType(q)
+
+    @property
+    def complete(self) -> bool:
+        return True
+
+
+# -- Answer log export --
+def iter_events(kind: str, path: str, bank_id: Optional[int] = None, chunk: int = 100_000) -> Iterator[Dict]:
+    # Reads an event_log sink in chunks, oldest first, optionally for one bank only
+    names = ('session_id', 'bank_id', 'question_id', 'chosen', 'correct', 'latency_ms', 'ts')
+    if not os.path.exists(path):
+        return
+    if kind == 'jsonl':
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.endswith(b'\n'):
+                    e = json.loads(line)
+                    if bank_id is None or e['bank_id'] == bank_id:
+                        yield e
+        return
+    conn = sqlite3.connect(path)
+    try:
+        where = '' if bank_id is None else ' WHERE bank_id = ?'
+        cur = conn.execute(f"SELECT {', '.join(names)} FROM answer_events{where} ORDER BY rowid",
+                           () if bank_id is None else (bank_id,))
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            for row in rows:
+                e = dict(zip(names, row))
+                e['correct'] = bool(e['correct'])
+                yield e
+    except sqlite3.OperationalError:
+        pass  # no events recorded yet
+    finally:
+        conn.close()
+
+
+# -- CLI --
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert banks to Parquet/Arrow and export answer logs.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    bank = sub.add_parser('bank', help='convert a JSON, TXT or compiled bank')
+    bank.add_argument('source')
+    bank.add_argument('-o', '--output', help='output path (default: source with .parquet or .arrow)')
+    bank.add_argument('--format', choices=FORMATS, default='parquet')
+    log = sub.add_parser('events', help='export the answer-event log')
+    log.add_argument('--data-dir', default=os.environ.get('ADWENBOLOBO_DATA_DIR', '.adwenbolobo'))
+    log.add_argument('--sink', choices=['sqlite', 'jsonl'], default='sqlite')
+    log.add_argument('--bank-id', type=int, help='only events for this bank')
+    log.add_argument('-o', '--output', default='answer_events.parquet')
+    log.add_argument('--format', choices=FORMATS, default='parquet')
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        require_pyarrow()
+        if args.command == 'bank':
+            from grading import load_bank
+            output = args.output or os.path.splitext(args.source)[0] + SUFFIXES[args.format]
+            with bank_writer(output, args.format) as writer:
+                writer.write(load_bank(args.source, explanations=True))
+        else:
+            from event_log import SINK_FILES
+            output = args.output
+            with event_writer(output, args.format) as writer:
+                writer.write(iter_events(args.sink, os.path.join(args.data_dir, SINK_FILES[args.sink]),
+                                         args.bank_id))
+    except (ImportError, OSError, ValueError) as e:
+        print(f'{e}', file=sys.stderr)
+        return 1
+    print(f"{output}: {writer.rows} rows, {os.path.getsize(output) // 1024} KB "
+          f"in {time.perf_counter() - t0:.2f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
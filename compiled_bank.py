@@ -0,0 +1,230 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional
+
+from json_bank import JSONBankReader, answer_index, answer_problem
+from nbme_parser import iter_nbme_questions
+
+# -- Compiled bank format --
+# A bank compiled once and then opened with mmap, so opening costs the same for 100
+# questions as for 1,000,000 and only the questions actually shown are decoded.
+#
+#   header   MAGIC, version u16, reserved u16, count u32, table offset u64, sha256 of the records
+#   records  per question: u32 byte length + UTF-8 JSON {"question", "options", "answer", "answer_index",
+#            "explanation"} plus "tags" when the question has any
+#
+# Version 1 records have no answer_index; they are still read, keyed by the answer text.
+#   table    count + 1 u64 record offsets (the last one is the end of the records)
+#
+# All integers are little-endian. The table comes last so records can be streamed out
+# without knowing the count in advance.
+MAGIC = b'ADWBANK\0'
+FORMAT_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+HEADER = struct.Struct('<8sHHIQ32s')
+RECORD_LEN = struct.Struct('<I')
+OFFSET = struct.Struct('<Q')
+SUFFIX = '.adwb'
+
+REQUIRED_KEYS = ('question', 'options', 'answer', 'explanation')
+OPTIONAL_KEYS = ('tags',)
+
+
+class BankFormatError(ValueError):
+    pass
+
+
+def _check_question(q: Dict, index: int) -> None:
+    missing = [k for k in REQUIRED_KEYS if k not in q]
+    if missing:
+        raise BankFormatError(f"question {index + 1}: missing {', '.join(missing)}")
+    texts = [q['question'], q['answer'], q['explanation'], *q['options'], *(q.get('tags') or ())]
+    if not isinstance(q['options'], (list, tuple)) or not all(isinstance(t, str) for t in texts):
+        raise BankFormatError(f"question {index + 1}: fields must be text and options a list")
+    problem = answer_problem(q)
+    if problem is not None:
+        raise BankFormatError(f"question {index + 1}: {problem}")
+
+
+def write_bank(questions: Iterable[Dict], f) -> Dict:
+    # Writes to an open binary file; validation happens here, once, instead of at every start
+    f.write(b'\0' * HEADER.size)
+    digest = hashlib.sha256()
+    offsets = [HEADER.size]
+    for i, q in enumerate(questions):
+        _check_question(q, i)
+        record = {k: q[k] for k in REQUIRED_KEYS}
+        record['answer_index'] = answer_index(q)
+        record.update((k, q[k]) for k in OPTIONAL_KEYS if q.get(k))
+        payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        record = RECORD_LEN.pack(len(payload)) + payload
+        f.write(record)
+        digest.update(record)
+        offsets.append(offsets[-1] + len(record))
+    count = len(offsets) - 1
+    table = offsets[-1]
+    f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, count, table, digest.digest()))
+    return {'count': count, 'sha256': digest.hexdigest(), 'bytes': table + OFFSET.size * len(offsets)}
+
+
+def compile_bank(questions: Iterable[Dict], path: str) -> Dict:
+    # Written next to the target and renamed into place, so readers never see half a bank
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=SUFFIX + '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            info = write_bank(questions, f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return info
+
+
+def read_header(path: str) -> Dict:
+    with open(path, 'rb') as f:
+        data = f.read(HEADER.size)
+    return parse_header(data, path)
+
+
+def parse_header(data: bytes, path: str) -> Dict:
+    if len(data) < HEADER.size:
+        raise BankFormatError(f'{path}: file too short for a compiled bank')
+    magic, version, _, count, table, sha = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise BankFormatError(f'{path}: not a compiled bank')
+    if version not in READABLE_VERSIONS:
+        raise BankFormatError(f'{path}: unsupported compiled bank version {version}')
+    return {'count': count, 'table': table, 'sha256': sha.hex()}
+
+
+def is_compiled_bank(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+def verify_bank(data: bytes, path: str) -> Dict:
+    # For files from outside (uploads): the header is only a claim, so the offset table,
+    # every record and the records' digest are checked before the bank is trusted.
+    # Returns the header with the digest actually computed.
+    header = parse_header(data, path)
+    count, table = header['count'], header['table']
+    end = table + OFFSET.size * (count + 1)
+    if table < HEADER.size or end > len(data):
+        raise BankFormatError(f'{path}: truncated offset table')
+    offsets = struct.unpack_from(f'<{count + 1}Q', data, table)
+    if offsets[0] != HEADER.size or offsets[-1] != table:
+        raise BankFormatError(f'{path}: offset table does not cover the records')
+    view = memoryview(data)
+    for i in range(count):
+        start, stop = offsets[i], offsets[i + 1]
+        if stop - start < RECORD_LEN.size or RECORD_LEN.unpack_from(data, start)[0] != stop - start - RECORD_LEN.size:
+            raise BankFormatError(f'{path}: question {i + 1}: record length does not match the offset table')
+        try:
+            q = json.loads(bytes(view[start + RECORD_LEN.size:stop]))
+        except ValueError as e:
+            raise BankFormatError(f'{path}: question {i + 1}: {e}') from None
+        if not isinstance(q, dict):
+            raise BankFormatError(f'{path}: question {i + 1}: not a question object')
+        _check_question(q, i)
+    sha256 = hashlib.sha256(view[HEADER.size:table]).hexdigest()
+    if sha256 != header['sha256']:
+        raise BankFormatError(f'{path}: records do not match the digest in the header')
+    return dict(header, sha256=sha256)
+
+
+# -- Memory-mapped bank --
+class MappedBank:
+    # Same read interface as bank_store.StoredBank. Questions are decoded on access
+    # and handed out read-only; the operating system pages records in and out, so
+    # resident memory follows the questions actually viewed, not the bank size.
+    def __init__(self, path: str, bank_id: Optional[int] = None):
+        self.path = path
+        self.bank_id = bank_id
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = parse_header(self._mm[:HEADER.size], path)
+        self._count = header['count']
+        self._table = header['table']
+        self.sha256 = header['sha256']
+        if self._table + OFFSET.size * (self._count + 1) > len(self._mm):
+            raise BankFormatError(f'{path}: truncated offset table')
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position: int) -> Mapping:
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(f'{self.path} has no question at position {position}')
+        start = OFFSET.unpack_from(self._mm, self._table + OFFSET.size * position)[0]
+        length = RECORD_LEN.unpack_from(self._mm, start)[0]
+        begin = start + RECORD_LEN.size
+        q = json.loads(self._mm[begin:begin + length])
+        q['options'] = tuple(q['options'])
+        if 'tags' in q:
+            q['tags'] = tuple(q['tags'])
+        return MappingProxyType(q)
+
+    def __iter__(self) -> Iterator[Mapping]:
+        for position in range(self._count):
+            yield self[position]
+
+    @property
+    def complete(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+# -- Compile step --
+def _compile_source(path: str, output: str) -> Dict:
+    # Both sources are read incrementally, so compiling a huge export needs little memory
+    with open(path, 'rb') as f:
+        if not path.lower().endswith('.json'):
+            return compile_bank(iter_nbme_questions(f), output)
+        reader = JSONBankReader(f)
+        info = compile_bank(reader, output)
+    if reader.fatal:
+        os.remove(output)
+        raise BankFormatError(reader.fatal)
+    for e in reader.errors:
+        print(f'{path}: skipped {e}', file=sys.stderr)
+    info['skipped'] = reader.error_count
+    return info
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compile a JSON or TXT question bank into the memory-mapped format the app opens instantly.")
+    parser.add_argument('source', help='JSON bank or Question:/Options:/Answer: TXT file')
+    parser.add_argument('-o', '--output', help=f'output path (default: source with {SUFFIX})')
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.splitext(args.source)[0] + SUFFIX
+    t0 = time.perf_counter()
+    try:
+        info = _compile_source(args.source, output)
+    except (OSError, ValueError) as e:
+        print(f'{args.source}: {e}', file=sys.stderr)
+        return 1
+    print(f"{output}: {info['count']} questions, {info['bytes'] // 1024} KB "
+          f"in {time.perf_counter() - t0:.2f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
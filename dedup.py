@@ -0,0 +1,166 @@
+import re
+import zlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# -- Shingling --
+# Text is lowercased and reduced to words, so whitespace, punctuation and case never
+# make two copies of a vignette look different; word 3-grams carry the wording.
+WORD = re.compile(r'[a-z0-9]+')
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+DEFAULT_THRESHOLD = 0.85
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    words = WORD.findall(text.lower())
+    if len(words) <= k:
+        grams = [' '.join(words)]
+    else:
+        grams = [' '.join(words[i:i + k]) for i in range(len(words) - k + 1)]
+    # crc32 rather than hash(): signatures must agree across worker processes
+    return np.unique(np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams),
+                                 dtype=np.uint64, count=len(grams)))
+
+
+def question_text(q: Dict) -> str:
+    # App bank item: the stem plus its options is what a user would recognise as a repeat
+    return ' '.join([q['question'], *q['options']])
+
+
+def _normalize_answer(answer: str) -> str:
+    return ' '.join(WORD.findall(answer.lower()))
+
+
+# -- MinHash --
+class MinHasher:
+    # num_perm multiply-shift hashes ((a * x + b) mod 2^64) >> 32 with random odd a,
+    # evaluated for all shingles at once; a signature is the per-hash minimum.
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.seed = seed
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        h = shingles(text)
+        with np.errstate(over='ignore'):
+            mixed = (self._a[:, None] * h[None, :] + self._b[:, None]) >> np.uint64(32)
+        return mixed.min(axis=1).astype(np.uint32)
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    # Bands x rows whose S-curve midpoint (1/b)^(1/r) sits closest to the threshold,
+    # leaning towards recall: candidates are verified against the signatures anyway
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if midpoint > threshold:
+            break
+        best = (bands, rows)
+    return best or (num_perm, 1)
+
+
+# -- Near-duplicate index --
+class DuplicateMatch(NamedTuple):
+    duplicate: int  # input index of the dropped question
+    kept: int  # input index of the question it was merged into
+    similarity: float  # estimated Jaccard similarity of their shingles
+    text: str  # start of the dropped question, for the report
+
+
+class DedupReport:
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.total = 0
+        self.matches: List[DuplicateMatch] = []
+
+    @property
+    def kept(self) -> int:
+        return self.total - len(self.matches)
+
+    def summary(self) -> str:
+        return (f"{self.total} questions, {len(self.matches)} near-duplicates merged "
+                f"(similarity >= {self.threshold:.2f}), {self.kept} kept")
+
+
+class NearDuplicateIndex:
+    # Streaming LSH: each question is checked against the earlier ones that share a
+    # band bucket and is only added if none of them is similar enough, so a whole
+    # bank is deduplicated in roughly linear time. Questions whose answers differ are
+    # never merged, since a shared vignette often carries several distinct questions.
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM, seed: int = 1):
+        if not 0 < threshold <= 1:
+            raise ValueError(f"threshold must be in (0, 1], got {threshold}")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, seed)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.report = DedupReport(threshold)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._signatures: List[np.ndarray] = []
+        self._answers: List[str] = []
+        self._ids: List[int] = []
+
+    def _band_keys(self, sig: np.ndarray) -> List[bytes]:
+        r = self.rows
+        return [sig[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    def add_signature(self, sig: np.ndarray, answer: str, text: str = '') -> Optional[int]:
+        # Returns the input index this question duplicates, or None if it was kept
+        item_id = self.report.total
+        self.report.total += 1
+        answer = _normalize_answer(answer)
+        keys = self._band_keys(sig)
+        seen = set()
+        best, best_sim = None, 0.0
+        for band, key in zip(self._buckets, keys):
+            for slot in band.get(key, ()):
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                if self._answers[slot] != answer:
+                    continue
+                sim = float(np.count_nonzero(self._signatures[slot] == sig)) / len(sig)
+                if sim >= self.threshold and sim > best_sim:
+                    best, best_sim = slot, sim
+        if best is not None:
+            kept = self._ids[best]
+            self.report.matches.append(DuplicateMatch(item_id, kept, best_sim, text[:100]))
+            return kept
+        slot = len(self._signatures)
+        self._signatures.append(sig)
+        self._answers.append(answer)
+        self._ids.append(item_id)
+        for band, key in zip(self._buckets, keys):
+            band.setdefault(key, []).append(slot)
+        return None
+
+    def add(self, q: Dict, cache=None) -> Optional[int]:
+        # Signatures are most of the cost; with a cache (get/put, e.g. a ParsedBankCache)
+        # they are computed once per question text, so re-checking an edited paste only
+        # hashes the questions that changed and the LSH pass over the rest is cheap
+        text = question_text(q)
+        key = (self.hasher.num_perm, self.hasher.seed, text)
+        sig = cache.get(key) if cache is not None else None
+        if sig is None:
+            sig = self.hasher.signature(text)
+            if cache is not None:
+                sig.flags.writeable = False  # shared with every later check
+                cache.put(key, sig)
+        return self.add_signature(sig, q['answer'], q['question'])
+
+    def filter(self, questions: Iterable[Dict], cache=None) -> List[Dict]:
+        # Keeps the first copy of each near-duplicate group, in input order
+        return [q for q in questions if self.add(q, cache) is None]
+
+
+def dedupe_questions(questions: Iterable[Dict], threshold: float = DEFAULT_THRESHOLD,
+                     cache=None) -> Tuple[List[Dict], DedupReport]:
+    index = NearDuplicateIndex(threshold)
+    kept = index.filter(questions, cache)
+    return kept, index.report
@@ -0,0 +1,364 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple
+
+OPTION_LETTERS = ['A', 'B', 'C', 'D', 'E']
+
+# One pattern for every marker in a raw dump: question numbers, option letters,
+# the answer key and the sections that end an explanation. The leading character
+# class lets the regex engine skip ordinary text quickly; the lookbehinds then
+# pick the marker type, so m.start() is always the first character of the marker.
+TOKEN = re.compile(
+    r'[\nA-EI]'
+    r'(?:(?<=\n)(?P<number>\s*\d+\.\s)'
+    r'|(?<=[A-E])(?P<option>\s?\))'
+    r'|(?<=C)(?P<correct>orrect Answer:)'
+    r'|(?<=I)(?P<incorrect>ncorrect Answers:)'
+    r'|(?<=E)(?P<objective>ducational Objective:))'
+)
+ANSWER_LETTER = re.compile(r'\s*([A-E])')
+LEADING_SPACE = re.compile(r'\s*')
+
+
+def _clean(span: str) -> str:
+    return span.strip().replace('\n', ' ')
+
+
+# -- Per-question token state --
+class _Chunk:
+    __slots__ = ('start', 'question_end', 'options', 'option_letter', 'option_start',
+                 'answer', 'correct_end', 'stops', 'in_options')
+
+    def __init__(self, start: int):
+        self.start = start
+        self.question_end: Optional[int] = None
+        self.options: Dict[str, str] = {}
+        self.option_letter: Optional[str] = None
+        self.option_start = 0
+        self.answer = ''
+        self.correct_end: Optional[int] = None
+        self.stops: List[int] = []
+        self.in_options = False
+
+    def close_option(self, text: str, end: int) -> None:
+        # The first occurrence of a letter wins, as with a left-to-right search
+        if self.option_letter is not None and self.option_letter not in self.options:
+            self.options[self.option_letter] = _clean(text[self.option_start:end])
+        self.option_letter = None
+
+    def finish(self, text: str, end: int) -> Optional[Dict]:
+        if self.question_end is None:
+            return None  # skip malformed: no "A)" line after the stem
+        if self.in_options:
+            self.close_option(text, end)
+
+        explanation = ''
+        if self.correct_end is not None:
+            # Explanation starts after the first period following "Correct Answer:"
+            period = text.find('.', self.correct_end, end)
+            if period != -1:
+                exp_start = LEADING_SPACE.match(text, period + 1, end).end()
+                exp_end = next((p for p in self.stops if p >= exp_start), end)
+                explanation = _clean(text[exp_start:exp_end])
+
+        return {
+            'Question': _clean(text[self.start:self.question_end]),
+            'Options': {opt: self.options[opt] for opt in OPTION_LETTERS if opt in self.options},
+            'Answer': self.answer,
+            'Explanation': explanation
+        }
+
+
+# -- Single-pass tokenizer --
+def parse_questions(raw_text: str) -> List[Dict]:
+    # Walks the marker tokens once, left to right, so cost is linear in the dump size
+    # no matter how long the vignettes are or which markers are missing.
+    questions = []
+    chunk: Optional[_Chunk] = None
+
+    for m in TOKEN.finditer(raw_text):
+        kind = m.lastgroup
+        if kind == 'number':
+            if chunk is not None:
+                q = chunk.finish(raw_text, m.start())
+                if q:
+                    questions.append(q)
+            chunk = _Chunk(m.end())
+        elif chunk is None:
+            continue  # text before the first numbered question
+        elif kind == 'option':
+            if chunk.question_end is None:
+                # The stem ends at the first "A)" that starts a line
+                if raw_text[m.start()] == 'A' and m.start() > chunk.start and raw_text[m.start() - 1] == '\n':
+                    chunk.question_end = m.start() - 1
+                    chunk.in_options = True
+                    chunk.option_letter = 'A'
+                    chunk.option_start = m.end()
+            elif chunk.in_options:
+                chunk.close_option(raw_text, m.start())
+                chunk.option_letter = raw_text[m.start()]
+                chunk.option_start = m.end()
+        elif kind == 'correct':
+            if chunk.in_options:
+                chunk.close_option(raw_text, m.start())
+                chunk.in_options = False
+            if chunk.correct_end is None:
+                chunk.correct_end = m.end()
+            if not chunk.answer:
+                letter = ANSWER_LETTER.match(raw_text, m.end())
+                if letter:
+                    chunk.answer = letter.group(1)
+        else:
+            if kind == 'incorrect' and chunk.in_options:
+                chunk.close_option(raw_text, m.start())
+                chunk.in_options = False
+            chunk.stops.append(m.start())
+
+    if chunk is not None:
+        q = chunk.finish(raw_text, len(raw_text))
+        if q:
+            questions.append(q)
+    return questions
+
+
+# -- Reference regex implementation, kept for benchmarks and output comparison --
+def parse_questions_regex(raw_text: str) -> List[Dict]:
+    # Split by question numbers (e.g., "1.", "2.", etc.) - crude but works for your text
+    question_chunks = re.split(r'\n\s*\d+\.\s', raw_text)[1:]  # skip empty before first
+
+    questions = []
+
+    for chunk in question_chunks:
+        # Extract question text - up to first option (usually "A )" or "A)")
+        question_match = re.split(r'\nA\s?\)', chunk, maxsplit=1)
+        if len(question_match) < 2:
+            continue  # skip malformed
+
+        question_text = question_match[0].strip().replace('\n', ' ')
+
+        # Extract options (A-E); the split above consumed the "A)" marker, so put it back
+        options_text = 'A)' + question_match[1]
+        options = {}
+        for opt in OPTION_LETTERS:
+            # Find option text between this option and next (or end)
+            pattern = rf'{opt}\s?\)(.*?)(?=(?:[ABCDE]\s?\))|Correct Answer:|Incorrect Answers:|$)'
+            match = re.search(pattern, options_text, re.DOTALL)
+            if match:
+                option_clean = match.group(1).strip().replace('\n', ' ')
+                options[opt] = option_clean
+
+        # Extract correct answer letter
+        correct_match = re.search(r'Correct Answer:\s*([A-E])', chunk)
+        correct_answer = correct_match.group(1) if correct_match else ''
+
+        # Extract explanation: from Correct Answer up to Educational Objective or next question or end
+        explanation_match = re.search(r'Correct Answer:.*?\.\s*(.*?)(?:Incorrect Answers:|Educational Objective:|$)', chunk, re.DOTALL)
+        explanation = explanation_match.group(1).strip().replace('\n', ' ') if explanation_match else ''
+
+        # Compose question dict
+        question = {
+            'Question': question_text,
+            'Options': options,
+            'Answer': correct_answer,
+            'Explanation': explanation
+        }
+        questions.append(question)
+
+    return questions
+
+
+def format_question(q: Dict) -> str:
+    formatted = f"Question: {q['Question']}\nOptions:\n"
+    for opt in OPTION_LETTERS:
+        if opt in q['Options']:
+            formatted += f"{opt}. {q['Options'][opt]}\n"
+    formatted += f"Answer: {q['Answer']}\n"
+    formatted += f"Explanation: {q['Explanation']}\n\n"
+    return formatted
+
+
+# -- App bank format --
+def to_bank_item(q: Dict) -> Optional[Dict]:
+    # Same shape as the app's JSON loader expects; items without a usable answer key are dropped
+    if q['Answer'] not in q['Options']:
+        return None
+    letters = [opt for opt in OPTION_LETTERS if opt in q['Options']]
+    return {
+        'question': q['Question'],
+        'options': [q['Options'][opt] for opt in letters],
+        'answer': q['Options'][q['Answer']],
+        'answer_index': letters.index(q['Answer']),
+        'explanation': q['Explanation'] or "No explanation provided."
+    }
+
+
+# -- Batch conversion --
+# A source is (label, path, zip member or None); workers open it themselves so only
+# short tuples, not whole dumps, cross the process boundary.
+Source = Tuple[str, str, Optional[str]]
+
+
+def iter_sources(inputs: List[str]) -> Iterator[Source]:
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    if name.lower().endswith('.txt'):
+                        yield full, full, None
+                    elif name.lower().endswith('.zip'):
+                        yield from iter_sources([full])
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as zf:
+                for member in sorted(zf.namelist()):
+                    if member.lower().endswith('.txt') and not member.startswith('__MACOSX/'):
+                        yield f'{path}:{member}', path, member
+        else:
+            yield path, path, None
+
+
+def _read_source(path: str, member: Optional[str]) -> str:
+    if member is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    else:
+        with zipfile.ZipFile(path) as zf:
+            data = zf.read(member)
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('cp1252', errors='replace')
+
+
+def _dedup_key(q: Dict) -> Tuple[str, str]:
+    # (text to shingle, answer text), matching dedup.question_text for app items
+    text = ' '.join([q['Question'], *q['Options'].values()])
+    return text, q['Options'].get(q['Answer'], '')
+
+
+def convert_source(source: Source, dedup: bool = False) -> Dict:
+    label, path, member = source
+    t0 = time.perf_counter()
+    result = {'label': label, 'questions': [], 'text': '', 'missing_answer': 0, 'error': None,
+              'signatures': None}
+    try:
+        questions = parse_questions(_read_source(path, member))
+        result['questions'] = questions
+        result['text'] = ''.join(format_question(q) for q in questions)
+        result['missing_answer'] = sum(1 for q in questions if q['Answer'] not in q['Options'])
+        if dedup:
+            # MinHash is the expensive part, so workers compute it; only LSH runs in the parent
+            from dedup import MinHasher
+            hasher = MinHasher()
+            result['signatures'] = [hasher.signature(_dedup_key(q)[0]) for q in questions]
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['seconds'] = time.perf_counter() - t0
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Convert raw question dumps (files, directories or zip archives) "
+                    "into the app's TXT and JSON bank formats.")
+    parser.add_argument('inputs', nargs='+', help='TXT files, directories or zip archives')
+    parser.add_argument('--txt', help='write Question:/Options:/Answer: text here')
+    parser.add_argument('--json', help='write a JSON bank loadable by the app here')
+    parser.add_argument('--parquet', help='write a Parquet bank here (needs pyarrow)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--dedup', action='store_true', help='merge near-duplicate questions across all inputs')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='similarity at or above which questions are merged (default 0.85)')
+    parser.add_argument('--dedup-report', help='write the merged pairs as JSON here')
+    args = parser.parse_args(argv)
+
+    if not args.txt and not args.json and not args.parquet:
+        args.txt = 'cleaned_questions.txt'
+
+    sources = list(iter_sources(args.inputs))
+    if not sources:
+        print("No input files found.", file=sys.stderr)
+        return 1
+
+    dedup_index = None
+    if args.dedup:
+        # Imported here so plain conversion does not need NumPy
+        from dedup import DEFAULT_THRESHOLD, NearDuplicateIndex
+        dedup_index = NearDuplicateIndex(args.threshold or DEFAULT_THRESHOLD)
+
+    txt_out = open(args.txt, 'w', encoding='utf-8') if args.txt else None
+    json_out = open(args.json, 'w', encoding='utf-8') if args.json else None
+    parquet_out = None
+    if args.parquet:
+        # Imported here so plain conversion does not need pyarrow
+        from columnar import bank_writer
+        parquet_out = bank_writer(args.parquet)
+    totals = {'files': 0, 'failed': 0, 'questions': 0, 'missing_answer': 0}
+    first_item = True
+    t0 = time.perf_counter()
+    try:
+        if json_out:
+            json_out.write('[\n')
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            # map keeps input order; each result is written as soon as it and its predecessors are done
+            for result in pool.map(partial(convert_source, dedup=args.dedup), sources, chunksize=4):
+                totals['files'] += 1
+                if result['error']:
+                    totals['failed'] += 1
+                    print(f"{result['label']}: FAILED after {result['seconds'] * 1000:.0f} ms "
+                          f"({result['error']})", file=sys.stderr)
+                    continue
+                n = len(result['questions'])
+                totals['questions'] += n
+                totals['missing_answer'] += result['missing_answer']
+                print(f"{result['label']}: {n} questions, {result['missing_answer']} without answer key, "
+                      f"{result['seconds'] * 1000:.0f} ms")
+                questions = result['questions']
+                if dedup_index is not None:
+                    questions = [q for q, sig in zip(questions, result['signatures'])
+                                 if dedup_index.add_signature(sig, _dedup_key(q)[1], q['Question']) is None]
+                    if txt_out:
+                        txt_out.write(''.join(format_question(q) for q in questions))
+                elif txt_out:
+                    txt_out.write(result['text'])
+                if json_out or parquet_out:
+                    items = [item for item in map(to_bank_item, questions) if item is not None]
+                    if json_out:
+                        for item in items:
+                            json_out.write(('' if first_item else ',\n') + json.dumps(item, ensure_ascii=False))
+                            first_item = False
+                    if parquet_out:
+                        parquet_out.write(items)
+        if json_out:
+            json_out.write('\n]\n')
+    finally:
+        if txt_out:
+            txt_out.close()
+        if json_out:
+            json_out.close()
+        if parquet_out:
+            parquet_out.close()
+
+    print(f"{totals['files']} files, {totals['failed']} failed, {totals['questions']} questions, "
+          f"{totals['missing_answer']} without answer key in {time.perf_counter() - t0:.2f} s")
+    if dedup_index is not None:
+        report = dedup_index.report
+        print(report.summary())
+        if args.dedup_report:
+            # Indices count questions across all inputs, in output order before merging
+            with open(args.dedup_report, 'w', encoding='utf-8') as f:
+                json.dump({'threshold': report.threshold, 'total': report.total, 'kept': report.kept,
+                           'merged': [m._asdict() for m in report.matches]}, f, ensure_ascii=False, indent=1)
+    return 1 if totals['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import List, NamedTuple, Optional
+
+
+# -- Answer events --
+# One compact row per submitted answer. question_id is the question's position in
+# its bank; banks are content-addressed, so (bank_id, question_id) is stable.
+class AnswerEvent(NamedTuple):
+    session_id: str
+    bank_id: int
+    question_id: int
+    chosen: int
+    correct: bool
+    latency_ms: int
+    ts: float
+
+
+# -- Sinks --
+class JSONLEventSink:
+    def __init__(self, path: str):
+        self.path = path
+
+    def write_batch(self, events: List[AnswerEvent]) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(e._asdict()) + '\n' for e in events))
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteEventSink:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS answer_events (
+        session_id TEXT NOT NULL,
+        bank_id INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        chosen INTEGER NOT NULL,
+        correct INTEGER NOT NULL,
+        latency_ms INTEGER NOT NULL,
+        ts REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS answer_events_question ON answer_events (bank_id, question_id);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def write_batch(self, events: List[AnswerEvent]) -> None:
+        # Opened lazily so the connection belongs to the writer thread
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(self.SCHEMA)
+        with self._conn:
+            self._conn.executemany('INSERT INTO answer_events VALUES (?, ?, ?, ?, ?, ?, ?)', events)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+SINK_FILES = {'sqlite': 'events.sqlite3', 'jsonl': 'answer_events.jsonl'}
+
+
+def open_sink(kind: str, data_dir: str):
+    if kind not in SINK_FILES:
+        raise ValueError(f"Unknown event sink {kind!r} (expected 'sqlite' or 'jsonl')")
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, SINK_FILES[kind])
+    return SQLiteEventSink(path) if kind == 'sqlite' else JSONLEventSink(path)
+
+
+# -- Buffered, append-only log --
+# record() only appends to an in-memory buffer; a background thread writes batches
+# to the sink, so a slow disk never blocks a Streamlit rerun.
+class AnswerEventLog:
+    def __init__(self, sink, batch_size: int = 256, flush_interval: float = 1.0, max_buffer: int = 100_000):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = threading.Thread(target=self._run, name='answer-event-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, session_id: str, bank_id: int, question_id: int, chosen: int,
+               correct: bool, latency_ms: int, ts: Optional[float] = None) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1  # the oldest unwritten event falls off the full buffer
+        self._buffer.append(AnswerEvent(session_id, bank_id, question_id, chosen, bool(correct),
+                                        int(latency_ms), time.time() if ts is None else ts))
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        # Blocks until everything recorded so far has been handed to the sink
+        deadline = time.monotonic() + timeout
+        while self._buffer or not self._idle.is_set():
+            self._wake.set()
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self) -> None:
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+
+    def _drain(self) -> None:
+        while self._buffer:
+            batch = []
+            while self._buffer and len(batch) < self.batch_size:
+                batch.append(self._buffer.popleft())
+            try:
+                self.sink.write_batch(batch)
+                self.written += len(batch)
+            except Exception:
+                # Keep the writer alive; a failed batch is counted rather than retried forever
+                self.errors += 1
+                self.dropped += len(batch)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._idle.clear()
+            self._drain()
+            self._idle.set()
+        self._drain()
+        self.sink.close()
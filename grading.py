@@ -0,0 +1,237 @@
+import argparse
+import csv
+import sys
+import time
+from typing import Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from columnar import ColumnarBank, detect_format
+from compiled_bank import MAGIC, MappedBank
+from json_bank import JSONBankReader, answer_index
+from nbme_parser import iter_nbme_questions
+
+BLANK = -1  # unanswered, or a response that names no single option
+
+
+# -- Bank loading --
+def load_bank(path: str, explanations: bool = False) -> List[Mapping]:
+    # Compiled, Parquet/Arrow, JSON or Question:/Options:/Answer: TXT, told apart by content
+    # and suffix. Grading never shows explanations, so Parquet/Arrow banks are read
+    # without that column unless they are asked for.
+    with open(path, 'rb') as f:
+        head = f.read(len(MAGIC))
+        if head == MAGIC:
+            return list(MappedBank(path))
+        if detect_format(head) is not None:
+            bank = ColumnarBank(path)
+            if explanations:
+                return list(bank)
+            questions, problems = bank.index_questions()
+            if problems:
+                raise ValueError(f'{path}: {problems[0]}')
+            return list(questions.values())
+        f.seek(0)
+        if not path.lower().endswith('.json'):
+            return list(iter_nbme_questions(f))
+        reader = JSONBankReader(f)
+        questions = list(reader)
+    if reader.fatal:
+        raise ValueError(reader.fatal)
+    for e in reader.errors:
+        print(f'{path}: skipped {e}', file=sys.stderr)
+    return questions
+
+
+# -- Answer key --
+class AnswerKey(NamedTuple):
+    key: np.ndarray  # keyed option index per question
+    n_options: np.ndarray
+
+
+def answer_key(questions: Sequence[Mapping]) -> AnswerKey:
+    # Banks store the keyed option's index (json_bank.answer_index); older banks only
+    # the answer text, which must then match exactly one option. Raises ValueError
+    # naming the first question whose key cannot be told.
+    key = np.empty(len(questions), dtype=np.int16)
+    n_options = np.empty(len(questions), dtype=np.int16)
+    for i, q in enumerate(questions):
+        try:
+            key[i] = answer_index(q)
+        except ValueError as e:
+            raise ValueError(f'question {i + 1}: {e}') from None
+        n_options[i] = len(q['options'])
+    return AnswerKey(key, n_options)
+
+
+def response_matrix(sheets: Sequence[Sequence[str]], questions: Sequence[Mapping]) -> np.ndarray:
+    # sheets x questions option indices. Letters (A, b, ...) map directly; anything else
+    # must equal exactly one option's text, otherwise the response counts as BLANK.
+    n_questions = len(questions)
+    cells = np.array([list(sheet[:n_questions]) + [''] * (n_questions - len(sheet)) for sheet in sheets],
+                     dtype=str).reshape(len(sheets), n_questions)
+    cells = np.char.strip(cells)
+    upper = np.char.upper(cells)
+    is_letter = (np.char.str_len(upper) == 1) & (upper >= 'A') & (upper <= 'Z')
+    responses = np.full(cells.shape, BLANK, dtype=np.int16)
+    responses[is_letter] = np.frombuffer(np.char.encode(upper[is_letter], 'ascii'), dtype=np.uint8) - ord('A')
+    for s, i in zip(*np.nonzero(~is_letter & (cells != ''))):
+        options = list(questions[i]['options'])
+        if options.count(cells[s, i]) == 1:
+            responses[s, i] = options.index(cells[s, i])
+    n_options = np.fromiter((len(q['options']) for q in questions), dtype=np.int16, count=n_questions)
+    responses[responses >= n_options] = BLANK
+    return responses
+
+
+# -- Sections --
+class Sections(NamedTuple):
+    names: List[str]
+    membership: np.ndarray  # questions x sections, 1 where the question counts toward the section
+
+
+def sections_by_size(n_questions: int, size: int) -> Sections:
+    # Consecutive blocks, e.g. 40-question NBME blocks
+    blocks = np.arange(n_questions) // size
+    n_blocks = int(blocks[-1]) + 1 if n_questions else 0
+    membership = np.zeros((n_questions, n_blocks), dtype=np.int32)
+    membership[np.arange(n_questions), blocks] = 1
+    names = [f'block {b + 1} (Q{b * size + 1}-{min(n_questions, (b + 1) * size)})' for b in range(n_blocks)]
+    return Sections(names, membership)
+
+
+def sections_by_tag(questions: Sequence[Mapping]) -> Sections:
+    # A question counts toward each of its tags; untagged questions toward none
+    names = sorted({tag for q in questions for tag in q.get('tags') or ()})
+    column = {tag: j for j, tag in enumerate(names)}
+    membership = np.zeros((len(questions), len(names)), dtype=np.int32)
+    for i, q in enumerate(questions):
+        for tag in q.get('tags') or ():
+            membership[i, column[tag]] = 1
+    return Sections(names, membership)
+
+
+# -- Grading --
+class Grades(NamedTuple):
+    correct: np.ndarray  # sheets x questions, bool
+    scores: np.ndarray  # correct answers per sheet
+    answered: np.ndarray  # non-blank responses per sheet
+    item_p: np.ndarray  # proportion of sheets answering each question correctly
+    section_scores: Optional[np.ndarray]  # sheets x sections
+    section_totals: Optional[np.ndarray]  # questions per section
+
+
+def grade(responses: np.ndarray, key: AnswerKey, sections: Optional[Sections] = None) -> Grades:
+    # The whole sheets x questions matrix at once: one comparison against the key, then
+    # row and column sums, and one matrix product for every section subtotal
+    correct = responses == key.key[None, :]
+    scores = correct.sum(axis=1)
+    answered = (responses != BLANK).sum(axis=1)
+    item_p = correct.mean(axis=0) if len(responses) else np.zeros(responses.shape[1])
+    section_scores = section_totals = None
+    if sections is not None:
+        section_scores = correct.astype(np.int32) @ sections.membership
+        section_totals = sections.membership.sum(axis=0)
+    return Grades(correct, scores, answered, item_p, section_scores, section_totals)
+
+
+# -- Answer sheets --
+def read_sheets(path: str) -> Tuple[List[str], List[List[str]]]:
+    # CSV with a header row: first column the sheet id, then one column per question
+    # in bank order holding a letter, the option text, or nothing
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = [row for row in csv.reader(f) if row]
+    if not rows:
+        return [], []
+    return [row[0] for row in rows[1:]], [row[1:] for row in rows[1:]]
+
+
+def write_results(path: str, ids: Iterable[str], grades: Grades, n_questions: int,
+                  sections: Optional[Sections] = None) -> None:
+    section_names = sections.names if sections is not None else []
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        out = csv.writer(f)
+        out.writerow(['id', 'score', 'answered', 'total', 'percent'] +
+                     [f'{name} ({total})' for name, total in zip(section_names, grades.section_totals
+                                                                 if sections is not None else [])])
+        for s, sheet_id in enumerate(ids):
+            row = [sheet_id, int(grades.scores[s]), int(grades.answered[s]), n_questions,
+                   round(100 * grades.scores[s] / n_questions, 1) if n_questions else 0.0]
+            if grades.section_scores is not None:
+                row += grades.section_scores[s].tolist()
+            out.writerow(row)
+
+
+def write_items(path: str, questions: Sequence[Mapping], key: AnswerKey, grades: Grades) -> None:
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        out = csv.writer(f)
+        out.writerow(['question', 'key', 'correct', 'p_value', 'text'])
+        counts = grades.correct.sum(axis=0)
+        for i, q in enumerate(questions):
+            out.writerow([i + 1, chr(ord('A') + int(key.key[i])), int(counts[i]), round(float(grades.item_p[i]), 3),
+                          q['question'][:80]])
+
+
+def write_matrix(path: str, ids: Iterable[str], grades: Grades) -> None:
+    # Per-sheet, per-question correctness as 0/1, for downstream analysis
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        out = csv.writer(f)
+        out.writerow(['id'] + [f'Q{i + 1}' for i in range(grades.correct.shape[1])])
+        for sheet_id, row in zip(ids, grades.correct.astype(np.int8)):
+            out.writerow([sheet_id] + row.tolist())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Grade offline answer sheets against a question bank.")
+    parser.add_argument('bank', help='JSON, TXT, Parquet/Arrow or compiled (.adwb) bank '
+                                     'the sheets were answered from')
+    parser.add_argument('sheets', help='CSV: header row, then sheet id and one answer per question')
+    parser.add_argument('-o', '--output', default='grades.csv', help='per-sheet scores (default: grades.csv)')
+    parser.add_argument('--items', help='also write per-question statistics here')
+    parser.add_argument('--matrix', help='also write per-sheet, per-question correctness (0/1) here')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--section-size', type=int, help='subtotal consecutive blocks of this many questions')
+    group.add_argument('--by-tag', action='store_true', help='subtotal by question tag')
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        questions = load_bank(args.bank)
+        ids, sheets = read_sheets(args.sheets)
+    except (ImportError, OSError, ValueError) as e:
+        print(f'{e}', file=sys.stderr)
+        return 1
+    if not questions:
+        print(f'{args.bank}: no questions', file=sys.stderr)
+        return 1
+    wrong_length = [sheet_id for sheet_id, sheet in zip(ids, sheets) if len(sheet) != len(questions)]
+    if wrong_length:
+        print(f"{len(wrong_length)} sheets do not have {len(questions)} answers (missing ones count as blank): "
+              f"{', '.join(wrong_length[:10])}", file=sys.stderr)
+
+    try:
+        key = answer_key(questions)
+    except ValueError as e:
+        print(f'{args.bank}: {e}', file=sys.stderr)
+        return 1
+    sections = None
+    if args.section_size:
+        sections = sections_by_size(len(questions), args.section_size)
+    elif args.by_tag:
+        sections = sections_by_tag(questions)
+
+    responses = response_matrix(sheets, questions)
+    grades = grade(responses, key, sections)
+    write_results(args.output, ids, grades, len(questions), sections)
+    if args.items:
+        write_items(args.items, questions, key, grades)
+    if args.matrix:
+        write_matrix(args.matrix, ids, grades)
+    mean = grades.scores.mean() if len(ids) else 0.0
+    print(f"{args.output}: {len(ids)} sheets x {len(questions)} questions, mean score {mean:.1f} "
+          f"in {time.perf_counter() - t0:.2f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Optional
+
+# -- Opt-in span timing --
+# Set ADWENBOLOBO_PROFILE=1 to time named spans on every script run. When it is off,
+# span() hands back one shared do-nothing context manager and timed() returns the
+# function unchanged, so instrumented code pays a function call and nothing else.
+ENABLED = os.environ.get('ADWENBOLOBO_PROFILE') == '1'
+WINDOW = 1024  # samples kept per span for the rolling percentiles
+PERCENTILES = (50, 90, 99)
+MAX_SESSIONS = 1000
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class SpanStats:
+    __slots__ = ('count', 'total', 'max', 'window')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.window: deque = deque(maxlen=WINDOW)
+
+
+def percentiles(window) -> Dict[int, float]:
+    samples = sorted(window)
+    if not samples:
+        return {p: 0.0 for p in PERCENTILES}
+    return {p: samples[min(len(samples) - 1, len(samples) * p // 100)] for p in PERCENTILES}
+
+
+class Profiler:
+    # Process-wide: every session records into the same spans, so percentiles reflect
+    # all traffic; script runs are also counted per session to spot rerun storms.
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self.started = time.time()
+        self.spans: Dict[str, SpanStats] = {}
+        self.session_runs: "OrderedDict[str, int]" = OrderedDict()
+        self.total_runs = 0  # process-wide and never reset; session_runs forgets old sessions
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()  # one writer at a time; snapshot() takes _lock
+        self._last_dump = 0.0
+
+    def span(self, name: str):
+        return _Span(self, name) if self.enabled else _NOOP
+
+    def timed(self, name: str, fn: Callable) -> Callable:
+        if not self.enabled:
+            return fn
+
+        def wrapper(*args, **kwargs):
+            with _Span(self, name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = SpanStats()
+            stats.count += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.window.append(seconds)
+
+    def count_run(self, session_id: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.total_runs += 1
+            self.session_runs[session_id] = self.session_runs.get(session_id, 0) + 1
+            self.session_runs.move_to_end(session_id)
+            while len(self.session_runs) > MAX_SESSIONS:
+                self.session_runs.popitem(last=False)
+
+    # -- Reporting --
+    def snapshot(self) -> Dict:
+        with self._lock:
+            spans = {name: (s.count, s.total, s.max, list(s.window)) for name, s in self.spans.items()}
+            runs = dict(self.session_runs)
+            total_runs = self.total_runs
+        report = {'uptime_s': round(time.time() - self.started, 1), 'spans': {}, 'script_runs': total_runs,
+                  'sessions': len(runs), 'runs_per_session': runs}
+        for name, (count, total, peak, window) in sorted(spans.items()):
+            pct = percentiles(window)
+            report['spans'][name] = {'count': count, 'mean_ms': total / count * 1000 if count else 0.0,
+                                     'max_ms': peak * 1000,
+                                     **{f'p{p}_ms': v * 1000 for p, v in pct.items()}}
+        return report
+
+    def to_prometheus(self, snapshot: Optional[Dict] = None) -> str:
+        snap = snapshot or self.snapshot()
+        lines = ['# HELP adwenbolobo_span_seconds Time spent in named spans (rolling window quantiles).',
+                 '# TYPE adwenbolobo_span_seconds summary']
+        for name, s in snap['spans'].items():
+            for p in PERCENTILES:
+                lines.append(f'adwenbolobo_span_seconds{{span="{name}",quantile="{p / 100}"}} '
+                             f'{s[f"p{p}_ms"] / 1000:.6g}')
+            lines.append(f'adwenbolobo_span_seconds_sum{{span="{name}"}} {s["mean_ms"] * s["count"] / 1000:.6g}')
+            lines.append(f'adwenbolobo_span_seconds_count{{span="{name}"}} {s["count"]}')
+        lines += ['# HELP adwenbolobo_script_runs_total Full script runs since the process started.',
+                  '# TYPE adwenbolobo_script_runs_total counter',
+                  f'adwenbolobo_script_runs_total {snap["script_runs"]}',
+                  '# HELP adwenbolobo_sessions Tracked sessions (the most recent ones) with at least one run.',
+                  '# TYPE adwenbolobo_sessions gauge',
+                  f'adwenbolobo_sessions {snap["sessions"]}']
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, directory: str, min_interval: float = 5.0) -> bool:
+        # Writes profile.prom and profile.json, at most every min_interval seconds; every
+        # session calls this, and other server processes may share the directory
+        if not self.enabled:
+            return False
+        with self._dump_lock:
+            if time.monotonic() - self._last_dump < min_interval:
+                return False
+            self._last_dump = time.monotonic()
+            snap = self.snapshot()
+            os.makedirs(directory, exist_ok=True)
+            for name, text in (('profile.prom', self.to_prometheus(snap)),
+                               ('profile.json', json.dumps(snap, indent=1))):
+                fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(tmp, os.path.join(directory, name))
+        return True
+
+
+PROFILER = Profiler()
+span = PROFILER.span
+
+
+# -- Session state sizes --
+# Debug aid for load tests: with ADWENBOLOBO_STATE_SIZES=1 the app writes the deep size of
+# each of a session's st.session_state entries to <directory>/<session id>.json after
+# every full run. Objects shared between sessions (a cached bank, say) are counted in
+# every session that holds them, which is exactly what shows whether a session pays
+# for its own copy.
+STATE_SIZES = os.environ.get('ADWENBOLOBO_STATE_SIZES') == '1'
+
+
+def deep_size(obj, seen: Optional[set] = None) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict) or hasattr(obj, 'items') and hasattr(obj, 'keys'):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(v, seen) for v in obj)
+    return size
+
+
+def dump_state_sizes(directory: str, session_id: str, state) -> None:
+    sizes = {k: deep_size(state[k]) for k in list(state.keys())}
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(sizes, f)
+    os.replace(tmp, os.path.join(directory, session_id + '.json'))
@@ -0,0 +1,226 @@
+import json
+import os
+import sqlite3
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from json_bank import answer_index
+
+LOAD_CHUNK = 500_000
+
+
+# -- Attempt loading --
+# Both loaders return only rows added since the previous call (by SQLite rowid or
+# JSONL byte offset), so refreshing the analysis reads just the new attempts. Columns
+# come back as NumPy arrays; session ids are factorized into per-load codes indexing
+# session_ids, so no per-row Python strings reach the analysis.
+class Attempts(NamedTuple):
+    question_id: np.ndarray
+    chosen: np.ndarray
+    correct: np.ndarray
+    latency_ms: np.ndarray
+    session: np.ndarray  # index into session_ids
+    session_ids: List[str]
+
+
+def _factorize(values: Sequence[str], codes: Dict[str, int]) -> np.ndarray:
+    return np.fromiter((codes.setdefault(v, len(codes)) for v in values), dtype=np.int32, count=len(values))
+
+
+def _attempts(parts: List[Tuple[np.ndarray, ...]], codes: Dict[str, int]) -> Attempts:
+    if not parts:
+        empty = np.empty(0, dtype=np.int64)
+        return Attempts(empty, empty, empty, empty, np.empty(0, dtype=np.int32), [])
+    question_id, chosen, correct, latency_ms, session = (np.concatenate(c) for c in zip(*parts))
+    return Attempts(question_id, chosen, correct, latency_ms, session, list(codes))
+
+
+# One aggregate row per chunk: SQLite joins each column into a comma-separated string
+# and NumPy parses it in C, instead of the sqlite3 module building a Python tuple and
+# five objects for every attempt. Rows are read in rowid order from the primary key;
+# the (bank_id, question_id) index would force a sort of the whole range.
+SQLITE_CHUNK = """
+SELECT count(*), max(rowid), group_concat(question_id), group_concat(chosen), group_concat(correct),
+       group_concat(latency_ms), group_concat(session_id)
+FROM (SELECT rowid, * FROM answer_events NOT INDEXED WHERE rowid > ? AND bank_id = ? ORDER BY rowid LIMIT ?)
+"""
+
+
+def load_sqlite_attempts(path: str, bank_id: int, after: int = 0) -> Tuple[Attempts, int]:
+    parts, codes = [], {}
+    if not os.path.exists(path):
+        return _attempts(parts, codes), after
+    conn = sqlite3.connect(path)
+    try:
+        while True:
+            n, last, *columns, sessions = conn.execute(SQLITE_CHUNK, (after, bank_id, LOAD_CHUNK)).fetchone()
+            if not n:
+                break
+            arrays = [np.fromstring(c, dtype=np.int64, sep=',') for c in columns]
+            sessions = sessions.split(',')
+            if any(len(a) != n for a in arrays) or len(sessions) != n:
+                raise ValueError(f'{path}: unexpected values in answer_events after rowid {after}')
+            parts.append((*arrays, _factorize(sessions, codes)))
+            after = last
+    except sqlite3.OperationalError:
+        pass  # no events recorded yet
+    finally:
+        conn.close()
+    return _attempts(parts, codes), after
+
+
+def load_jsonl_attempts(path: str, bank_id: int, after: int = 0) -> Tuple[Attempts, int]:
+    parts, codes = [], {}
+    if not os.path.exists(path):
+        return _attempts(parts, codes), after
+    names = ('question_id', 'chosen', 'correct', 'latency_ms')
+    with open(path, 'rb') as f:
+        f.seek(after)
+        rows, sessions = [], []
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # partially written line; picked up next time
+            after += len(line)
+            e = json.loads(line)
+            if e['bank_id'] != bank_id:
+                continue
+            rows.append(tuple(e[k] for k in names))
+            sessions.append(e['session_id'])
+            if len(rows) >= LOAD_CHUNK:
+                parts.append((*np.array(rows, dtype=np.int64).T, _factorize(sessions, codes)))
+                rows, sessions = [], []
+        if rows:
+            parts.append((*np.array(rows, dtype=np.int64).T, _factorize(sessions, codes)))
+    return _attempts(parts, codes), after
+
+
+# -- Item statistics --
+class ItemAnalysis:
+    # Per-question difficulty (p-value), corrected point-biserial discrimination,
+    # option selection frequencies and mean response time for one bank.
+    #
+    # Counts, option frequencies and response-time sums are additive, so add_attempts()
+    # folds in only the new rows. Discrimination correlates each attempt with its
+    # session's score on the rest of the bank, which changes as sessions answer more,
+    # so it is recomputed over the compact attempt arrays with a few bincounts.
+    def __init__(self, n_items: int, max_options: int = 5):
+        self.n_items = n_items
+        self.max_options = max_options
+        self.attempts = np.zeros(n_items, dtype=np.int64)
+        self.correct = np.zeros(n_items, dtype=np.int64)
+        self.latency_sum = np.zeros(n_items, dtype=np.float64)
+        self.option_counts = np.zeros((n_items, max_options), dtype=np.int64)
+        self._item = np.empty(0, dtype=np.int32)
+        self._session = np.empty(0, dtype=np.int32)
+        self._x = np.empty(0, dtype=np.int8)
+        self._session_codes: Dict[str, int] = {}
+        self.cursor = 0  # loader position of the last row folded in
+
+    def add_attempts(self, question_id, chosen, correct, latency_ms, session) -> None:
+        item = np.asarray(question_id, dtype=np.int64)
+        chosen = np.asarray(chosen, dtype=np.int64)
+        x = np.asarray(correct, dtype=np.int8)
+        latency = np.asarray(latency_ms, dtype=np.float64)
+        if len(session) and isinstance(session[0], str):
+            codes = self._session_codes
+            session = np.fromiter((codes.setdefault(s, len(codes)) for s in session),
+                                  dtype=np.int32, count=len(session))
+        session = np.asarray(session, dtype=np.int32)
+
+        # Attempts on positions beyond the bank (e.g. an older bank version) are ignored
+        keep = (item >= 0) & (item < self.n_items)
+        item, chosen, x, latency, session = item[keep], chosen[keep], x[keep], latency[keep], session[keep]
+        if not len(item):
+            return
+
+        n = self.n_items
+        self.attempts += np.bincount(item, minlength=n)
+        self.correct += np.bincount(item, weights=x, minlength=n).astype(np.int64)
+        self.latency_sum += np.bincount(item, weights=latency, minlength=n)
+        valid = (chosen >= 0) & (chosen < self.max_options)
+        flat = item[valid] * self.max_options + chosen[valid]
+        self.option_counts += np.bincount(flat, minlength=n * self.max_options).reshape(n, self.max_options)
+
+        self._item = np.concatenate([self._item, item.astype(np.int32)])
+        self._session = np.concatenate([self._session, session])
+        self._x = np.concatenate([self._x, x])
+
+    def update_from(self, loader, path: str, bank_id: int) -> int:
+        attempts, self.cursor = loader(path, bank_id, self.cursor)
+        # The loader's session codes are its own; map them onto this analysis's codes
+        codes = self._session_codes
+        known = np.fromiter((codes.setdefault(s, len(codes)) for s in attempts.session_ids),
+                            dtype=np.int32, count=len(attempts.session_ids))
+        self.add_attempts(attempts.question_id, attempts.chosen, attempts.correct,
+                          attempts.latency_ms, known[attempts.session])
+        return len(attempts.question_id)
+
+    def point_biserial(self) -> np.ndarray:
+        item, session, x = self._item, self._session, self._x.astype(np.float64)
+        n_sessions = int(session.max()) + 1 if len(session) else 0
+        s_n = np.bincount(session, minlength=n_sessions).astype(np.float64)
+        s_c = np.bincount(session, weights=x, minlength=n_sessions)
+
+        # Rest score: proportion correct on the session's other attempts
+        rest_n = s_n[session] - 1
+        usable = rest_n > 0
+        y = np.zeros_like(x)
+        y[usable] = (s_c[session][usable] - x[usable]) / rest_n[usable]
+
+        n = self.n_items
+        w = usable.astype(np.float64)
+        cnt = np.bincount(item, weights=w, minlength=n)
+        sx = np.bincount(item, weights=x * w, minlength=n)
+        sy = np.bincount(item, weights=y * w, minlength=n)
+        sxy = np.bincount(item, weights=x * y * w, minlength=n)
+        sxx = np.bincount(item, weights=x * x * w, minlength=n)
+        syy = np.bincount(item, weights=y * y * w, minlength=n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = sxy - sx * sy / cnt
+            var = (sxx - sx * sx / cnt) * (syy - sy * sy / cnt)
+            r = cov / np.sqrt(var)
+        r[~np.isfinite(r)] = np.nan
+        return r
+
+    def summary(self) -> Dict[str, np.ndarray]:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            attempts = self.attempts.astype(np.float64)
+            return {
+                'attempts': self.attempts,
+                'p_value': self.correct / attempts,
+                'point_biserial': self.point_biserial(),
+                'mean_latency_ms': self.latency_sum / attempts,
+                'option_freq': self.option_counts / attempts[:, None],
+            }
+
+
+def item_report(analysis: ItemAnalysis, bank, limit: Optional[int] = None) -> List[Dict]:
+    # Joins the statistics with the fields the app grades on: question, options, answer
+    stats = analysis.summary()
+    n = min(len(bank), analysis.n_items)
+    if limit is not None:
+        n = min(n, limit)
+    rows = []
+    for pos in range(n):
+        q = bank[pos]
+        freq = stats['option_freq'][pos]
+        try:
+            key = answer_index(q)
+        except ValueError:
+            key = None
+        rows.append({
+            'Q': pos + 1,
+            'question': q['question'][:80],
+            'answer': q['answer'],
+            'attempts': int(stats['attempts'][pos]),
+            'p_value': None if np.isnan(stats['p_value'][pos]) else round(float(stats['p_value'][pos]), 3),
+            'point_biserial': None if np.isnan(stats['point_biserial'][pos])
+            else round(float(stats['point_biserial'][pos]), 3),
+            'mean_rt_s': None if np.isnan(stats['mean_latency_ms'][pos])
+            else round(float(stats['mean_latency_ms'][pos]) / 1000, 1),
+            'options': ', '.join(
+                f"{chr(65 + i)}{'*' if i == key else ''}: {0 if np.isnan(freq[i]) else freq[i]:.0%}"
+                for i, opt in enumerate(q['options'][:analysis.max_options])),
+        })
+    return rows
@@ -0,0 +1,227 @@
+import json
+import re
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+
+try:
+    import orjson
+    _loads = orjson.loads
+    BACKEND = 'orjson'
+except ImportError:  # optional: the standard library parser is used otherwise
+    _loads = json.loads
+    BACKEND = 'json'
+
+CHUNK_SIZE = 1024 * 1024
+
+# Strings (possibly cut off at the end of the buffer) and the structural characters
+# that matter for finding where one top-level array element ends and the next begins
+STRUCTURE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*(?:(?P<closed>")|\\?\Z)|[{}\[\],]', re.DOTALL)
+# Where an object element probably ends: a closing brace followed by the separator
+OBJECT_END = re.compile(rb'}\s*([,\]])')
+NON_SPACE = re.compile(rb'\S')
+FAST_PATH_TRIES = 4
+
+
+# -- Schema --
+class Field(NamedTuple):
+    type: type
+    item_type: Optional[type] = None  # element type for list fields
+    required: bool = True
+    non_empty: bool = False
+
+
+QUESTION_SCHEMA: Dict[str, Field] = {
+    'question': Field(str, non_empty=True),
+    'options': Field(list, item_type=str, non_empty=True),
+    'answer': Field(str, non_empty=True),
+    # Which option is keyed; optional for banks written before it was stored, whose
+    # answer text must then match exactly one option
+    'answer_index': Field(int, required=False),
+    'explanation': Field(str),
+    'tags': Field(list, item_type=str, required=False),  # e.g. ["cardio", "pharm"]
+}
+
+
+def answer_problem(q: Mapping) -> Optional[str]:
+    options = q['options']
+    index = q.get('answer_index')
+    if index is None:
+        matches = options.count(q['answer'])
+        if matches == 0:
+            return '"answer" is not one of "options"'
+        if matches > 1:
+            return '"answer" matches several options and there is no "answer_index" to say which'
+        return None
+    if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < len(options):
+        return '"answer_index" is not one of "options"'
+    if options[index] != q['answer']:
+        return '"answer" is not the option at "answer_index"'
+    return None
+
+
+def answer_index(q: Mapping) -> int:
+    # The keyed option; raises ValueError where the answer does not name exactly one
+    problem = answer_problem(q)
+    if problem is not None:
+        raise ValueError(problem)
+    index = q.get('answer_index')
+    return list(q['options']).index(q['answer']) if index is None else index
+
+
+_TYPE_NAMES = {str: 'a string', list: 'a list', int: 'an integer', float: 'a number', bool: 'true/false',
+               dict: 'an object'}
+
+
+def compile_schema(schema: Dict[str, Field]) -> Callable[[Any], List[str]]:
+    # Turns the schema into a flat list of (key, checks) once, so validating an item
+    # is a tight loop over precomputed tuples rather than a walk of the schema
+    plan = tuple((key, f.type, f.item_type, f.required, f.non_empty, _TYPE_NAMES.get(f.type, f.type.__name__))
+                 for key, f in schema.items())
+    check_answer = 'answer' in schema and 'options' in schema
+
+    def validate(item: Any) -> List[str]:
+        if not isinstance(item, dict):
+            return ['expected an object']
+        problems = []
+        for key, typ, item_type, required, non_empty, type_name in plan:
+            if key not in item:
+                if required:
+                    problems.append(f'missing "{key}"')
+                continue
+            value = item[key]
+            if not isinstance(value, typ) or (typ is int and isinstance(value, bool)):
+                problems.append(f'"{key}" must be {type_name}')
+                continue
+            if non_empty and not value:
+                problems.append(f'"{key}" must not be empty')
+            if item_type is not None:
+                for i, v in enumerate(value):
+                    if not isinstance(v, item_type):
+                        problems.append(f'"{key}"[{i}] must be {_TYPE_NAMES.get(item_type, item_type.__name__)}')
+                        break
+        if check_answer and not problems:
+            problem = answer_problem(item)
+            if problem is not None:
+                problems.append(problem)
+        return problems
+
+    return validate
+
+
+validate_question = compile_schema(QUESTION_SCHEMA)
+
+
+# -- Streaming array reader --
+class ItemError(NamedTuple):
+    index: int  # 0-based position in the array
+    line: int  # 1-based line where the item starts
+    message: str
+
+    def __str__(self) -> str:
+        return f'item {self.index + 1} (line {self.line}): {self.message}'
+
+
+class JSONBankReader:
+    # Reads a top-level JSON array element by element from a binary stream: a regex
+    # finds each element's extent, which is then decoded on its own (with orjson when
+    # installed) and validated. Only the current element and one chunk are held in
+    # memory, and invalid items are recorded in .errors instead of aborting the read.
+    def __init__(self, stream: BinaryIO, validate: Callable[[Any], List[str]] = validate_question,
+                 chunk_size: int = CHUNK_SIZE, max_errors: int = 1000):
+        self.errors: List[ItemError] = []
+        self.items = 0
+        self.error_count = 0
+        self.fatal: Optional[str] = None
+        self._stream = stream
+        self._validate = validate
+        self._chunk_size = chunk_size
+        self._max_errors = max_errors
+
+    def _error(self, index: int, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < self._max_errors:
+            self.errors.append(ItemError(index, line, message))
+
+    def _scan(self, buf: bytes, pos: int) -> Optional[Tuple[int, int]]:
+        # Slow path: walk strings and brackets to the element's end. Returns (end of
+        # element, end of its separator), or None if the element continues past buf.
+        depth = 0
+        for m in STRUCTURE.finditer(buf, pos):
+            c = buf[m.start()]
+            if c == 0x22:  # '"'
+                if m.group('closed') is None:
+                    return None
+            elif c in b'{[':
+                depth += 1
+            elif c in b'}]' and depth:
+                depth -= 1
+            elif depth == 0:  # ',' or the array's ']'
+                return m.start(), m.end()
+        return None
+
+    def _elements(self) -> Iterator[Tuple[Any, int, Optional[str]]]:
+        # Yields (decoded item, line, decode error) for each array element
+        read = self._stream.read
+        buf = read(self._chunk_size)
+        if buf.startswith(b'\xef\xbb\xbf'):
+            buf = buf[3:]
+        m = NON_SPACE.search(buf)
+        if m is None or buf[m.start()] != 0x5b:  # '['
+            self.fatal = 'expected a JSON array of questions' if buf.strip() else 'empty file'
+            return
+        line = 1 + buf.count(b'\n', 0, m.start())  # line number at buf[start]
+        start = m.end()
+        eof = False
+        while True:
+            m = NON_SPACE.search(buf, start)
+            if m is not None and buf[m.start()] == 0x5d:  # ']' ends the array (or follows a trailing comma)
+                return
+            found = None
+            if m is not None:
+                begin = m.start()
+                if buf[begin] == 0x7b:  # '{'
+                    # Fast path: only the element's real closing brace yields valid JSON, so the
+                    # first candidate that decodes is the element; braces in strings just fail
+                    for tries, end in enumerate(OBJECT_END.finditer(buf, begin)):
+                        if tries == FAST_PATH_TRIES:
+                            break
+                        try:
+                            item = _loads(buf[begin:end.start() + 1])
+                        except ValueError:
+                            continue
+                        found = item, None, end.start(1), end.end()
+                        break
+                if found is None:
+                    span = self._scan(buf, begin)
+                    if span is not None:
+                        raw = buf[begin:span[0]].rstrip()
+                        try:
+                            found = _loads(raw), None, span[0], span[1]
+                        except ValueError as e:
+                            found = None, f'invalid JSON: {e}', span[0], span[1]
+            if found is not None:
+                item, error, sep, after = found
+                yield item, line + buf.count(b'\n', start, begin), error
+                line += buf.count(b'\n', start, after)
+                start = after
+                if buf[sep] == 0x5d:
+                    return
+                continue
+            if eof:
+                self.fatal = 'unexpected end of file inside the array'
+                return
+            # Keep only the unfinished element; everything before it has been handed out
+            chunk = read(self._chunk_size)
+            eof = not chunk
+            buf = buf[start:] + chunk
+            start = 0
+
+    def __iter__(self) -> Iterator[Dict]:
+        for index, (item, line, error) in enumerate(self._elements()):
+            self.items += 1
+            if error is None:
+                problems = self._validate(item)
+                if not problems:
+                    yield item
+                    continue
+                error = '; '.join(problems)
+            self._error(index, line, error)
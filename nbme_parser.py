@@ -0,0 +1,255 @@
+import codecs
+import re
+import threading
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+OPTION_LINE = re.compile(r'^([A-Z])\.\s*(.+)')
+MULTI_SPACE = re.compile(r' {2,}')
+NEWLINE = re.compile(r'\r\n|\r|\n')
+TAG_SEPARATOR = re.compile(r'[,;]')
+
+CHUNK_SIZE = 64 * 1024
+
+
+# -- Question/Options/Answer/Explanation state machine --
+def _question_problem(question: str, options: List[str], answer_letter: str) -> Optional[str]:
+    if not question:
+        return 'no question text'
+    if not options:
+        return 'no options (expected lines like "A. option")'
+    if not answer_letter:
+        return 'no "Answer:" letter'
+    if not 0 <= ord(answer_letter.upper()[0]) - ord('A') < len(options):
+        return f'answer "{answer_letter}" is not one of the {len(options)} options'
+    return None
+
+
+def _build_question(question: str, options: List[str], answer_letter: str, explanation: str,
+                    tags: Optional[List[str]] = None) -> Optional[Dict]:
+    if _question_problem(question, options, answer_letter) is not None:
+        return None
+    index = ord(answer_letter.upper()[0]) - ord('A')
+    q = {
+        'question': question,
+        'options': options,
+        'answer': options[index],
+        'answer_index': index,  # the letter itself, so options with the same text stay apart
+        'explanation': explanation.strip() or "No explanation provided."
+    }
+    if tags:
+        q['tags'] = tags
+    return q
+
+
+def normalize_tags(tags: Iterable[str]) -> List[str]:
+    # Lowercased with single spaces, empty and repeated tags dropped, order kept
+    result = []
+    for tag in tags:
+        tag = ' '.join(tag.split()).lower()
+        if tag and tag not in result:
+            result.append(tag)
+    return result
+
+
+def parse_tags(text: str) -> List[str]:
+    # "Cardio, Pharm; beta blockers" -> ['cardio', 'pharm', 'beta blockers']
+    return normalize_tags(TAG_SEPARATOR.split(text))
+
+
+def _records(lines: Iterable[str]) -> Iterator[Tuple[str, List[str], str, str, List[str]]]:
+    # Each "Question:" line starts a new record; blank lines are ignored so
+    # multi-paragraph explanations stay attached to their question. An optional
+    # "Tags:" line anywhere in the record lists comma-separated tags.
+    question, options, answer_letter, explanation, tags = '', [], '', '', []
+    current_section = None
+    started = False
+
+    for line in lines:
+        if '  ' in line:
+            line = MULTI_SPACE.sub(' ', line)
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('Question:'):
+            if started or question or options or answer_letter:
+                yield question, options, answer_letter, explanation, tags
+            question, options, answer_letter, explanation, tags = line[len('Question:'):].strip(), [], '', '', []
+            current_section = 'question'
+            started = True
+        elif line.startswith('Options:'):
+            current_section = 'options'
+        elif line.startswith('Answer:'):
+            answer_letter = line[len('Answer:'):].strip()
+            current_section = 'answer'
+        elif line.startswith('Tags:'):
+            tags = parse_tags(line[len('Tags:'):])
+            current_section = 'tags'
+        elif line.startswith('Explanation:'):
+            explanation = line[len('Explanation:'):].strip()
+            current_section = 'explanation'
+        elif current_section == 'options':
+            # Expect lines like: A. option text
+            m = OPTION_LINE.match(line)
+            if m:
+                options.append(m.group(2).strip())
+        elif current_section == 'explanation':
+            explanation += ' ' + line
+
+    if started or question or options or answer_letter:
+        yield question, options, answer_letter, explanation, tags
+
+
+def parse_nbme_lines(lines: Iterable[str]) -> Iterator[Dict]:
+    for record in _records(lines):
+        q = _build_question(*record)
+        if q:
+            yield q
+
+
+# -- Block-level incremental parsing --
+# Pasted text is cut into blocks at "Question:" lines and each block is parsed on its
+# own, memoized by its content. Records never span a "Question:" line, so the
+# concatenated block results equal a whole-text parse, and after an edit only the
+# changed blocks are parsed again.
+# Anchored on the newline rather than ^ with MULTILINE, which is ~10x slower to scan
+QUESTION_START = re.compile(r'\n[ \t]*Question:')
+
+
+class BlockProblem(NamedTuple):
+    block: int  # 1-based block (question) number in the text
+    line: int  # 1-based line where the block starts
+    message: str
+
+    def __str__(self) -> str:
+        return f'Question block {self.block} (line {self.line}): {self.message}'
+
+
+def split_question_blocks(text: str) -> List[Tuple[int, str]]:
+    # (start line, block text); text before the first "Question:" line is its own block
+    starts = [0] + [m.start() + 1 for m in QUESTION_START.finditer(text)]
+    blocks = []
+    line = 1
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        blocks.append((line, text[start:end]))
+        line += text.count('\n', start, end)
+    return blocks
+
+
+def parse_nbme_block(block: str) -> Tuple[Tuple[Dict, ...], Tuple[str, ...]]:
+    questions, problems = [], []
+    for record in _records(NEWLINE.split(block)):
+        problem = _question_problem(*record[:3])
+        if problem is None:
+            questions.append(_build_question(*record))
+        else:
+            problems.append(problem)
+    return tuple(questions), tuple(problems)
+
+
+def parse_nbme_blocks(text: str, cache=None) -> Tuple[List[Dict], List[BlockProblem], int]:
+    # Returns (questions, per-block problems, number of blocks actually parsed).
+    # cache needs get(key) and put(key, value), e.g. bank_cache.ParsedBankCache.
+    questions: List[Dict] = []
+    problems: List[BlockProblem] = []
+    parsed = 0
+    number = 0
+    for line, block in split_question_blocks(text):
+        if not block.strip():
+            continue
+        # The block text is its own key: str hashing is native and no digest is needed
+        result = cache.get(block) if cache is not None else None
+        if result is None:
+            result = parse_nbme_block(block)
+            parsed += 1
+            if cache is not None:
+                cache.put(block, result)
+        block_questions, block_problems = result
+        if block_questions or block_problems:
+            number += 1
+        questions.extend(block_questions)
+        problems.extend(BlockProblem(number, line, message) for message in block_problems)
+    return questions, problems, parsed
+
+
+# -- Incremental decoding --
+def iter_text_lines(stream: BinaryIO, encoding: str = 'utf-8', fallback: str = 'cp1252',
+                    chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    # Decodes chunk by chunk; from the first invalid byte on, the rest of the file is
+    # decoded with the fallback codec instead of failing the whole upload. Text before
+    # that byte, in the same chunk included, keeps the primary encoding.
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        final = not chunk
+        try:
+            text = decoder.decode(chunk, final=final)
+        except UnicodeDecodeError as e:
+            # The failed call left the decoder's buffer alone; e.start indexes buffer + chunk
+            buffered, _ = decoder.getstate()
+            data = buffered + chunk
+            decoder = codecs.getincrementaldecoder(fallback)(errors='replace')
+            text = data[:e.start].decode(encoding) + decoder.decode(data[e.start:], final=final)
+        pending += text
+        lines = NEWLINE.split(pending)
+        pending = lines.pop()
+        yield from lines
+        if final:
+            break
+    if pending:
+        yield pending
+
+
+def iter_nbme_questions(stream: BinaryIO, encoding: str = 'utf-8', fallback: str = 'cp1252') -> Iterator[Dict]:
+    return parse_nbme_lines(iter_text_lines(stream, encoding, fallback))
+
+
+# -- Background ingestion --
+# Parses a stream on a worker thread so the quiz can start on the first parsed question.
+# Without a sink the questions collect in `questions` (list.append is atomic, so readers
+# can index it while it grows); with a sink they are handed over in batches instead.
+class StreamingIngest:
+    def __init__(self, stream: BinaryIO, on_done: Optional[Callable[[List[Dict]], None]] = None,
+                 sink: Optional[Callable[[List[Dict]], None]] = None, batch_size: int = 200):
+        self.questions: List[Dict] = []
+        self.count = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._stream = stream
+        self._on_done = on_done
+        self._sink = sink
+        self._batch_size = batch_size
+        self._thread = threading.Thread(target=self._run, name='nbme-ingest', daemon=True)
+
+    def start(self) -> 'StreamingIngest':
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self._thread.join(timeout)
+        return self.done
+
+    def _run(self) -> None:
+        batch: List[Dict] = []
+        try:
+            for q in iter_nbme_questions(self._stream):
+                if self._sink is None:
+                    self.questions.append(q)
+                    self.count += 1
+                    continue
+                batch.append(q)
+                # The first question goes out alone so the quiz can start immediately
+                if len(batch) >= self._batch_size or self.count == 0:
+                    self._sink(batch)
+                    self.count += len(batch)
+                    batch = []
+            if batch:
+                self._sink(batch)
+                self.count += len(batch)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            if self._on_done is not None and self.error is None:
+                self._on_done(self.questions)
@@ -0,0 +1,149 @@
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+DAY = 86400.0
+# A missed card comes back after this long, so it is seen again in the same sitting
+RELEARN_DELAY = 60.0
+MIN_EASE = 1.3
+
+
+class Card(NamedTuple):
+    ease: float
+    interval: float  # days
+    reps: int
+    lapses: int
+    due: float  # unix time
+
+
+NEW_CARD = Card(2.5, 0.0, 0, 0, 0.0)
+
+
+# -- SM-2 update --
+def grade_answer(correct: bool, latency_ms: int) -> int:
+    # SM-2 quality (0-5) from what the quiz knows: correctness and answer speed
+    if not correct:
+        return 1
+    return 5 if latency_ms < 30_000 else 4
+
+
+def next_card(card: Card, quality: int, now: float) -> Card:
+    ease = max(MIN_EASE, card.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return Card(ease, 0.0, 0, card.lapses + 1, now + RELEARN_DELAY)
+    reps = card.reps + 1
+    if reps == 1:
+        interval = 1.0
+    elif reps == 2:
+        interval = 6.0
+    else:
+        interval = card.interval * ease
+    return Card(ease, interval, reps, card.lapses, now + interval * DAY)
+
+
+# -- Due queue --
+class Scheduler:
+    # Cards already studied sit in a min-heap on due time. Rescheduling pushes a new
+    # entry and bumps the card's version, so stale entries are skipped when popped:
+    # each selection is O(log n) however large the bank. Unseen positions are handed
+    # out in order through a cursor and never enter the heap until first answered.
+    def __init__(self, n_items: int, cards: Optional[Dict[int, Card]] = None):
+        self.n_items = n_items
+        self.cards: Dict[int, Card] = {}
+        self._version: Dict[int, int] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+        self._next_new = 0
+        for position, card in (cards or {}).items():
+            if 0 <= position < n_items:
+                self._set(position, card)
+        self._skip_seen_new()
+
+    def _set(self, position: int, card: Card) -> None:
+        self.cards[position] = card
+        version = self._version.get(position, 0) + 1
+        self._version[position] = version
+        heapq.heappush(self._heap, (card.due, position, version))
+
+    def _skip_seen_new(self) -> None:
+        while self._next_new < self.n_items and self._next_new in self.cards:
+            self._next_new += 1
+
+    def _peek(self) -> Optional[Tuple[float, int]]:
+        heap = self._heap
+        while heap and heap[0][2] != self._version[heap[0][1]]:
+            heapq.heappop(heap)
+        return (heap[0][0], heap[0][1]) if heap else None
+
+    def new_remaining(self) -> int:
+        return self.n_items - len(self.cards)
+
+    def next_position(self, now: Optional[float] = None, exclude: Optional[int] = None) -> Optional[int]:
+        # Due reviews first, then new cards, then whatever is due soonest (studying ahead)
+        now = time.time() if now is None else now
+        top = self._peek()
+        if top is not None and top[0] <= now and top[1] != exclude:
+            return top[1]
+        self._skip_seen_new()
+        if self._next_new < self.n_items:
+            return self._next_new
+        if top is not None and top[1] == exclude and len(self._heap) > 1:
+            # Avoid showing the same card twice in a row when something else is available
+            due, position, version = heapq.heappop(self._heap)
+            alternative = self._peek()
+            heapq.heappush(self._heap, (due, position, version))
+            if alternative is not None:
+                return alternative[1]
+        return top[1] if top is not None else None
+
+    def review(self, position: int, correct: bool, latency_ms: int, now: Optional[float] = None) -> Card:
+        now = time.time() if now is None else now
+        card = next_card(self.cards.get(position, NEW_CARD), grade_answer(correct, latency_ms), now)
+        self._set(position, card)
+        return card
+
+    def postpone(self, position: int, delay: float = RELEARN_DELAY, now: Optional[float] = None) -> None:
+        # Skipped cards keep their history and simply come back a little later
+        now = time.time() if now is None else now
+        self._set(position, self.cards.get(position, NEW_CARD)._replace(due=now + delay))
+
+
+# -- Persistence --
+class SchedulerStore:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS srs_cards (
+        user_id TEXT NOT NULL,
+        bank_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        ease REAL NOT NULL,
+        interval REAL NOT NULL,
+        reps INTEGER NOT NULL,
+        lapses INTEGER NOT NULL,
+        due REAL NOT NULL,
+        PRIMARY KEY (user_id, bank_id, position)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+
+    def load(self, user_id: str, bank_id: int) -> Dict[int, Card]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT position, ease, interval, reps, lapses, due FROM srs_cards '
+                'WHERE user_id = ? AND bank_id = ?', (user_id, bank_id)).fetchall()
+        return {r[0]: Card(*r[1:]) for r in rows}
+
+    def save(self, user_id: str, bank_id: int, position: int, card: Card) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO srs_cards VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (user_id, bank_id, position) + tuple(card))
@@ -0,0 +1,233 @@
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+# -- Medical-term tokenization --
+# Keeps clinical shorthand intact ("HbA1c", "beta-2", "CD4+", "IL-6", "T3/T4") and
+# also indexes the hyphen/slash parts, so "beta-2" matches both "beta-2" and "beta".
+GREEK = {'α': 'alpha', 'β': 'beta', 'γ': 'gamma', 'δ': 'delta', 'ε': 'epsilon', 'κ': 'kappa',
+         'λ': 'lambda', 'μ': 'mu', 'σ': 'sigma', 'τ': 'tau', 'ω': 'omega'}
+TOKEN = re.compile(r'[a-z0-9]+(?:[-/][a-z0-9]+)*\+?')
+STOPWORDS = frozenset('a an and are as at be by for from has have in is it of on or the this to was were which with'
+                      .split())
+# Gap inserted between fields so a phrase never matches across question/option/explanation
+FIELD_GAP = 16
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKC', text)
+    for letter, name in GREEK.items():
+        if letter in text:
+            text = text.replace(letter, name)
+    return text.lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN.findall(normalize(text)) if t not in STOPWORDS]
+
+
+def _split_compound(token: str) -> List[str]:
+    # "beta-2" -> ["beta", "2"], "cd4+" -> ["cd4"]; plain words have no parts
+    if '-' in token or '/' in token:
+        return re.split(r'[-/]', token.rstrip('+'))
+    if token.endswith('+'):
+        return [token[:-1]]
+    return []
+
+
+# -- Inverted index --
+class _Postings:
+    __slots__ = ('docs', 'tfs', 'offsets', 'positions')
+
+    def __init__(self):
+        self.docs = array('I')
+        self.tfs = array('I')  # one position per occurrence, so never capped
+        self.offsets = array('I')
+        self.positions = array('I')
+
+
+class SearchIndex:
+    # BM25-ranked search over question, options and explanation. Postings are packed
+    # arrays (doc ids, term frequencies, positions), converted to NumPy once the build
+    # finishes, so scoring a term is a single vectorized add over its posting list.
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, _Postings] = {}
+        self.doc_len = array('I')
+        self.vocabulary: List[str] = []
+        self._doc_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._positions: Dict[str, np.ndarray] = {}
+        self._len_norm: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def build(cls, questions: Iterable[Mapping]) -> 'SearchIndex':
+        index = cls()
+        for q in questions:
+            index.add(q)
+        index.finalize()
+        return index
+
+    def add(self, q: Mapping) -> None:
+        doc = len(self.doc_len)
+        fields = [q['question'], *q['options'], q.get('explanation', '')]
+        local: Dict[str, List[int]] = {}
+        pos = 0
+        for field in fields:
+            for token in tokenize(field):
+                local.setdefault(token, []).append(pos)
+                parts = _split_compound(token)
+                # Parts take consecutive positions, so "beta blocker" also matches "beta-blocker"
+                for i, part in enumerate(parts):
+                    local.setdefault(part, []).append(pos + i)
+                pos += max(1, len(parts))
+            pos += FIELD_GAP
+        for term, positions in local.items():
+            p = self.postings.get(term)
+            if p is None:
+                p = self.postings[term] = _Postings()
+            p.docs.append(doc)
+            p.tfs.append(len(positions))
+            p.offsets.append(len(p.positions))
+            p.positions.extend(positions)
+        self.doc_len.append(pos)
+
+    def finalize(self) -> None:
+        self.vocabulary = sorted(self.postings)
+        lengths = np.frombuffer(self.doc_len, dtype=np.uint32).astype(np.float64)
+        avg = lengths.mean() if len(lengths) else 1.0
+        self._len_norm = self.k1 * (1 - self.b + self.b * lengths / avg)
+        self._doc_arrays = {
+            term: (np.frombuffer(p.docs, dtype=np.uint32), np.frombuffer(p.tfs, dtype=np.uint32).astype(np.float64))
+            for term, p in self.postings.items()}
+        self._positions = {term: np.frombuffer(p.positions, dtype=np.uint32) for term, p in self.postings.items()}
+
+    # -- Query evaluation --
+    def _idf(self, df: int) -> float:
+        n = len(self.doc_len)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _expand_prefix(self, prefix: str, limit: int = 50) -> List[str]:
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        terms = []
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix) and len(terms) < limit:
+            terms.append(self.vocabulary[i])
+            i += 1
+        return terms
+
+    def _add_term(self, scores: np.ndarray, term: str, weight: float = 1.0) -> None:
+        if term not in self._doc_arrays:
+            return
+        docs, tfs = self._doc_arrays[term]
+        idf = self._idf(len(docs))
+        # Doc ids are unique within a posting list, so plain fancy-index addition is safe
+        scores[docs] += weight * idf * tfs * (self.k1 + 1) / (tfs + self._len_norm[docs])
+
+    def _global_positions(self, term: str) -> np.ndarray:
+        # (doc << 32) | position for every occurrence, sorted because docs and positions are
+        docs, tfs = self._doc_arrays[term]
+        return (np.repeat(docs.astype(np.uint64), tfs.astype(np.int64)) << np.uint64(32)) | self._positions[term]
+
+    def _phrase_docs(self, terms: List[str]) -> np.ndarray:
+        # Compound terms are matched by their parts, which add() indexes at consecutive
+        # positions, so "beta-2 agonist" finds "beta-2 agonist" and "beta 2 agonist" alike
+        terms = [part for t in terms for part in _split_compound(t) or [t]]
+        if any(t not in self._doc_arrays for t in terms):
+            return np.empty(0, dtype=np.uint32)
+        starts = self._global_positions(terms[0])
+        for offset, t in enumerate(terms[1:], 1):
+            starts = starts[np.isin(starts + np.uint64(offset), self._global_positions(t), assume_unique=True)]
+            if not len(starts):
+                break
+        return np.unique(starts >> np.uint64(32)).astype(np.uint32)
+
+    def search(self, query: str, limit: int = 50) -> List[Tuple[int, float]]:
+        # Supports plain terms, prefix terms ("pheo*") and quoted phrases ("heart failure").
+        # Phrases are required; other terms only rank.
+        n = len(self.doc_len)
+        if not n or not query.strip():
+            return []
+        scores = np.zeros(n, dtype=np.float64)
+        required: Optional[np.ndarray] = None
+        for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query):
+            if phrase:
+                terms = tokenize(phrase)
+                if not terms:
+                    continue
+                docs = self._phrase_docs(terms) if len(terms) > 1 else self._doc_arrays.get(
+                    terms[0], (np.empty(0, dtype=np.uint32),))[0]
+                required = docs if required is None else np.intersect1d(required, docs, assume_unique=True)
+                for t in terms:
+                    self._add_term(scores, t)
+            elif word.endswith('*'):
+                prefix = normalize(word[:-1])
+                if prefix:
+                    for term in self._expand_prefix(prefix):
+                        self._add_term(scores, term, weight=0.5)
+            else:
+                for token in tokenize(word):
+                    self._add_term(scores, token)
+
+        if required is not None:
+            mask = np.zeros(n, dtype=bool)
+            mask[required] = True
+            scores[~mask] = 0.0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        hits = hits[np.argsort(-scores[hits], kind='stable')]
+        return [(int(doc), float(scores[doc])) for doc in hits]
+
+
+# -- Per-bank indexes --
+# Built once per bank in the background when the bank is imported, then shared by
+# every session searching it. Only the most recently used max_entries are kept; an
+# evicted bank's index is rebuilt the next time it is asked for.
+class SearchIndexRegistry:
+    # Other per-bank indexes (e.g. tag_index.TagIndex) reuse this with their own build
+    def __init__(self, build: Callable[[Iterable[Mapping]], Any] = SearchIndex.build, max_entries: int = 16):
+        self._build_index = build
+        self.max_entries = max_entries
+        self._indexes: "OrderedDict[int, Any]" = OrderedDict()
+        self._building: Dict[int, threading.Thread] = {}
+        self._lock = threading.Lock()
+
+    def get(self, bank_id: int) -> Optional[Any]:
+        with self._lock:
+            index = self._indexes.get(bank_id)
+            if index is not None:
+                self._indexes.move_to_end(bank_id)
+            return index
+
+    def is_building(self, bank_id: int) -> bool:
+        return bank_id in self._building
+
+    def build_async(self, bank_id: int, questions: Callable[[], Iterable[Mapping]]) -> None:
+        with self._lock:
+            if bank_id in self._indexes or bank_id in self._building:
+                return
+            thread = threading.Thread(target=self._build, args=(bank_id, questions),
+                                      name=f'search-index-{bank_id}', daemon=True)
+            self._building[bank_id] = thread
+        thread.start()
+
+    def _build(self, bank_id: int, questions: Callable[[], Iterable[Mapping]]) -> None:
+        try:
+            index = self._build_index(questions())
+            with self._lock:
+                self._indexes[bank_id] = index
+                while len(self._indexes) > self.max_entries:
+                    self._indexes.popitem(last=False)
+        finally:
+            with self._lock:
+                self._building.pop(bank_id, None)
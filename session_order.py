@@ -0,0 +1,23 @@
+import random
+from array import array
+from typing import Optional, Sequence
+
+# -- Per-session orderings over a shared, read-only bank --
+# A session never copies or reorders the bank itself. It keeps a compact array of
+# positions (4 bytes per question) and, optionally, a seed from which each
+# question's option order is derived on demand, so nothing per option is stored.
+
+
+def shuffled_order(n: int, seed: int) -> array:
+    order = array('I', range(n))
+    random.Random(seed).shuffle(order)
+    return order
+
+
+def option_order(n_options: int, position: int, seed: Optional[int]) -> Sequence[int]:
+    if seed is None:
+        return range(n_options)
+    perm = list(range(n_options))
+    # Same seed and position always give the same order, so Back/Next and reruns agree
+    random.Random((seed << 32) | position).shuffle(perm)
+    return perm
@@ -0,0 +1,107 @@
+from typing import Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+# -- Bitsets --
+# A set of bank positions is a uint64 array with bit p % 64 of word p // 64 set for
+# each position p. Unions, intersections and complements are then one vectorized
+# pass over n / 64 words, and a set's size is a popcount.
+WORD_BITS = 64
+
+
+def n_words(n_items: int) -> int:
+    return -(-n_items // WORD_BITS)
+
+
+def from_positions(positions: Iterable[int], n_items: int) -> np.ndarray:
+    flags = np.zeros(n_words(n_items) * WORD_BITS, dtype=bool)
+    flags[np.fromiter(positions, dtype=np.int64)] = True
+    return np.packbits(flags, bitorder='little').view('<u8')
+
+
+def to_positions(words: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder='little'))
+
+
+# np.bitwise_count needs numpy >= 2.0 (pinned in requirements.txt)
+def popcounts(words: np.ndarray) -> np.ndarray:
+    return np.bitwise_count(words)
+
+
+def count(words: np.ndarray) -> int:
+    return int(popcounts(words).sum())
+
+
+def sample(words: np.ndarray, k: int, rng: np.random.Generator) -> List[int]:
+    # k distinct set positions in random order. Ranks are drawn among the set bits and
+    # located through the running popcount, so only the k chosen words are expanded to
+    # bits; nothing per question is materialized for the rest of the set.
+    per_word = popcounts(words)
+    ends = np.cumsum(per_word, dtype=np.int64)
+    total = int(ends[-1]) if len(ends) else 0
+    if k <= 0 or total == 0:
+        return []
+    ranks = rng.choice(total, size=min(k, total), replace=False)
+    word = np.searchsorted(ends, ranks, side='right')
+    local = ranks - (ends[word] - per_word[word])
+    bits = np.unpackbits(words[word].view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    bit = np.argmax(np.cumsum(bits, axis=1) > local[:, None], axis=1)
+    return (word * WORD_BITS + bit).tolist()
+
+
+# -- Per-tag index --
+class TagIndex:
+    # One bitset per tag, built once per bank. Blocks such as "40 cardio or pharm
+    # questions not yet seen" are a few set operations followed by sample().
+    def __init__(self, n_items: int, positions: Dict[str, List[int]]):
+        self.n_items = n_items
+        self._masks = {tag: from_positions(p, n_items) for tag, p in positions.items()}
+        self.counts = {tag: len(p) for tag, p in sorted(positions.items())}
+        self._all = self.complement(self.empty())
+
+    @classmethod
+    def build(cls, questions: Iterable[Mapping]) -> 'TagIndex':
+        positions: Dict[str, List[int]] = {}
+        n_items = 0
+        for position, q in enumerate(questions):
+            for tag in q.get('tags') or ():
+                positions.setdefault(tag, []).append(position)
+            n_items = position + 1
+        return cls(n_items, positions)
+
+    @property
+    def tags(self) -> List[str]:
+        return list(self.counts)
+
+    def empty(self) -> np.ndarray:
+        return np.zeros(n_words(self.n_items), dtype=np.uint64)
+
+    def positions(self, positions: Iterable[int]) -> np.ndarray:
+        return from_positions((p for p in positions if 0 <= p < self.n_items), self.n_items)
+
+    def complement(self, words: np.ndarray) -> np.ndarray:
+        result = ~words
+        tail = self.n_items % WORD_BITS
+        if tail:
+            # Bits past the last question are never members
+            result[-1] &= np.uint64((1 << tail) - 1)
+        return result
+
+    def mask(self, tag: str) -> np.ndarray:
+        words = self._masks.get(tag)
+        return words if words is not None else self.empty()
+
+    def select(self, tags: Iterable[str], match_all: bool = False) -> np.ndarray:
+        # No tags selects the whole bank; otherwise questions with any (or all) of them
+        tags = list(tags)
+        if not tags:
+            return self._all.copy()
+        combine = np.bitwise_and if match_all else np.bitwise_or
+        return combine.reduce([self.mask(t) for t in tags])
+
+    def block(self, k: int, tags: Iterable[str] = (), match_all: bool = False,
+              include: Optional[np.ndarray] = None, seed: Optional[int] = None) -> List[int]:
+        words = self.select(tags, match_all)
+        if include is not None:
+            words &= include
+        return sample(words, k, np.random.default_rng(seed))
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from bank_cache import ParsedBankCache, SharedBankCache
+
+
+def _fail():
+    raise ValueError('unparseable')
+
+
+@pytest.mark.parametrize('make', [lambda tmp: ParsedBankCache(), lambda tmp: SharedBankCache(str(tmp))])
+def test_key_lock_released_when_parse_fails(tmp_path, make):
+    cache = make(tmp_path)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            cache.get_or_parse(b'bank', 'v1', _fail)
+    assert cache._key_locks == {}
+    questions = [{'question': 'Q', 'options': ['a', 'b'], 'answer': 'b', 'explanation': ''}]
+    assert len(cache.get_or_parse(b'bank', 'v1', lambda: questions)) == 1
+    assert cache._key_locks == {}
+
+
+def test_key_lock_released_when_publish_fails(tmp_path):
+    cache = SharedBankCache(str(tmp_path))
+    with pytest.raises(ValueError):
+        # Not a valid question, so compiling it for publication raises
+        cache.get_or_parse(b'bank', 'v1', lambda: [{'question': 'Q'}])
+    assert cache._key_locks == {}
+
+
+def test_eviction_leaves_lock_files(tmp_path):
+    cache = SharedBankCache(str(tmp_path), max_bytes=1)
+    questions = [{'question': 'Q', 'options': ['a', 'b'], 'answer': 'b', 'explanation': ''}]
+    cache.get_or_parse(b'first', 'v1', lambda: questions)
+    locks = {f for f in os.listdir(tmp_path) if f.endswith('.lock')}
+    # Publishing the second bank evicts the first, whose lock another process may hold
+    cache.get_or_parse(b'second', 'v1', lambda: questions)
+    assert cache.evictions == 1
+    assert locks <= set(os.listdir(tmp_path))
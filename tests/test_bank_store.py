@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+import time
+
+from bank_store import STALE_IMPORT_S, BankStore, ImportWatch
+
+
+def _questions(n):
+    return [{'question': f'Q{i}', 'options': ['a', 'b'], 'answer': 'a', 'explanation': ''} for i in range(n)]
+
+
+def _import_concurrently(stores, questions):
+    start = threading.Barrier(len(stores))
+    results = []
+
+    def run(store):
+        start.wait()
+        results.append(store.import_bank(iter(questions), 'hash', 'bank'))
+
+    threads = [threading.Thread(target=run, args=(store,)) for store in stores]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def _check_one_bank(store, questions):
+    banks = store.list_banks()
+    assert len(banks) == 1 and banks[0]['complete'] and banks[0]['size'] == len(questions)
+    assert [store.get_question(banks[0]['bank_id'], i)['question'] for i in range(len(questions))] == \
+        [q['question'] for q in questions]
+
+
+def test_concurrent_imports_in_one_process(tmp_path):
+    store = BankStore(str(tmp_path / 'banks.sqlite3'))
+    questions = _questions(3000)
+    results = _import_concurrently([store] * 8, questions)
+    assert len(set(results)) == 1
+    _check_one_bank(store, questions)
+
+
+def test_concurrent_imports_across_stores(tmp_path):
+    # Separate stores on one file stand in for separate server processes
+    path = str(tmp_path / 'banks.sqlite3')
+    stores = [BankStore(path) for _ in range(4)]
+    questions = _questions(3000)
+    results = _import_concurrently(stores, questions)
+    assert len(set(results)) == 1
+    _check_one_bank(stores[0], questions)
+
+
+def test_stale_import_is_reclaimed_with_a_new_id(tmp_path):
+    path = str(tmp_path / 'banks.sqlite3')
+    crashed = BankStore(path)
+    old_id, owned = crashed.claim_bank('hash', 'bank')
+    assert owned
+    crashed.append_questions(old_id, _questions(10))
+    store = BankStore(path)
+    assert store.claim_bank('hash', 'bank') == (old_id, False)  # still live
+    store._conn.execute('UPDATE banks SET heartbeat = ?', (time.time() - STALE_IMPORT_S - 1,))
+    new_id, owned = store.claim_bank('hash', 'bank')
+    assert owned and new_id != old_id
+    assert store.import_bank(iter(_questions(5)), 'other', 'other') not in (old_id, new_id)
+
+
+def test_failed_import_is_abandoned(tmp_path):
+    store = BankStore(str(tmp_path / 'banks.sqlite3'))
+
+    def broken():
+        yield from _questions(600)
+        raise RuntimeError('parse failed')
+
+    try:
+        store.import_bank(broken(), 'hash', 'bank')
+    except RuntimeError:
+        pass
+    assert store.list_banks() == []
+    questions = _questions(20)
+    store.import_bank(iter(questions), 'hash', 'bank')
+    _check_one_bank(store, questions)
+
+
+def test_import_watch_follows_another_importer(tmp_path):
+    path = str(tmp_path / 'banks.sqlite3')
+    importer = BankStore(path)
+    bank_id, _ = importer.claim_bank('hash', 'bank')
+    importer.append_questions(bank_id, _questions(3))
+    store = BankStore(path)
+    assert store.claim_bank('hash', 'bank') == (bank_id, False)
+    watch = ImportWatch(store, bank_id, takeover=lambda: store.claim_bank('hash', 'bank'))
+    assert not watch.done and not watch.lapsed and not watch.wait(0.3)
+    importer.finish_bank(bank_id)
+    assert watch.wait(1) and not watch.lapsed
+
+
+def test_import_watch_lapses_with_the_claim(tmp_path):
+    path = str(tmp_path / 'banks.sqlite3')
+    importer = BankStore(path)
+    store = BankStore(path)
+    bank_id, _ = importer.claim_bank('hash', 'bank')
+    watch = ImportWatch(store, bank_id, takeover=lambda: store.claim_bank('hash', 'bank'))
+    importer._conn.execute('UPDATE banks SET heartbeat = ?', (time.time() - STALE_IMPORT_S - 1,))
+    assert watch.lapsed and not watch.wait(1)
+    new_id, owned = watch.takeover()
+    assert owned and new_id != bank_id
+    # An abandoned import lapses at once
+    watch = ImportWatch(importer, new_id, takeover=lambda: None)
+    store.abandon_bank(new_id)
+    assert watch.lapsed and not watch.done
+
+
+def test_old_store_is_migrated(tmp_path):
+    path = str(tmp_path / 'banks.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE banks (bank_id INTEGER PRIMARY KEY, content_hash TEXT NOT NULL UNIQUE, name TEXT NOT NULL,
+                            size INTEGER NOT NULL DEFAULT 0, complete INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL);
+        CREATE TABLE questions (bank_id INTEGER NOT NULL REFERENCES banks(bank_id) ON DELETE CASCADE,
+                                position INTEGER NOT NULL, payload TEXT NOT NULL,
+                                PRIMARY KEY (bank_id, position)) WITHOUT ROWID;
+        INSERT INTO banks VALUES (1, 'hash', 'bank', 1, 1, 0);
+        INSERT INTO questions VALUES (1, 0, '{"question": "Q0", "options": ["a"], "answer": "a"}');
+    """)
+    conn.close()
+    store = BankStore(path)
+    assert store.find_bank('hash') == 1
+    assert store.get_question(1, 0)['question'] == 'Q0'
+    sql = store._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'banks'").fetchone()[0]
+    assert 'AUTOINCREMENT' in sql
@@ -0,0 +1,52 @@
+import zlib
+
+import pytest
+
+from checkpoint import FORMAT_VERSION, Answer, CheckpointWriter, Progress, decode, encode, open_store
+
+
+def _progress(order=(2, 0, 1), **changes):
+    answers = (Answer(2, 1, True, 5400), Answer(0, 3, False, 120000))
+    progress = Progress('txt:abc', order, 1234, 2, 1, answers, 61.5, order is not None, True, False,
+                        1700000000.25, 1700003600.0, 3600.0)
+    return progress._replace(**changes)
+
+
+@pytest.mark.parametrize('order', [(2, 0, 1), None])
+def test_round_trip(order):
+    progress = _progress(order)
+    decoded = decode(encode(progress))
+    assert decoded._replace(order=None if decoded.order is None else tuple(decoded.order),
+                            answers=tuple(decoded.answers)) == progress
+
+
+def test_round_trip_without_timed_block():
+    progress = _progress(deadline=None, time_limit=None, answers=())
+    decoded = decode(encode(progress))
+    assert decoded.deadline is None and decoded.time_limit is None and list(decoded.answers) == []
+
+
+def test_unreadable_checkpoints_raise_value_error():
+    data = encode(_progress())
+    with pytest.raises(ValueError):
+        decode(data[:-5])
+    with pytest.raises(ValueError):
+        decode(zlib.compress(zlib.decompress(data)[:-3]))
+    with pytest.raises(ValueError):
+        decode(zlib.compress(zlib.decompress(data).replace(f'"v":{FORMAT_VERSION}'.encode(), b'"v":99')))
+
+
+@pytest.mark.parametrize('kind', ['sqlite', 'files'])
+def test_writer_round_trip_through_store(tmp_path, kind):
+    writer = CheckpointWriter(open_store(kind, str(tmp_path)), delay=0.01)
+    try:
+        writer.submit('session', _progress())
+        assert writer.flush()
+        reopened = CheckpointWriter(open_store(kind, str(tmp_path)))
+        try:
+            assert reopened.load('session').answers == list(_progress().answers)
+            assert reopened.load('missing') is None
+        finally:
+            reopened.close()
+    finally:
+        writer.close()
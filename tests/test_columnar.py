@@ -0,0 +1,64 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from columnar import ColumnarBank, bank_to_bytes  # noqa: E402
+from grading import answer_key, load_bank  # noqa: E402
+
+QUESTIONS = [
+    {'question': 'Q1', 'options': ['None', 'Both', 'None'], 'answer': 'None', 'answer_index': 2, 'explanation': 'e1'},
+    {'question': 'Q2', 'options': ['a', 'b'], 'answer': 'b', 'explanation': 'e2'},
+]
+
+
+def test_answer_index_is_written_as_stored():
+    bank = ColumnarBank(bank_to_bytes(QUESTIONS))
+    assert [bank[i]['answer_index'] for i in range(len(bank))] == [2, 1]
+
+
+def test_grading_reads_no_explanations(tmp_path):
+    path = tmp_path / 'bank.parquet'
+    path.write_bytes(bank_to_bytes(QUESTIONS))
+    questions = load_bank(str(path))
+    assert all('explanation' not in q for q in questions)
+    assert answer_key(questions).key.tolist() == [2, 1]
+    assert [q['explanation'] for q in load_bank(str(path), explanations=True)] == ['e1', 'e2']
+
+
+def _bank_file(tmp_path, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    path = tmp_path / 'bank.parquet'
+    pq.write_table(pa.table(columns), path)
+    return ColumnarBank(str(path))
+
+
+def test_null_columns_are_problems_not_crashes(tmp_path):
+    import pyarrow as pa
+    bank = _bank_file(tmp_path, {
+        'question': pa.array(['ok', None, 'Q3', 'Q4'], pa.string()),
+        'options': pa.array([['a', 'b'], ['a', 'b'], None, ['a', 'b']], pa.list_(pa.string())),
+        'answer_index': pa.array([1, 0, 0, None], pa.int16()),
+    })
+    questions, problems = bank.index_questions()
+    assert list(questions) == [0]
+    assert [p.split(':')[0] for p in problems] == ['question 2', 'question 3', 'question 4']
+
+
+def test_wrong_column_types_are_problems(tmp_path):
+    import pyarrow as pa
+    bank = _bank_file(tmp_path, {
+        'question': pa.array(['Q1', 'Q2'], pa.string()),
+        'options': pa.array([[1, 2], [3, 4]], pa.list_(pa.int64())),
+        'answer_index': pa.array(['0', '1'], pa.string()),
+    })
+    questions, problems = bank.index_questions()
+    assert questions == {} and len(problems) == 2
+    bank = _bank_file(tmp_path, {
+        'question': pa.array(['Q1'], pa.string()),
+        'options': pa.array([['a', 'b']], pa.list_(pa.string())),
+        'answer_index': pa.array([0], pa.int16()),
+        'tags': pa.array([[7]], pa.list_(pa.int64())),
+    })
+    questions, problems = bank.index_questions()
+    assert questions == {} and 'tags' in problems[0]
@@ -0,0 +1,44 @@
+import io
+import tempfile
+
+import pytest
+
+from compiled_bank import BankFormatError, MappedBank, verify_bank, write_bank
+
+QUESTIONS = [{'question': f'Q{i}', 'options': ['a', 'b'], 'answer': 'b', 'explanation': 'e'} for i in range(3)]
+
+
+def _bank():
+    f = io.BytesIO()
+    info = write_bank(QUESTIONS, f)
+    return f.getvalue(), info
+
+
+def test_verify_accepts_a_written_bank():
+    data, info = _bank()
+    assert verify_bank(data, 'bank.adwb')['sha256'] == info['sha256']
+
+
+def test_verify_rejects_a_corrupted_record_under_the_genuine_digest():
+    data, _ = _bank()
+    corrupted = data.replace(b'"question"', b'"{uestion"', 1)
+    with pytest.raises(BankFormatError, match='missing question'):
+        verify_bank(corrupted, 'bank.adwb')
+    # A record that still parses is caught by the digest
+    with pytest.raises(BankFormatError, match='digest'):
+        verify_bank(data.replace(b'"Q1"', b'"Q9"'), 'bank.adwb')
+
+
+def test_verify_rejects_a_bad_offset_table():
+    data, _ = _bank()
+    with pytest.raises(BankFormatError):
+        verify_bank(data[:-4], 'bank.adwb')
+
+
+def test_answer_index_survives_compilation():
+    f = io.BytesIO()
+    write_bank([{'question': 'Q', 'options': ['x', 'y', 'x'], 'answer': 'x', 'answer_index': 2, 'explanation': ''}], f)
+    with tempfile.NamedTemporaryFile(suffix='.adwb') as tmp:
+        tmp.write(f.getvalue())
+        tmp.flush()
+        assert MappedBank(tmp.name)[0]['answer_index'] == 2
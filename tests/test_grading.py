@@ -0,0 +1,25 @@
+import pytest
+
+from grading import answer_key
+from json_bank import validate_question
+
+
+def _q(options, answer, **extra):
+    return {'question': 'Q', 'options': options, 'answer': answer, 'explanation': '', **extra}
+
+
+def test_key_comes_from_answer_index():
+    key = answer_key([_q(['x', 'y', 'x'], 'x', answer_index=2), _q(['a', 'b'], 'b')])
+    assert key.key.tolist() == [2, 1]
+
+
+def test_legacy_question_with_ambiguous_answer_text_is_rejected():
+    legacy = _q(['x', 'y', 'x'], 'x')
+    assert validate_question(legacy) == ['"answer" matches several options and there is no "answer_index" to say which']
+    with pytest.raises(ValueError, match='question 1'):
+        answer_key([legacy])
+
+
+def test_answer_index_must_name_the_answer():
+    assert validate_question(_q(['x', 'y'], 'x', answer_index=1)) == ['"answer" is not the option at "answer_index"']
+    assert validate_question(_q(['x', 'y'], 'x', answer_index=2)) == ['"answer_index" is not one of "options"']
@@ -0,0 +1,43 @@
+import json
+import os
+import threading
+
+from instrumentation import MAX_SESSIONS, Profiler
+
+
+def _runs_total(profiler):
+    line = next(l for l in profiler.to_prometheus().splitlines() if l.startswith('adwenbolobo_script_runs_total '))
+    return int(line.split()[1])
+
+
+def test_script_runs_total_never_decreases():
+    profiler = Profiler(enabled=True)
+    for _ in range(5):
+        profiler.count_run('old')
+    before = _runs_total(profiler)
+    # Enough new sessions to evict 'old' from the tracked ones
+    for i in range(MAX_SESSIONS):
+        profiler.count_run(f's{i}')
+    assert 'old' not in profiler.session_runs
+    assert before == 5
+    assert _runs_total(profiler) == 5 + MAX_SESSIONS
+
+
+def test_concurrent_dumps_write_once_per_interval(tmp_path):
+    profiler = Profiler(enabled=True)
+    profiler.record('parse', 0.01)
+    start = threading.Barrier(8)
+    results = []
+
+    def dump():
+        start.wait()
+        results.append(profiler.dump(str(tmp_path), min_interval=60))
+
+    threads = [threading.Thread(target=dump) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert sorted(os.listdir(tmp_path)) == ['profile.json', 'profile.prom']
+    assert json.loads((tmp_path / 'profile.json').read_text())
@@ -0,0 +1,21 @@
+import io
+
+from nbme_parser import iter_text_lines, parse_nbme_lines
+
+
+def test_mixed_encodings_in_one_chunk():
+    # Valid UTF-8 before the first cp1252 byte keeps its UTF-8 decoding
+    data = 'café\n'.encode('utf-8') + 'naïve\n'.encode('cp1252')
+    assert list(iter_text_lines(io.BytesIO(data))) == ['café', 'naïve']
+
+
+def test_invalid_byte_after_chunk_boundary():
+    # A multi-byte character split across chunks, then a cp1252 byte in the next chunk
+    data = 'aé'.encode('utf-8') + b'\nb\xe9\n'
+    assert list(iter_text_lines(io.BytesIO(data), chunk_size=2)) == ['aé', 'bé']
+
+
+def test_answer_letter_is_kept_with_duplicate_option_text():
+    text = 'Question: Which?\nOptions:\nA. None\nB. Both\nC. None\nAnswer: C\nExplanation: x\n'
+    [q] = parse_nbme_lines(text.splitlines())
+    assert q['answer'] == 'None' and q['answer_index'] == 2
@@ -0,0 +1,36 @@
+from search_index import SearchIndex, SearchIndexRegistry
+
+
+def _index(*texts):
+    return SearchIndex.build({'question': t, 'options': ['x'], 'explanation': ''} for t in texts)
+
+
+def _docs(index, query):
+    return sorted(doc for doc, _ in index.search(query))
+
+
+def test_phrase_with_hyphenated_term():
+    index = _index('Start a beta-2 agonist now', 'beta-2 receptors and an agonist', 'beta 2 agonist')
+    assert _docs(index, '"beta-2 agonist"') == [0, 2]
+    assert _docs(index, '"agonist beta-2"') == []
+
+
+def test_phrase_matches_compound_by_parts():
+    index = _index('a beta-blocker was started', 'beta blocker therapy', 'blocker of beta')
+    assert _docs(index, '"beta blocker"') == [0, 1]
+    assert _docs(index, '"beta-blocker therapy"') == [1]
+    assert _docs(index, '"il-6 levels"') == []
+
+
+def test_term_frequency_beyond_uint16():
+    index = _index('heart failure', 'edema ' * 70000 + 'heart failure', 'edema heart')
+    assert _docs(index, '"edema heart"') == [1, 2]
+
+
+def test_registry_keeps_most_recently_used():
+    registry = SearchIndexRegistry(max_entries=2)
+    for bank_id in (1, 2):
+        registry._build(bank_id, lambda: [])
+    assert registry.get(1) is not None  # 1 is now the most recent
+    registry._build(3, lambda: [])
+    assert registry.get(2) is None and registry.get(1) is not None and registry.get(3) is not None